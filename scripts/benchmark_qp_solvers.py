@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+"""
+Solves recorded qp problems again with different qp solver backends and compares them to the recorded solutions.
+To record problems, set the qp_problem_folder parameter, e.g. in test_utils.py before running test_integration_pr2.py.
+usage: benchmark_qp_solvers.py <qp_problem_folder> [qp solver names]
+"""
+import sys
+
+import numpy as np
+
+from giskardpy.qp_problem_recorder import load_recordings, replay
+from giskardpy.qp_solver import QP_SOLVERS
+from giskardpy.exceptions import QPSolverException
+
+
+def benchmark(folder, solver_names):
+    """
+    :param folder: qp_problem_folder of a giskard run
+    :type folder: str
+    :param solver_names: keys of QP_SOLVERS
+    :type solver_names: list
+    """
+    recordings = load_recordings(folder)
+    recorded_times = np.concatenate([r[u'solve_time'] for r in recordings])
+    print(u'loaded {} problems in {} recordings'.format(len(recorded_times), len(recordings)))
+    print(u'recorded: mean {:.6f}s, max {:.6f}s, total {:.3f}s'.format(recorded_times.mean(), recorded_times.max(),
+                                                                       recorded_times.sum()))
+    for name in solver_names:
+        times = []
+        failures = 0
+        max_diff = 0.
+        try:
+            for recording in recordings:
+                solutions, solve_times = replay(recording, QP_SOLVERS[name])
+                times.append(solve_times)
+                failed = np.isnan(solutions).any(axis=1)
+                failures += failed.sum()
+                successful = ~failed & recording[u'success']
+                if successful.any():
+                    max_diff = max(max_diff,
+                                   np.abs(solutions[successful] - recording[u'xdot'][successful]).max())
+        except QPSolverException as e:
+            print(u'skipping {}: {}'.format(name, e))
+            continue
+        times = np.concatenate(times)
+        print(u'{}: mean {:.6f}s, max {:.6f}s, total {:.3f}s, {} failed, max difference to recording {}'.format(
+            name, times.mean(), times.max(), times.sum(), failures, max_diff))
+
+
+if __name__ == u'__main__':
+    if len(sys.argv) < 2:
+        print(u'usage: benchmark_qp_solvers.py <qp_problem_folder> [qp solver names]')
+        sys.exit(1)
+    names = sys.argv[2:]
+    if len(names) == 0:
+        names = sorted(QP_SOLVERS)
+    benchmark(sys.argv[1], names)
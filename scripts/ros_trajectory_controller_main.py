@@ -7,7 +7,10 @@ import rospy
 from giskardpy.plugin import PluginParallelUniverseOnly
 from giskardpy.plugin_action_server import ActionServerPlugin
 from giskardpy.application import ROSApplication
-from giskardpy.plugin_instantaneous_controller import CartesianBulletControllerPlugin
+from giskardpy.candidate_planner import CandidatePlanner
+from giskardpy.controller_compiler import ControllerCompiler
+from giskardpy.event_scheduler import ACTION_GOAL, JOINT_STATE, WORLD_UPDATE
+from giskardpy.plugin_instantaneous_controller import CartesianBulletControllerPlugin, WarmUpControllerPlugin
 from giskardpy.plugin_fk import FKPlugin
 from giskardpy.plugin_interactive_marker import InteractiveMarkerPlugin
 from giskardpy.plugin_joint_state import JointStatePlugin
@@ -30,6 +33,21 @@ def giskard_pm():
     default_collision_avoidance_distance = rospy.get_param(u'~default_collision_avoidance_distance')
     fill_velocity_values = rospy.get_param(u'~fill_velocity_values')
     nWSR = rospy.get_param(u'~nWSR')
+    sparse_qp_matrices = rospy.get_param(u'~sparse_qp_matrices')
+    compile_processes = rospy.get_param(u'~compile_processes')
+    qp_solver = rospy.get_param(u'~qp_solver')
+    qp_problem_folder = rospy.get_param(u'~qp_problem_folder')
+    update_rates = rospy.get_param(u'~update_rates')
+    max_update_rate = rospy.get_param(u'~max_update_rate')
+    plugin_timing_file = rospy.get_param(u'~plugin_timing_file')
+    planning_strategies = rospy.get_param(u'~planning_strategies')
+    candidate_selection = rospy.get_param(u'~candidate_selection')
+    candidate_timeout = rospy.get_param(u'~candidate_timeout')
+    pipeline_execution = rospy.get_param(u'~pipeline_execution')
+    stream_execution = rospy.get_param(u'~stream_execution')
+    stream_prefix_length = rospy.get_param(u'~stream_prefix_length')
+    trajectory_tolerance = rospy.get_param(u'~trajectory_tolerance')
+    retiming_velocity_scale = rospy.get_param(u'~retiming_velocity_scale')
     root_link = rospy.get_param(u'~root_link')
     marker = rospy.get_param(u'~enable_collision_marker')
     enable_self_collision = rospy.get_param(u'~enable_self_collision')
@@ -56,16 +74,62 @@ def giskard_pm():
     controllable_links_identifier = u'controllable_links'
     robot_description_identifier = u'robot_description'
 
-    pm = ProcessManager()
+    if compile_processes > 0:
+        compiler = ControllerCompiler(compile_processes)
+    else:
+        compiler = None
+
+    controller_plugin = CartesianBulletControllerPlugin(root_link=root_link,
+                                                        fk_identifier=fk_identifier,
+                                                        goal_identifier=cartesian_goal_identifier,
+                                                        js_identifier=js_identifier,
+                                                        next_cmd_identifier=next_cmd_identifier,
+                                                        collision_identifier=collision_identifier,
+                                                        pyfunction_identifier=pyfunction_identifier,
+                                                        closest_point_identifier=closest_point_identifier,
+                                                        controlled_joints_identifier=controlled_joints_identifier,
+                                                        controllable_links_identifier=controllable_links_identifier,
+                                                        collision_goal_identifier=collision_goal_identifier,
+                                                        path_to_functions=path_to_data_folder,
+                                                        nWSR=nWSR,
+                                                        default_joint_vel_limit=default_joint_vel_limit,
+                                                        sparse_qp_matrices=sparse_qp_matrices,
+                                                        robot_description_identifier=robot_description_identifier,
+                                                        compiler=compiler,
+                                                        qp_solver=qp_solver,
+                                                        qp_problem_folder=qp_problem_folder)
+
+    if len(planning_strategies) > 0 and gui:
+        rospy.logwarn(u'planning strategies are ignored, because the pybullet gui can\'t be used by worker processes')
+        planning_strategies = []
+    if len(planning_strategies) > 0 and stream_execution:
+        rospy.logwarn(u'stream execution is disabled, because worker processes can\'t send trajectories')
+        stream_execution = False
+    if len(planning_strategies) > 0:
+        candidate_planner = CandidatePlanner(planning_strategies,
+                                             goal_identifier=cartesian_goal_identifier,
+                                             time_identifier=time_identifier,
+                                             closest_point_identifier=closest_point_identifier,
+                                             result_identifiers=[trajectory_identifier, js_identifier,
+                                                                 pyfunction_identifier],
+                                             selection=candidate_selection,
+                                             timeout=candidate_timeout)
+    else:
+        candidate_planner = None
+
+    pm = ProcessManager(profile_file=plugin_timing_file, candidate_planner=candidate_planner)
     pm.register_plugin(u'js',
                        JointStatePlugin(js_identifier=js_identifier,
                                         time_identifier=time_identifier,
                                         next_cmd_identifier=next_cmd_identifier,
-                                        sample_period=sample_period))
+                                        sample_period=sample_period),
+                       triggers=[JOINT_STATE])
     pm.register_plugin(u'controlled joints',
-                       SetControlledJointsPlugin(controlled_joints_identifier=controlled_joints_identifier))
+                       SetControlledJointsPlugin(controlled_joints_identifier=controlled_joints_identifier),
+                       max_rate=max_update_rate)
     pm.register_plugin(u'upload robot description',
-                       UploadRobotDescriptionPlugin(robot_description_identifier=robot_description_identifier))
+                       UploadRobotDescriptionPlugin(robot_description_identifier=robot_description_identifier),
+                       max_rate=max_update_rate)
     pm.register_plugin(u'action server',
                        ActionServerPlugin(js_identifier=js_identifier,
                                           trajectory_identifier=trajectory_identifier,
@@ -80,7 +144,18 @@ def giskard_pm():
                                           plot_trajectory=False,
                                           fill_velocity_values=fill_velocity_values,
                                           collision_time_threshold=collision_time_threshold,
-                                          max_traj_length=max_traj_length))
+                                          max_traj_length=max_traj_length,
+                                          compiler=compiler,
+                                          pipeline_execution=pipeline_execution,
+                                          stream_execution=stream_execution,
+                                          stream_prefix_length=stream_prefix_length,
+                                          sample_period=sample_period,
+                                          trajectory_tolerance=trajectory_tolerance,
+                                          retiming_velocity_scale=retiming_velocity_scale,
+                                          robot_description_identifier=robot_description_identifier,
+                                          default_joint_vel_limit=default_joint_vel_limit),
+                       triggers=[ACTION_GOAL],
+                       rate=update_rates.get(u'action server'))
     pm.register_plugin(u'bullet',
                        PyBulletPlugin(js_identifier=js_identifier,
                                       collision_identifier=collision_identifier,
@@ -94,29 +169,25 @@ def giskard_pm():
                                       marker=marker,
                                       default_collision_avoidance_distance=default_collision_avoidance_distance,
                                       enable_self_collision=enable_self_collision,
-                                      robot_description_identifier=robot_description_identifier))
+                                      robot_description_identifier=robot_description_identifier),
+                       triggers=[WORLD_UPDATE, ACTION_GOAL],
+                       rate=update_rates.get(u'bullet'))
     pm.register_plugin(u'fk', FKPlugin(js_identifier=js_identifier,
                                       fk_identifier=fk_identifier,
-                                      robot_description_identifier=robot_description_identifier))
+                                      robot_description_identifier=robot_description_identifier),
+                       max_rate=max_update_rate)
     pm.register_plugin(u'cart bullet controller',
-                       PluginParallelUniverseOnly(
-                           CartesianBulletControllerPlugin(root_link=root_link,
-                                                           fk_identifier=fk_identifier,
-                                                           goal_identifier=cartesian_goal_identifier,
-                                                           js_identifier=js_identifier,
-                                                           next_cmd_identifier=next_cmd_identifier,
-                                                           collision_identifier=collision_identifier,
-                                                           pyfunction_identifier=pyfunction_identifier,
-                                                           closest_point_identifier=closest_point_identifier,
-                                                           controlled_joints_identifier=controlled_joints_identifier,
-                                                           controllable_links_identifier=controllable_links_identifier,
-                                                           collision_goal_identifier=collision_goal_identifier,
-                                                           path_to_functions=path_to_data_folder,
-                                                           nWSR=nWSR,
-                                                           default_joint_vel_limit=default_joint_vel_limit,
-                                                           robot_description_identifier=robot_description_identifier)))
+                       PluginParallelUniverseOnly(controller_plugin),
+                       max_rate=max_update_rate)
+    if compiler is not None:
+        pm.register_plugin(u'warm up controller',
+                           WarmUpControllerPlugin(controller_plugin, compiler, root_tips,
+                                                  robot_description_identifier=robot_description_identifier,
+                                                  controlled_joints_identifier=controlled_joints_identifier),
+                           max_rate=max_update_rate)
     pm.register_plugin(u'interactive marker',
-                       InteractiveMarkerPlugin(root_tips=root_tips))
+                       InteractiveMarkerPlugin(root_tips=root_tips),
+                       max_rate=max_update_rate)
     return pm
 
 if __name__ == u'__main__':
@@ -0,0 +1,227 @@
+import traceback
+from collections import defaultdict
+from copy import copy
+from multiprocessing import Process, Pipe
+from select import select
+from time import time
+
+import rospy
+
+from giskardpy.exceptions import MAX_NWSR_REACHEDException, GiskardException, SolverTimeoutError
+from giskardpy.plugin_instantaneous_controller import CartesianBulletControllerPlugin
+from giskardpy.plugin_profiler import PluginProfiler
+from giskardpy.plugin_pybullet import PyBulletPlugin
+from giskardpy.utils import closest_point_constraint_violated
+
+# keep the first successful plan and stop the other candidates
+FIRST = u'first'
+# wait for all candidates and keep the successful plan with the shortest trajectory
+BEST = u'best'
+
+
+class CandidatePlanner(object):
+    """
+    Plans a goal with several strategies at the same time. Every strategy runs a parallel universe in its own forked
+    worker process, which has its own copy of the god map, the plugins and the pybullet world. The world has to be
+    in DIRECT mode, because the gui can't be shared with a forked process.
+    Controllers that are compiled in a worker are lost when it terminates, the workers load them from the function
+    cache on disk.
+    Only the thread that calls plan exists in a worker, locks that other threads of the node held at fork time, e.g.
+    of rospy or logging, stay locked forever. Plugins must therefore not use ros connections or other threads in a
+    parallel universe, run_candidate disables the ones that are known. Workers that take longer than timeout are
+    terminated.
+    """
+
+    def __init__(self, strategies, goal_identifier, time_identifier, closest_point_identifier, result_identifiers,
+                 selection=FIRST, timeout=None):
+        """
+        :param strategies: list of dicts, see apply_strategy
+        :type strategies: list
+        :type goal_identifier: str
+        :type time_identifier: str
+        :type closest_point_identifier: str
+        :param result_identifiers: namespaces that are copied from the god map of a worker after its universe died,
+                                    they have to contain everything that post_mortem_analysis needs
+        :type result_identifiers: list
+        :param selection: FIRST or BEST
+        :type selection: str
+        :param timeout: in s, candidates that take longer are terminated and fail, None for no limit
+        :type timeout: float
+        """
+        if selection not in (FIRST, BEST):
+            raise ValueError(u'unknown candidate selection \'{}\''.format(selection))
+        self.strategies = strategies
+        self.goal_identifier = goal_identifier
+        self.time_identifier = time_identifier
+        self.closest_point_identifier = closest_point_identifier
+        self.result_identifiers = list(result_identifiers)
+        for identifier in (time_identifier, closest_point_identifier):
+            if identifier not in self.result_identifiers:
+                self.result_identifiers.append(identifier)
+        self.selection = selection
+        self.timeout = timeout
+
+    def plan(self, process_manager):
+        """
+        Runs one parallel universe of process_manager per strategy and waits for the selected one.
+        :type process_manager: giskardpy.process_manager.ProcessManager
+        :return: god map with the result_identifiers of the selected universe, the exception that killed it and
+                    its profiler
+        :rtype: (giskardpy.god_map.GodMap, Exception, giskardpy.plugin_profiler.PluginProfiler)
+        """
+        workers = {}
+        for i, strategy in enumerate(self.strategies):
+            receiver, sender = Pipe(duplex=False)
+            worker = Process(target=run_candidate,
+                             args=(process_manager, strategy, self.goal_identifier, self.result_identifiers, sender))
+            worker.daemon = True
+            worker.start()
+            sender.close()
+            workers[receiver] = (i, worker)
+        results = {}
+        start = time()
+        try:
+            while len(workers) > 0 and not rospy.is_shutdown():
+                if self.timeout is not None and time() - start > self.timeout:
+                    for receiver, (i, worker) in workers.items():
+                        rospy.logwarn(u'candidate {} timed out'.format(i))
+                        results[i] = ({}, [], SolverTimeoutError(u'candidate {} took longer than {}s'.format(
+                            i, self.timeout)), PluginProfiler())
+                    # the finally block terminates them
+                    break
+                ready, _, _ = select(workers.keys(), [], [], 0.1)
+                for receiver in ready:
+                    i, worker = workers.pop(receiver)
+                    try:
+                        results[i] = receiver.recv()
+                    except EOFError:
+                        results[i] = ({}, [], GiskardException(u'candidate {} died'.format(i)), PluginProfiler())
+                    worker.join()
+                    if self.selection == FIRST and self.is_successful(results[i]):
+                        return self.make_god_map(process_manager, results[i])
+            return self.make_god_map(process_manager, self.select(results))
+        finally:
+            for receiver, (i, worker) in workers.items():
+                worker.terminate()
+                worker.join()
+                receiver.close()
+
+    def is_successful(self, result):
+        """
+        :param result: (data, symbols, exception, profiler) of a worker
+        :type result: tuple
+        :rtype: bool
+        """
+        data, _, exception, _ = result
+        return exception is None and \
+               not closest_point_constraint_violated(data.get(self.closest_point_identifier) or {})
+
+    def select(self, results):
+        """
+        :param results: strategy index -> (data, symbols, exception, profiler)
+        :type results: dict
+        :return: the result with the shortest successful trajectory, or the result of the first strategy if all
+                    candidates failed
+        :rtype: tuple
+        """
+        successful = [i for i in sorted(results) if self.is_successful(results[i])]
+        if len(successful) > 0:
+            return results[min(successful, key=lambda i: results[i][0].get(self.time_identifier))]
+        if len(results) > 0:
+            return results[min(results)]
+        return {}, [], GiskardException(u'planning was interrupted'), PluginProfiler()
+
+    def make_god_map(self, process_manager, result):
+        """
+        Registers the symbols of the worker in the god map of process_manager, like copy_symbols_from does for
+        parallel universes in the same process.
+        :param result: (data, symbols, exception, profiler) of a worker
+        :type result: tuple
+        :return: a copy of the god map of process_manager, with the data of result
+        :rtype: (giskardpy.god_map.GodMap, Exception, giskardpy.plugin_profiler.PluginProfiler)
+        """
+        data, symbols, exception, profiler = result
+        for identifier in symbols:
+            process_manager.get_god_map().to_symbol(identifier)
+        god_map = copy(process_manager.get_god_map())
+        for namespace, value in data.items():
+            god_map.set_data([namespace], value)
+        return god_map, exception, profiler
+
+
+def apply_strategy(strategy, universe, goal_identifier):
+    """
+    Changes a parallel universe before it is started. Supported keys of strategy are:
+    nWSR: nWSR of the qp solver
+    collision_distance: distance used for the default avoid all collisions entry
+    p_gain_scale: factor for the p_gains of all goals
+    :type strategy: dict
+    :type universe: giskardpy.process_manager.ProcessManager
+    :type goal_identifier: str
+    """
+    unknown = set(strategy) - {u'nWSR', u'collision_distance', u'p_gain_scale'}
+    if unknown:
+        raise KeyError(u'unknown strategy parameters {}'.format(list(unknown)))
+    for plugin in universe._plugins.values():
+        if isinstance(plugin, CartesianBulletControllerPlugin) and u'nWSR' in strategy:
+            plugin.nWSR = strategy[u'nWSR']
+        if isinstance(plugin, PyBulletPlugin) and u'collision_distance' in strategy:
+            plugin.default_collision_avoidance_distance = strategy[u'collision_distance']
+    if u'p_gain_scale' in strategy:
+        god_map = universe.get_god_map()
+        goals = god_map.get_data([goal_identifier])
+        if goals is not None:
+            for goal_type, goal in goals.items():
+                for key, controller in goal.items():
+                    # cartesian goals are giskard_msgs.msg.Controller
+                    p_gain = controller[u'p_gain'] if isinstance(controller, dict) else controller.p_gain
+                    god_map.set_data([goal_identifier, goal_type, key, u'p_gain'],
+                                     p_gain * strategy[u'p_gain_scale'])
+
+
+def to_picklable(value):
+    """
+    :return: value, with defaultdicts turned into dicts, because their default factories are usually lambdas
+    """
+    if isinstance(value, defaultdict):
+        return dict(value)
+    return value
+
+
+def run_candidate(process_manager, strategy, goal_identifier, result_identifiers, sender):
+    """
+    Runs a parallel universe of process_manager with strategy in a forked worker process and sends
+    (data, symbols, exception, profiler) through sender, where data maps result_identifiers to their values and
+    symbols are the identifiers of all registered symbols.
+    :type process_manager: giskardpy.process_manager.ProcessManager
+    :type strategy: dict
+    :type goal_identifier: str
+    :type result_identifiers: list
+    :type sender: multiprocessing.Connection
+    """
+    universe = process_manager.make_parallel_universe()
+    for plugin in universe._plugins.values():
+        if isinstance(plugin, CartesianBulletControllerPlugin):
+            # the pool of the compiler belongs to the parent process
+            plugin.compiler = None
+        if isinstance(plugin, PyBulletPlugin):
+            # the ros connections belong to the parent process
+            plugin.marker = False
+    e = None
+    try:
+        apply_strategy(strategy, universe, goal_identifier)
+        universe.start_loop()
+    except MAX_NWSR_REACHEDException as e:
+        print(e)
+    except Exception as e:
+        traceback.print_exc()
+    god_map = universe.get_god_map()
+    data = {identifier: to_picklable(god_map.get_data([identifier])) for identifier in result_identifiers}
+    symbols = list(god_map.index_to_key)
+    try:
+        sender.send((data, symbols, e, universe.profiler))
+    except Exception as pickle_error:
+        traceback.print_exc()
+        sender.send(({}, symbols, GiskardException(u'result of candidate can\'t be send: {}'.format(pickle_error)),
+                     universe.profiler))
+    sender.close()
@@ -0,0 +1,95 @@
+import multiprocessing
+import os
+from threading import Lock
+
+from giskardpy.function_cache import FunctionCache
+from giskardpy.qp_problem_builder import compile_block
+
+
+class ControllerCompiler(object):
+    """
+    Compiles controller blocks in a pool of worker processes, the results are exchanged through a FunctionCache.
+    Independent blocks are compiled in parallel and likely controllers can be compiled ahead of time.
+    """
+
+    def __init__(self, processes=None):
+        """
+        :param processes: number of worker processes, None to use one per cpu
+        :type processes: int
+        """
+        self.processes = processes
+        self.pool = None
+        self.lock = Lock()
+        self.pending = []
+
+    def get_pool(self):
+        """
+        The pool is created on first use.
+        :rtype: multiprocessing.Pool
+        """
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.processes)
+        return self.pool
+
+    def compile(self, path_to_functions, specs):
+        """
+        Compiles all blocks that are not in the cache in parallel and waits until they are done.
+        :param path_to_functions: folder of the FunctionCache
+        :type path_to_functions: str
+        :param specs: list of (hash, compile function, args), as returned by get_block_specs
+        :type specs: list
+        """
+        function_cache = FunctionCache(path_to_functions)
+        results = []
+        for block_hash, compile_function, args in specs:
+            if not os.path.isfile(function_cache.get_file_name(block_hash)):
+                results.append(self.get_pool().apply_async(compile_block,
+                                                           (path_to_functions, block_hash, compile_function) +
+                                                           tuple(args)))
+        if len(results) == 0:
+            return
+        print(u'compiling {} controller blocks'.format(len(results)))
+        with self.lock:
+            self.pending = results
+        try:
+            for result in results:
+                # reraises exceptions of the worker
+                result.get()
+        finally:
+            with self.lock:
+                self.pending = []
+
+    def is_compiling(self):
+        """
+        :return: whether compile is currently waiting for blocks.
+        :rtype: bool
+        """
+        with self.lock:
+            return len(self.pending) > 0
+
+    def get_progress(self):
+        """
+        Can be called from other threads.
+        :return: fraction of blocks finished by the current call of compile, 1 if nothing is compiled
+        :rtype: float
+        """
+        with self.lock:
+            if len(self.pending) == 0:
+                return 1.
+            return sum(result.ready() for result in self.pending) / float(len(self.pending))
+
+    def warm_up(self, warm_up_function, jobs):
+        """
+        Calls warm_up_function for each job in the pool, without waiting for the results.
+        :param warm_up_function: module level function that compiles controllers into a FunctionCache
+        :param jobs: list of args tuples for warm_up_function
+        :type jobs: list
+        """
+        print(u'warming up {} controllers'.format(len(jobs)))
+        for args in jobs:
+            self.get_pool().apply_async(warm_up_function, args)
+
+    def stop(self):
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool = None
@@ -1,4 +1,4 @@
-from collections import OrderedDict
+import numpy as np
 
 
 class SingleJointState(object):
@@ -12,24 +12,104 @@ class SingleJointState(object):
         return u'{}: {}, {}, {}'.format(self.name, self.position, self.velocity, self.effort)
 
 
-# class MultiJointState(object):
-#     def __init__(self):
-#         self._states = OrderedDict()
-#
-#     def get(self, name):
-#         return self._states[name]
-#
-#     def set(self, state):
-#         self._states[state.name] = state
-#
-#     def keys(self):
-#         return self._states.keys()
-#
-#     def values(self):
-#         return self._states.values()
-#
-#     def items(self):
-#         return self._states.items()
+class MultiJointState(object):
+    """
+    Joint states of several joints, whose positions, velocities and efforts are kept in numpy arrays.
+    Behaves like an OrderedDict that maps joint names to SingleJointState, but those are only created on demand.
+    Instances are not modified after their creation, use with_values to create the next state.
+    """
+
+    def __init__(self, names, positions, velocities=None, efforts=None, name_to_index=None):
+        """
+        :param names: joint names, shared by all states that are created with with_values
+        :type names: tuple
+        :type positions: np.ndarray
+        :type velocities: np.ndarray
+        :type efforts: np.ndarray
+        :param name_to_index: joint name -> index in names, computed if None
+        :type name_to_index: dict
+        """
+        self.names = names
+        if name_to_index is None:
+            name_to_index = {name: i for i, name in enumerate(names)}
+        self.name_to_index = name_to_index
+        self.positions = positions
+        self.velocities = np.zeros(len(names)) if velocities is None else velocities
+        self.efforts = np.zeros(len(names)) if efforts is None else efforts
+        self._states = {}
+
+    @classmethod
+    def from_dict(cls, joint_states):
+        """
+        :param joint_states: joint name -> SingleJointState
+        :type joint_states: dict
+        :rtype: MultiJointState
+        """
+        return cls(tuple(joint_states.keys()),
+                   np.array([sjs.position for sjs in joint_states.values()], dtype=float),
+                   np.array([sjs.velocity for sjs in joint_states.values()], dtype=float),
+                   np.array([sjs.effort for sjs in joint_states.values()], dtype=float))
+
+    def with_values(self, positions, velocities=None, efforts=None):
+        """
+        :return: a state for the same joints with new values
+        :rtype: MultiJointState
+        """
+        return self.__class__(self.names, positions, velocities, efforts, self.name_to_index)
+
+    def make_getter(self, members):
+        """
+        Used by the god map to look up registered identifiers, without creating SingleJointStates.
+        :param members: rest of an identifier, e.g. (joint name, 'position')
+        :type members: tuple
+        :return: function that takes a MultiJointState with the same names and returns the value at members
+        """
+        if len(members) == 2 and members[1] in (u'position', u'velocity', u'effort') and \
+                members[0] in self.name_to_index:
+            names = self.names
+            index = self.name_to_index[members[0]]
+            attribute = members[1] + u's'
+
+            def getter(multi_joint_state):
+                if multi_joint_state.names is not names:
+                    raise KeyError(members[0])
+                return getattr(multi_joint_state, attribute)[index]
+        else:
+            def getter(multi_joint_state):
+                result = multi_joint_state[members[0]]
+                for member in members[1:]:
+                    result = getattr(result, member)
+                return result
+        return getter
+
+    def __getitem__(self, name):
+        if name not in self._states:
+            i = self.name_to_index[name]
+            self._states[name] = SingleJointState(name, self.positions[i], self.velocities[i], self.efforts[i])
+        return self._states[name]
+
+    def get(self, name, default=None):
+        if name in self.name_to_index:
+            return self[name]
+        return default
+
+    def __contains__(self, name):
+        return name in self.name_to_index
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def keys(self):
+        return list(self.names)
+
+    def values(self):
+        return [self[name] for name in self.names]
+
+    def items(self):
+        return [(name, self[name]) for name in self.names]
 
 
 class Point(object):
@@ -79,32 +159,176 @@ class Transform(object):
 #     pass
 
 
-class Trajectory(object):
-    def __init__(self):
-        self._points = OrderedDict()
+class ArrayTrajectory(object):
+    """
+    Trajectory of a fixed set of joints, whose times, positions and velocities are kept in numpy arrays, that grow
+    exponentially, such that appending a point is amortized O(1).
+    Sub trajectories share the arrays of the trajectory they were created from.
+    """
+
+    def __init__(self, names, capacity=64):
+        """
+        :param names: joint names, the order of the columns of positions and velocities
+        :type names: tuple
+        :param capacity: number of points for which memory is allocated initially
+        :type capacity: int
+        """
+        self.names = names
+        self.name_to_index = {name: i for i, name in enumerate(names)}
+        self._times = np.zeros(capacity)
+        self._positions = np.zeros((capacity, len(names)))
+        self._velocities = np.zeros((capacity, len(names)))
+        self._size = 0
+
+    @classmethod
+    def from_arrays(cls, names, times, positions, velocities):
+        """
+        :type names: tuple
+        :type times: np.ndarray
+        :param positions: number of points x number of joints
+        :type positions: np.ndarray
+        :param velocities: number of points x number of joints
+        :type velocities: np.ndarray
+        :return: trajectory that uses the arrays without copying them
+        :rtype: ArrayTrajectory
+        """
+        trajectory = cls(names, capacity=0)
+        trajectory._times = times
+        trajectory._positions = positions
+        trajectory._velocities = velocities
+        trajectory._size = len(times)
+        return trajectory
+
+    @property
+    def times(self):
+        """
+        :rtype: np.ndarray
+        """
+        return self._times[:self._size]
+
+    @property
+    def positions(self):
+        """
+        :return: number of points x number of joints
+        :rtype: np.ndarray
+        """
+        return self._positions[:self._size]
+
+    @property
+    def velocities(self):
+        """
+        :return: number of points x number of joints
+        :rtype: np.ndarray
+        """
+        return self._velocities[:self._size]
+
+    def __len__(self):
+        return self._size
+
+    def set(self, time, point):
+        """
+        Appends a point.
+        :type time: float
+        :param point: joint name -> SingleJointState, has to contain all joints of the trajectory
+        :type point: Union[MultiJointState, dict]
+        """
+        if self._size > 0 and self._times[self._size - 1] > time:
+            raise KeyError(u'Cannot append a trajectory point that is before the current end time of the trajectory.')
+        if self._size == len(self._times):
+            capacity = max(2 * len(self._times), 16)
+            self._times = np.resize(self._times, capacity)
+            self._positions = np.resize(self._positions, (capacity, len(self.names)))
+            self._velocities = np.resize(self._velocities, (capacity, len(self.names)))
+        i = self._size
+        self._times[i] = time
+        if isinstance(point, MultiJointState) and (point.names is self.names or point.names == self.names):
+            self._positions[i] = point.positions
+            self._velocities[i] = point.velocities
+        else:
+            for j, name in enumerate(self.names):
+                self._positions[i, j] = point[name].position
+                self._velocities[i, j] = point[name].velocity
+        self._size += 1
+
+    def get_point(self, index):
+        """
+        :rtype: MultiJointState
+        """
+        return MultiJointState(self.names, self._positions[index], self._velocities[index],
+                               name_to_index=self.name_to_index)
 
     def get_exact(self, time):
-        return self._points[time]
+        """
+        :rtype: MultiJointState
+        """
+        index = np.searchsorted(self.times, time)
+        if index == self._size or self._times[index] != time:
+            raise KeyError(time)
+        return self.get_point(index)
 
     def get_closest(self, time):
-        pass
-
-    def get_sub_trajectory(self, start_time, end_time):
-        pass
-
-    def set(self, time, point):
-        if len(self._points) > 0 and self._points.keys()[-1] > time:
-            raise KeyError(u'Cannot append a trajectory point that is before the current end time of the trajectory.')
-        self._points[time] = point
+        """
+        :return: the point whose time is closest to time
+        :rtype: MultiJointState
+        """
+        if self._size == 0:
+            raise KeyError(time)
+        index = np.searchsorted(self.times, time)
+        if index == self._size or (index > 0 and time - self._times[index - 1] < self._times[index] - time):
+            index -= 1
+        return self.get_point(index)
+
+    def slice(self, start, stop):
+        """
+        :param start: index of the first point
+        :type start: int
+        :param stop: index after the last point
+        :type stop: int
+        :return: trajectory that shares its arrays with this trajectory
+        :rtype: ArrayTrajectory
+        """
+        start, stop, _ = slice(start, stop).indices(self._size)
+        stop = max(start, stop)
+        sub_trajectory = self.__class__.__new__(self.__class__)
+        sub_trajectory.names = self.names
+        sub_trajectory.name_to_index = self.name_to_index
+        # appending to the sub trajectory resizes these views, the arrays of this trajectory are never changed
+        sub_trajectory._times = self._times[start:stop]
+        sub_trajectory._positions = self._positions[start:stop]
+        sub_trajectory._velocities = self._velocities[start:stop]
+        sub_trajectory._size = stop - start
+        return sub_trajectory
+
+    def take(self, indices):
+        """
+        :param indices: indices of points in ascending order
+        :type indices: np.ndarray
+        :return: trajectory with a copy of these points
+        :rtype: ArrayTrajectory
+        """
+        return self.from_arrays(self.names, self.times[indices], self.positions[indices], self.velocities[indices])
+
+    def get_sub_trajectory(self, start_time=None, end_time=None):
+        """
+        :param start_time: None for the beginning of the trajectory
+        :type start_time: float
+        :param end_time: None for the end of the trajectory
+        :type end_time: float
+        :return: all points with start_time <= time <= end_time, shares its arrays with this trajectory
+        :rtype: ArrayTrajectory
+        """
+        start = 0 if start_time is None else np.searchsorted(self.times, start_time)
+        stop = self._size if end_time is None else np.searchsorted(self.times, end_time, side='right')
+        return self.slice(start, stop)
 
     def items(self):
-        return self._points.items()
+        return zip(self.keys(), self.values())
 
     def keys(self):
-        return self._points.keys()
+        return self.times.tolist()
 
     def values(self):
-        return self._points.values()
+        return [self.get_point(i) for i in range(self._size)]
 
 
 class ClosestPointInfo(object):
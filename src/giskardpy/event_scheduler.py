@@ -0,0 +1,174 @@
+from collections import OrderedDict
+from threading import Condition, Timer
+from time import time
+
+# events that plugins can be triggered by
+JOINT_STATE = u'joint_state'
+WORLD_UPDATE = u'world_update'
+ACTION_GOAL = u'action_goal'
+
+# the loop wakes up at least this often to check if ros is shutting down
+MAX_SLEEP = 1.
+
+
+class EventScheduler(object):
+    """
+    Decides which plugins of the original universe have to be updated and sleeps until one of them has to run.
+    A plugin runs, if one of its triggers was notified since its last update or its timer is due.
+    Plugins without triggers and rate run, whenever any other plugin runs, but not more often than their max rate.
+    Updates that are held back by the max rate are merged into one update, once the plugin may run again.
+    Triggers and timers are not limited by the max rate, such that events are handled without delay.
+    notify can be called from any thread, e.g. ros callbacks.
+    """
+
+    def __init__(self):
+        self.condition = Condition()
+        # event -> time of the first notification that was not handled yet
+        self.pending = {}
+        # plugin name -> (set of triggers, period or None, min period or None)
+        self.plugins = OrderedDict()
+        # plugin name -> time of the next timer update
+        self.next_update = {}
+        # names of the plugins that were triggered, but not updated yet
+        self.requested = set()
+        # names of the plugins without triggers and rate, whose update was held back by their max rate
+        self.deferred = set()
+        # plugin name -> time of the last update, only for plugins with a min period
+        self.last_update = {}
+        # event -> [number of handled notifications, sum of latencies, max latency]
+        self.latencies = {}
+        # wakes up the loop at timer_deadline, it is only replaced if an earlier wake up is needed
+        self.timer = None
+        self.timer_deadline = None
+
+    def add_plugin(self, name, triggers=None, rate=None, max_rate=None):
+        """
+        :type name: str
+        :param triggers: events that cause an update of the plugin
+        :type triggers: list
+        :param rate: the plugin is updated at least this often per second, None to update it only on events
+        :type rate: float
+        :param max_rate: if the plugin has no triggers and rate, it is updated at most this often per second,
+                            None for no limit
+        :type max_rate: float
+        """
+        with self.condition:
+            period = 1. / rate if rate else None
+            min_period = 1. / max_rate if max_rate else None
+            self.plugins[name] = (set(triggers) if triggers else set(), period, min_period)
+            if period is not None:
+                self.next_update[name] = 0.
+
+    def notify(self, event):
+        """
+        Wakes up the loop, if a plugin is triggered by event.
+        :type event: str
+        """
+        with self.condition:
+            triggered = [name for name, (triggers, _, _) in self.plugins.items() if event in triggers]
+            if len(triggered) > 0:
+                if event not in self.pending:
+                    self.pending[event] = time()
+                if not self.requested.issuperset(triggered):
+                    self.requested.update(triggered)
+                    self.condition.notify()
+
+    def wake_up(self):
+        with self.condition:
+            self.condition.notify()
+
+    def wake_up_at(self, t):
+        """
+        Makes sure, that the loop is woken up at t at the latest.
+        :type t: float
+        """
+        if self.timer is not None and self.timer.is_alive() and self.timer_deadline <= t:
+            return
+        if self.timer is not None:
+            self.timer.cancel()
+        # Condition.wait with timeout polls in python 2, which would add up to 50ms latency
+        self.timer = Timer(max(t - time(), 0.), self.wake_up)
+        self.timer.daemon = True
+        self.timer_deadline = t
+        self.timer.start()
+
+    def is_throttled(self, name, now):
+        """
+        :return: whether the plugin was updated less than its min period ago
+        :rtype: bool
+        """
+        min_period = self.plugins[name][2]
+        return min_period is not None and name in self.last_update and now < self.last_update[name] + min_period
+
+    def get_due_plugins(self, now):
+        """
+        :return: names of the plugins whose triggers fired, whose timers are due or whose deferred update may run now,
+                    excluding plugins that run always
+        :rtype: list
+        """
+        return [name for name, (triggers, period, _) in self.plugins.items()
+                if (period is not None and self.next_update[name] <= now) or name in self.requested or
+                (name in self.deferred and not self.is_throttled(name, now))]
+
+    def get_next_wake_up(self, deadline):
+        """
+        :return: the earliest time at which a timer is due or a deferred plugin is no longer throttled
+        :rtype: float
+        """
+        times = [deadline] + list(self.next_update.values())
+        times.extend(self.last_update[name] + self.plugins[name][2] for name in self.deferred)
+        return min(times)
+
+    def wait(self):
+        """
+        Blocks until at least one plugin has to be updated, but not longer than MAX_SLEEP.
+        :return: names of the plugins that should be updated now
+        :rtype: set
+        """
+        with self.condition:
+            now = time()
+            deadline = now + MAX_SLEEP
+            due = self.get_due_plugins(now)
+            while len(due) == 0:
+                if now >= deadline:
+                    return set()
+                self.wake_up_at(self.get_next_wake_up(deadline))
+                self.condition.wait()
+                now = time()
+                due = self.get_due_plugins(now)
+            for name, (triggers, period, _) in self.plugins.items():
+                if not triggers and period is None and name not in due:
+                    if self.is_throttled(name, now):
+                        self.deferred.add(name)
+                    else:
+                        due.append(name)
+            for name in due:
+                self.requested.discard(name)
+                self.deferred.discard(name)
+                triggers, period, min_period = self.plugins[name]
+                if min_period is not None:
+                    self.last_update[name] = now
+                if period is not None and self.next_update[name] <= now:
+                    self.next_update[name] += period
+                    if self.next_update[name] <= now:
+                        # skip missed updates instead of catching up
+                        self.next_update[name] = now + period
+            for event, t in list(self.pending.items()):
+                if any(event in self.plugins[name][0] for name in due):
+                    latency = now - t
+                    statistics = self.latencies.setdefault(event, [0, 0., 0.])
+                    statistics[0] += 1
+                    statistics[1] += latency
+                    statistics[2] = max(statistics[2], latency)
+                    del self.pending[event]
+            return set(due)
+
+    def get_latency_statistics(self):
+        """
+        :return: event -> (number of notifications, mean latency, max latency), where latency is the time in s between
+                    a notification and the start of the update that handled it.
+        :rtype: dict
+        """
+        with self.condition:
+            return {event: (count, total / count, max_latency)
+                    for event, (count, total, max_latency) in self.latencies.items()}
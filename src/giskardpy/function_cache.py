@@ -0,0 +1,226 @@
+import errno
+import fcntl
+import hashlib
+import os
+import pickle
+import tempfile
+from contextlib import contextmanager
+
+import symengine
+
+MAGIC = b'giskardpy-compiled-function'
+# increase this if the content of cached files changes in an incompatible way
+FORMAT_VERSION = 3
+SUFFIX = u'.compiled'
+LOCK_SUFFIX = u'.lock'
+DEFAULT_MAX_SIZE = 2 * 1024 ** 3
+
+
+class FunctionCache(object):
+    """
+    Content addressed cache for compiled functions and other expensive to compute objects.
+    Files are written atomically and start with a header containing the format version, symengine version and a
+    checksum, corrupt or outdated files are deleted and treated like missing ones. Caches of objects that don't
+    depend on symengine leave out its version.
+    Several processes can use the same folder, if two of them need the same object, only one computes it.
+    The least recently used files are deleted if the cache gets bigger than max_size.
+    """
+
+    def __init__(self, path, max_size=DEFAULT_MAX_SIZE, depends_on_symengine=True):
+        """
+        :param path: folder where the files are stored
+        :type path: str
+        :param max_size: max size of the cache in bytes
+        :type max_size: int
+        :param depends_on_symengine: whether files of other symengine versions are outdated
+        :type depends_on_symengine: bool
+        """
+        self.path = path
+        self.max_size = max_size
+        self.symengine_version = symengine.__version__ if depends_on_symengine else u'-'
+        try:
+            os.makedirs(self.path)
+        except OSError as exc:  # Guard against race condition
+            if exc.errno != errno.EEXIST:
+                raise
+
+    def get_file_name(self, key):
+        """
+        :param key: e.g. a hash of the expressions of a function and the backend used to compile it
+        :type key: str
+        :return: path to the file for key, includes everything that makes old files incompatible
+        :rtype: str
+        """
+        h = hashlib.md5(u'{} {} {}'.format(FORMAT_VERSION, self.symengine_version, key)).hexdigest()
+        return os.path.join(self.path, h + SUFFIX)
+
+    def get_lock_file_name(self, key):
+        """
+        :type key: str
+        :return: path to the lock file for key, it is deleted together with the file for key
+        :rtype: str
+        """
+        return self.get_file_name(key) + LOCK_SUFFIX
+
+    def get_header(self, payload):
+        """
+        :type payload: bytes
+        :rtype: bytes
+        """
+        return b'{} {} {} {} {}\n'.format(MAGIC, FORMAT_VERSION, self.symengine_version,
+                                          hashlib.md5(payload).hexdigest(), len(payload))
+
+    @contextmanager
+    def lock(self, key):
+        """
+        Inter process lock for key.
+        :type key: str
+        """
+        with open(self.get_lock_file_name(key), u'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def load(self, key):
+        """
+        :type key: str
+        :return: the object saved under key or None, if there is none
+        """
+        file_name = self.get_file_name(key)
+        try:
+            with open(file_name, u'rb') as f:
+                header = f.readline()
+                payload = f.read()
+        except IOError as e:
+            if e.errno == errno.ENOENT:
+                return None
+            raise
+        try:
+            if header != self.get_header(payload):
+                raise ValueError(u'header mismatch')
+            result = pickle.loads(payload)
+        except Exception as e:
+            print(u'deleting corrupted or outdated {}: {}'.format(file_name, e))
+            self.delete(file_name)
+            return None
+        # mark as recently used
+        try:
+            os.utime(file_name, None)
+        except OSError:
+            pass
+        return result
+
+    def save(self, key, obj):
+        """
+        Atomically writes obj to the cache and evicts old files, if necessary.
+        :type key: str
+        """
+        file_name = self.get_file_name(key)
+        payload = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+        fd, tmp_file_name = tempfile.mkstemp(dir=self.path, suffix=u'.tmp')
+        try:
+            with os.fdopen(fd, u'wb') as f:
+                f.write(self.get_header(payload))
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            os.rename(tmp_file_name, file_name)
+        except:
+            self.delete(tmp_file_name)
+            raise
+        print(u'saved {}'.format(file_name))
+        self.evict(keep=file_name)
+
+    def get_or_compute(self, key, compute_function, *args):
+        """
+        :type key: str
+        :param compute_function: called with args, if key is not in the cache. Its result gets saved.
+        :return: the object saved under key
+        """
+        result = self.load(key)
+        if result is None:
+            with self.lock(key):
+                # someone else might have computed it while we were waiting for the lock
+                result = self.load(key)
+                if result is None:
+                    result = compute_function(*args)
+                    self.save(key, result)
+        return result
+
+    def try_compute(self, key, compute_function, *args):
+        """
+        Like get_or_compute, but doesn't wait if another process is already computing key and doesn't load the result.
+        :type key: str
+        :param compute_function: called with args, if key is not in the cache. Its result gets saved.
+        :return: False, if another process is computing key
+        :rtype: bool
+        """
+        if os.path.isfile(self.get_file_name(key)):
+            return True
+        with open(self.get_lock_file_name(key), u'a') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except IOError as e:
+                if e.errno in (errno.EAGAIN, errno.EACCES):
+                    return False
+                raise
+            try:
+                if self.load(key) is None:
+                    self.save(key, compute_function(*args))
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return True
+
+    def delete(self, file_name):
+        """
+        :type file_name: str
+        """
+        try:
+            os.remove(file_name)
+        except OSError:
+            pass
+
+    def get_size(self):
+        """
+        :return: size of all cached files in bytes
+        :rtype: int
+        """
+        return sum(size for _, size, _ in self.get_files())
+
+    def get_files(self):
+        """
+        :return: list of (mtime, size, file name) of all cached files
+        :rtype: list
+        """
+        files = []
+        for file_name in os.listdir(self.path):
+            if file_name.endswith(SUFFIX):
+                file_name = os.path.join(self.path, file_name)
+                try:
+                    stat = os.stat(file_name)
+                except OSError:
+                    # deleted by another process
+                    continue
+                files.append((stat.st_mtime, stat.st_size, file_name))
+        return files
+
+    def evict(self, keep=None):
+        """
+        Deletes the least recently used files and their lock files until the cache is smaller than max_size.
+        If another process is still waiting for a deleted lock file, the next one creates a new lock file and the
+        object might be computed twice, which is wasteful but safe, because files are written atomically.
+        :param keep: file that is not deleted, even if the cache is still to big
+        :type keep: str
+        """
+        files = sorted(self.get_files())
+        size = sum(file_size for _, file_size, _ in files)
+        for _, file_size, file_name in files:
+            if size <= self.max_size:
+                break
+            if file_name == keep:
+                continue
+            self.delete(file_name)
+            self.delete(file_name + LOCK_SUFFIX)
+            size -= file_size
@@ -1,28 +1,193 @@
 import copy
 import traceback
+from collections import defaultdict
+from numbers import Number
+
+import numpy as np
+
 import symengine_wrappers as sw
 from copy import copy
+from operator import itemgetter, attrgetter
+
+
+class IdentifierAccessor(object):
+    """
+    Resolves a registered identifier like GodMap.get_data, but remembers for every member how it was accessed,
+    e.g. with [member], [int(member)] or getattr. The remembered strategy is only used, if the container at that
+    member still has the same type, otherwise the identifier is resolved from scratch.
+    """
+
+    def __init__(self, identifier):
+        """
+        :param identifier: e.g. ['pose', 'position', 'x']
+        :type identifier: tuple
+        """
+        self.identifier = identifier
+        self.namespace = identifier[0]
+        # list of (container type, getter) for each member, None if it has to be learned
+        self.chain = None
+
+    def __call__(self, god_map):
+        """
+        :type god_map: GodMap
+        :return: object that is saved at identifier and whether a function had to be called to get it
+        :rtype: (object, bool)
+        """
+        if self.chain is not None:
+            result = god_map._data.get(self.namespace)
+            try:
+                for container_type, getter in self.chain:
+                    if type(result) is not container_type:
+                        break
+                    result = getter(result)
+                else:
+                    if not callable(result):
+                        return result, False
+            except Exception:
+                pass
+        return self._learn_chain(god_map)
+
+    def _learn_chain(self, god_map):
+        """
+        Resolves the identifier with GodMap._get_data and records how each member was accessed.
+        Identifiers that lead through functions are not compiled, because the result has to be computed every time.
+        :type god_map: GodMap
+        :rtype: (object, bool)
+        """
+        self.chain = None
+        chain = []
+        result = god_map._data.get(self.namespace)
+        members = self.identifier[1:]
+        try:
+            for i, member in enumerate(members):
+                if result is None or callable(result):
+                    break
+                if hasattr(type(result), u'make_getter'):
+                    # the container resolves the remaining members itself, e.g. MultiJointState
+                    getter = result.make_getter(members[i:])
+                    chain.append((type(result), getter))
+                    result = getter(result)
+                    if not callable(result):
+                        self.chain = chain
+                    break
+                try:
+                    getter = itemgetter(member)
+                    next_result = getter(result)
+                except TypeError:
+                    try:
+                        getter = itemgetter(int(member))
+                        next_result = getter(result)
+                    except (TypeError, ValueError):
+                        getter = attrgetter(member) if u'.' not in member else lambda x, m=member: getattr(x, m)
+                        next_result = getter(result)
+                chain.append((type(result), getter))
+                result = next_result
+            else:
+                if not callable(result):
+                    self.chain = chain
+        except Exception:
+            # missing keys and other special cases are handled by _get_data
+            pass
+        return god_map._get_data(self.identifier)
+
 
 class GodMap(object):
     """
     Data structure used by plugins to exchange information.
+    The values of all registered symbols are additionally kept in a dense numpy array. Every symbol has a stable
+    index into this array and set_data only marks the entries that depend on the changed identifier as dirty,
+    which means that only changed values have to be looked up again.
+    Copies share their data, which is copied on write. set_data makes shallow copies of the shared dicts, lists and
+    other objects on the path to the changed member, so neither copy sees the changes of the other. Values returned
+    by get_data must not be modified directly, use set_data instead.
+    The symbol tables and symbol values are shared as well, they are copied when a god map registers a new symbol or
+    writes a symbol value for the first time after copying, so copying a god map is O(1).
     """
 
     def __init__(self):
         self._data = {}
+        # id -> object that was copied by this god map and is therefore not shared with another one
+        self._owned = {id(self._data): self._data}
         self.expr_separator = u'_'
         self.key_to_expr = {}
         self.expr_to_key = {}
         self.default_value = 0
         self.last_expr_values = {}
+        self.key_to_index = {}
+        self.index_to_key = []
+        self.index_to_accessor = []
+        self.expr_to_index = {}
+        # maps every prefix of a registered identifier to the indices of all identifiers that start with it
+        self.prefix_to_indices = defaultdict(list)
+        self._symbol_values = np.zeros(0)
+        self._dirty = np.zeros(0, dtype=bool)
+        # whether the symbol tables or the symbol value arrays might be shared with another god map
+        self._symbols_shared = False
+        self._values_shared = False
 
     def __copy__(self):
         god_map_copy = GodMap()
-        god_map_copy._data = copy(self._data)
-        god_map_copy.key_to_expr = copy(self.key_to_expr)
-        god_map_copy.expr_to_key = copy(self.expr_to_key)
+        # from now on the data is shared and both god maps have to copy containers before writing into them
+        god_map_copy._data = self._data
+        god_map_copy._owned = {}
+        self._owned = {}
+        god_map_copy._share_symbols(self)
+        god_map_copy._symbol_values = self._symbol_values
+        god_map_copy._dirty = self._dirty
+        god_map_copy._values_shared = True
+        self._values_shared = True
         return god_map_copy
 
+    def _share_symbols(self, god_map):
+        """
+        Uses the symbol tables of god_map, until one of both registers a new symbol.
+        :type god_map: GodMap
+        """
+        self.key_to_expr = god_map.key_to_expr
+        self.expr_to_key = god_map.expr_to_key
+        self.key_to_index = god_map.key_to_index
+        self.index_to_key = god_map.index_to_key
+        self.expr_to_index = god_map.expr_to_index
+        self.prefix_to_indices = god_map.prefix_to_indices
+        # accessors don't depend on the data of a god map and can be shared
+        self.index_to_accessor = god_map.index_to_accessor
+        self._symbols_shared = True
+        god_map._symbols_shared = True
+
+    def _own_symbols(self):
+        """
+        Copies the symbol tables, if they might be shared with another god map.
+        """
+        if self._symbols_shared:
+            self.key_to_expr = copy(self.key_to_expr)
+            self.expr_to_key = copy(self.expr_to_key)
+            self.key_to_index = copy(self.key_to_index)
+            self.index_to_key = copy(self.index_to_key)
+            self.expr_to_index = copy(self.expr_to_index)
+            self.prefix_to_indices = defaultdict(list, ((k, list(v)) for k, v in self.prefix_to_indices.items()))
+            self.index_to_accessor = copy(self.index_to_accessor)
+            self._symbols_shared = False
+
+    def _own_symbol_values(self):
+        """
+        Copies the symbol value arrays, if they might be shared with another god map.
+        """
+        if self._values_shared:
+            self._symbol_values = self._symbol_values.copy()
+            self._dirty = self._dirty.copy()
+            self._values_shared = False
+
+    def copy_symbols_from(self, god_map):
+        """
+        Takes over all symbols that were registered in god_map, which has to be a copy of self.
+        Since the data of both god maps might differ, all values are marked as dirty.
+        :type god_map: GodMap
+        """
+        self._share_symbols(god_map)
+        self._symbol_values = np.zeros(len(god_map._symbol_values))
+        self._dirty = np.ones(len(god_map._dirty), dtype=bool)
+        self._values_shared = False
+
     def _get_member(self, identifier,  member):
         """
         :param identifier:
@@ -47,6 +212,45 @@ class GodMap(object):
                 except TypeError as e:
                     pass
 
+    def _own(self, container):
+        """
+        :type container: object
+        :return: container
+        """
+        self._owned[id(container)] = container
+        return container
+
+    def _is_shared(self, member):
+        """
+        :return: whether member can be changed and might be shared with another god map
+        :rtype: bool
+        """
+        return not isinstance(member, (Number, basestring, tuple, type(None))) and not callable(member) and \
+               id(member) not in self._owned
+
+    def _get_own_member(self, container, member):
+        """
+        Like _get_member, but if the member might be shared with another god map, it is replaced with a shallow copy
+        first. Members that are looked up with [] in objects other than dicts and lists are not copied, because they
+        can't be replaced.
+        """
+        if isinstance(container, dict):
+            key = member
+        elif isinstance(container, list):
+            key = int(member)
+        else:
+            result = self._get_member(container, member)
+            if isinstance(member, basestring) and self._is_shared(result) and \
+                    getattr(container, member, None) is result:
+                result = self._own(copy(result))
+                setattr(container, member, result)
+            return result
+        result = container[key]
+        if self._is_shared(result):
+            result = self._own(copy(result))
+            container[key] = result
+        return result
+
     def get_data(self, identifier):
         """
 
@@ -54,12 +258,29 @@ class GodMap(object):
         :type identifier: list
         :return: object that is saved at key
         """
+        try:
+            index = self.key_to_index.get(tuple(identifier))
+        except TypeError:
+            index = None
+        if index is None:
+            return self._get_data(identifier)[0]
+        return self.index_to_accessor[index](self)[0]
+
+    def _get_data(self, identifier):
+        """
+        :param identifier: Identifier in the form of ['pose', 'position', 'x']
+        :type identifier: list
+        :return: object that is saved at key and whether a function had to be called to get it
+        :rtype: (object, bool)
+        """
         # TODO deal with unused identifiers
         # assert isinstance(key, list) or isinstance(key, tuple)
         # key = tuple(key)
+        volatile = False
         namespace = identifier[0]
         result = self._data.get(namespace)
         for member in identifier[1:]:
+            volatile = volatile or callable(result)
             try:
                 result = self._get_member(result, member)
             except AttributeError:
@@ -72,9 +293,9 @@ class GodMap(object):
                 # raise KeyError(key)
                 result = self.default_value
         if callable(result):
-            return result(self)
+            return result(self), True
         else:
-            return result
+            return result, volatile
 
     def to_symbol(self, identifier):
         """
@@ -90,17 +311,104 @@ class GodMap(object):
             expr = sw.Symbol(self.expr_separator.join([str(x) for x in identifier]))
             if expr in self.expr_to_key:
                 raise Exception(u'{} not allowed in key'.format(self.expr_separator))
+            self._own_symbols()
             self.key_to_expr[identifier] = expr
             self.expr_to_key[str(expr)] = identifier_parts
+            self._register_index(identifier, str(expr))
         return self.key_to_expr[identifier]
 
+    def _register_index(self, identifier, expr):
+        """
+        Reserves an entry in the symbol value array for identifier.
+        :type identifier: tuple
+        :type expr: str
+        """
+        index = len(self.index_to_key)
+        self._own_symbol_values()
+        if index >= len(self._symbol_values):
+            # grow exponentially, such that registering n symbols stays O(n)
+            capacity = max(2 * len(self._symbol_values), 16)
+            self._symbol_values = np.resize(self._symbol_values, capacity)
+            self._dirty = np.resize(self._dirty, capacity)
+        self._dirty[index] = True
+        self.index_to_key.append(identifier)
+        self.index_to_accessor.append(IdentifierAccessor(identifier))
+        self.key_to_index[identifier] = index
+        self.expr_to_index[expr] = index
+        for i in range(1, len(identifier) + 1):
+            self.prefix_to_indices[identifier[:i]].append(index)
+
+    def _invalidate(self, identifier):
+        """
+        Marks all symbols whose value might have been changed by setting identifier as dirty.
+        :type identifier: list
+        """
+        self._own_symbol_values()
+        try:
+            identifier = tuple(identifier)
+            # symbols that are below identifier
+            indices = self.prefix_to_indices.get(identifier)
+            if indices:
+                self._dirty[indices] = True
+            # symbols that point to a parent of identifier
+            for i in range(1, len(identifier)):
+                index = self.key_to_index.get(identifier[:i])
+                if index is not None:
+                    self._dirty[index] = True
+        except TypeError:
+            # unhashable member, play it safe
+            self._dirty[:] = True
+
+    def _update_symbol_values(self, indices):
+        """
+        Looks up the values of all dirty symbols in indices. Volatile symbols, whose values are computed by a
+        function, stay dirty.
+        :type indices: np.ndarray
+        """
+        dirty_indices = indices[self._dirty[indices]]
+        if len(dirty_indices) > 0:
+            self._own_symbol_values()
+        for index in dirty_indices:
+            # reset first, evaluating a symbol might trigger lookups of other symbols
+            self._dirty[index] = False
+            value, volatile = self.index_to_accessor[index](self)
+            try:
+                self._symbol_values[index] = value
+            except (TypeError, ValueError):
+                self._symbol_values[index] = self.default_value
+            if volatile:
+                self._dirty[index] = True
+
+    def get_symbol_indices(self, exprs):
+        """
+        :param exprs: str representations of registered symbols
+        :type exprs: list
+        :return: the indices of exprs in the symbol value array
+        :rtype: np.ndarray
+        """
+        return np.array([self.expr_to_index[str(expr)] for expr in exprs], dtype=int)
+
+    def get_symbol_values(self, indices=None, out=None):
+        """
+        :param indices: as returned by get_symbol_indices, None for all registered symbols
+        :type indices: np.ndarray
+        :param out: values will be written into this array, if provided
+        :type out: np.ndarray
+        :return: the current values of the symbols in indices, in the same order
+        :rtype: np.ndarray
+        """
+        if indices is None:
+            indices = np.arange(len(self.index_to_key))
+        self._update_symbol_values(indices)
+        return np.take(self._symbol_values, indices, out=out)
+
     def get_symbol_map(self):
         """
         :return: a dict which maps all registered expressions to their values or 0 if there is no number entry
         :rtype: dict
         """
-        #TODO potential speedup by only updating entries that have changed
-        return {expr: self.get_data(key) for expr, key in self.expr_to_key.items()}
+        values = self.get_symbol_values()
+        return {expr: values[index] for expr, index in self.expr_to_index.items()}
 
     def get_registered_symbols(self):
         """
@@ -119,15 +427,17 @@ class GodMap(object):
         if len(identifier) == 0:
             raise ValueError(u'key is empty')
         namespace = identifier[0]
+        if id(self._data) not in self._owned:
+            self._data = self._own(copy(self._data))
         if namespace not in self._data:
             if len(identifier) > 1:
                 raise KeyError(u'Can not access member of unknown namespace: {}'.format(identifier))
             else:
                 self._data[namespace] = value
         else:
-            result = self._data[namespace]
-            for member in identifier[1:-1]:
-                result = self._get_member(result, member)
+            result = self._data
+            for member in identifier[:-1]:
+                result = self._get_own_member(result, member)
             if len(identifier) > 1:
                 member = identifier[-1]
                 if isinstance(result, dict):
@@ -138,5 +448,4 @@ class GodMap(object):
                     setattr(result, member, value)
             else:
                 self._data[namespace] = value
-
-
+        self._invalidate(identifier)
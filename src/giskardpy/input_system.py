@@ -77,6 +77,16 @@ class ShortestAngularDistanceInput(object):
     def get_key(self):
         return u'__'.join(str(x) for x in [self.__class__.__name__] + self.current_angle + self.goal_angle)
 
+    def __getstate__(self):
+        # older symengine versions can't pickle symbols, the candidate planner sends these from its workers
+        state = self.__dict__.copy()
+        state[u'name'] = str(self.name)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.name = sw.Symbol(self.name)
+
     def get_expression(self):
         return self.name
 
@@ -1,7 +1,20 @@
 class PluginBase(object):
+    # set by the process manager, used to wake up its loop
+    scheduler = None
+
     def __init__(self):
         self.started = False
 
+    def notify(self, event):
+        """
+        Tells the process manager, that event happened, such that plugins which are triggered by it get updated.
+        Can be called from any thread.
+        :param event: e.g. giskardpy.event_scheduler.JOINT_STATE
+        :type event: str
+        """
+        if self.scheduler is not None:
+            self.scheduler.notify(event)
+
     def start(self, god_map):
         """
         :param god_map:
@@ -56,7 +69,7 @@ class PluginBase(object):
         """
         return False
 
-    def post_mortem_analysis(self, god_map, exception):
+    def post_mortem_analysis(self, god_map, exception, profiler=None):
         """
         Analyse the the god map and potential cause of death of the parallel universe.
         This function will only be called for the plugin that triggered the creation of a universe.
@@ -64,6 +77,8 @@ class PluginBase(object):
         :type god_map: GodMap
         :param exception:
         :type exception: Exception
+        :param profiler: how long the plugin updates took in the dead universe
+        :type profiler: giskardpy.plugin_profiler.PluginProfiler
         """
         pass
 
@@ -16,12 +16,19 @@ from trajectory_msgs.msg import JointTrajectoryPoint, JointTrajectory
 
 from giskardpy.exceptions import MAX_NWSR_REACHEDException, QPSolverException, SolverTimeoutError, InsolvableException, \
     SymengineException, PathCollisionException, UnknownBodyException
+from giskardpy.event_scheduler import ACTION_GOAL
 from giskardpy.plugin import PluginBase
 from giskardpy.plugin_log_trajectory import LogTrajectoryPlugin
+from giskardpy.symengine_robot import Robot
 from giskardpy.tfwrapper import transform_pose
-from giskardpy.utils import closest_point_constraint_violated
+from giskardpy.utils import closest_point_constraint_violated, trajectory_to_msg, reduce_trajectory, \
+    retime_trajectory
 
 ERROR_CODE_TO_NAME = {getattr(MoveResult, x): x for x in dir(MoveResult) if x.isupper()}
+# in s, the next part of a pipelined trajectory starts at least this much after it was planned
+PIPELINE_MARGIN = 0.1
+# in s, the trajectory that is executed while planning is extended at most this often
+STREAM_PERIOD = 0.2
 
 class ActionServerPlugin(PluginBase):
     """
@@ -32,7 +39,9 @@ class ActionServerPlugin(PluginBase):
                  closest_point_identifier, controlled_joints_identifier, collision_goal_identifier,
                  pyfunction_identifier, joint_convergence_threshold, wiggle_precision_threshold, fill_velocity_values,
                  collision_time_threshold, max_traj_length,
-                 plot_trajectory=False):
+                 plot_trajectory=False, compiler=None, pipeline_execution=False, stream_execution=False,
+                 stream_prefix_length=1., sample_period=0.05, trajectory_tolerance=0., retiming_velocity_scale=0.,
+                 robot_description_identifier=None, default_joint_vel_limit=0.):
         """
         :type cartesian_goal_identifier: str
         :type js_identifier: str
@@ -54,7 +63,31 @@ class ActionServerPlugin(PluginBase):
         :type max_traj_length: float
         :param plot_trajectory: saves a plot of the joint traj for debugging.
         :type plot_trajectory: bool
+        :param compiler: used to publish the progress of controller compilations as planning feedback
+        :type compiler: giskardpy.controller_compiler.ControllerCompiler
+        :param pipeline_execution: if True, the trajectory of each cmd of a cmd_seq is executed as soon as it is
+                                    planned, while the following cmds are planned.
+        :type pipeline_execution: bool
+        :param stream_execution: if True, the execution of goals with one cmd starts as soon as the first
+                                    stream_prefix_length s of the trajectory are planned without collisions and the
+                                    trajectory is extended, while the planning continues.
+        :type stream_execution: bool
+        :type stream_prefix_length: float
+        :param sample_period: time in s between two points of the planned trajectory
+        :type sample_period: float
+        :param trajectory_tolerance: if > 0, points that can be linearly interpolated from their neighbours with at
+                                        most this error in rad or m are removed from the trajectory.
+        :type trajectory_tolerance: float
+        :param retiming_velocity_scale: if > 0, the trajectory is retimed, such that the joints move with this fraction
+                                        of their velocity limits. Streamed trajectories are not retimed.
+        :type retiming_velocity_scale: float
+        :param robot_description_identifier: needed for the velocity limits, if retiming_velocity_scale > 0
+        :type robot_description_identifier: str
+        :param default_joint_vel_limit: limit of joints without velocity limit in the urdf
+        :type default_joint_vel_limit: float
         """
+        if retiming_velocity_scale > 0 and robot_description_identifier is None:
+            raise ValueError(u'retiming needs the robot description')
         self.fill_velocity_values = fill_velocity_values
         self.plot_trajectory = plot_trajectory
         self.goal_identifier = cartesian_goal_identifier
@@ -69,12 +102,33 @@ class ActionServerPlugin(PluginBase):
         self.pyfunction_identifier = pyfunction_identifier
         self.collision_time_threshold = collision_time_threshold
         self.max_traj_length = max_traj_length
+        self.compiler = compiler
+        self.pipeline_execution = pipeline_execution
+        self.stream_execution = stream_execution
+        self.stream_prefix_length = stream_prefix_length
+        self.sample_period = sample_period
+        self.trajectory_tolerance = trajectory_tolerance
+        self.retiming_velocity_scale = retiming_velocity_scale
+        self.robot_description_identifier = robot_description_identifier
+        self.default_joint_vel_limit = default_joint_vel_limit
+        self.robot = None
 
         self.joint_goal = None
         self.start_js = None
         self.goal_solution = None
         self.move_cmd_queue = Queue(1)
         self.results_queue = Queue(1)
+        # start time of the trajectory that is being executed while the rest of a cmd_seq is planned
+        self.execution_start = None
+        # whether the trajectory of the current goal is executed while it is planned
+        self.stream = False
+        # the part of the trajectory that was sent to the robot while planning
+        self.streamed_trajectory = None
+        # number of points of the planned trajectory in streamed_trajectory
+        self.streamed_points = 0
+        # delay in s of the streamed points, because the robot had to wait for the planning
+        self.stream_delay = 0.
+        self.last_stream = None
 
         super(ActionServerPlugin, self).__init__()
 
@@ -106,7 +160,9 @@ class ActionServerPlugin(PluginBase):
                                          wiggle_precision_threshold=self.wiggle_precision_threshold,
                                          is_preempted=lambda: self._as.is_preempt_requested(),
                                          collision_time_threshold=self.collision_time_threshold,
-                                         max_traj_length=self.max_traj_length)
+                                         max_traj_length=self.max_traj_length,
+                                         safe_prefix_cb=self.stream_trajectory if self.stream else None,
+                                         safe_prefix_length=self.stream_prefix_length)
         return self.child
 
     def create_parallel_universe(self):
@@ -179,17 +235,25 @@ class ActionServerPlugin(PluginBase):
         goals[root, tip] = controller
         return goals
 
-    def post_mortem_analysis(self, god_map, exception):
+    def post_mortem_analysis(self, god_map, exception, profiler=None):
         """
         Extracts logged traj from god map of the dead universe and publishes the result.
         """
+        if profiler is not None:
+            rospy.loginfo(u'plugin timing of the planning run:\n{}'.format(profiler.get_summary()))
         self.publish_feedback(MoveFeedback.PLANNING, 1)
         result = MoveResult()
         result.error_code = self.exception_to_error_code(exception)
         if result.error_code == MoveResult.SUCCESS:
             last_cp = god_map.get_data([self.closest_point_identifier])
             if not closest_point_constraint_violated(last_cp):
-                result.trajectory = self.get_traj_msg(god_map)
+                if self.streamed_trajectory is None:
+                    result.trajectory = self.get_traj_msg(god_map)
+                else:
+                    # the rest is appended to the trajectory, that is being executed
+                    self.send_streamed_points(god_map, god_map.get_data([self.time_identifier]))
+                    self.start_js = god_map.get_data([self.js_identifier])
+                    result.trajectory = self.streamed_trajectory
             else:
                 result.error_code = MoveResult.END_STATE_COLLISION
         # keep pyfunctions created in parallel universe
@@ -219,31 +283,106 @@ class ActionServerPlugin(PluginBase):
         :rtype: MoveResult
         """
         self.move_cmd_queue.put(move_cmd)
-        return self.results_queue.get()
+        self.notify(ACTION_GOAL)
+        if self.compiler is None:
+            return self.results_queue.get()
+        while True:
+            try:
+                return self.results_queue.get(timeout=0.1)
+            except Empty:
+                if self.compiler.is_compiling():
+                    self.publish_feedback(MoveFeedback.PLANNING, self.compiler.get_progress())
 
     def get_traj_msg(self, god_map):
         """
         :type god_map: giskardpy.god_map.GodMap
         :rtype: JointTrajectory
         """
-        trajectory_msg = JointTrajectory()
-        trajectory = god_map.get_data([self.trajectory_identifier])
+        trajectory = self.post_process_trajectory(god_map.get_data([self.trajectory_identifier]))
         self.start_js = god_map.get_data([self.js_identifier])
-        trajectory_msg.joint_names = self.controller_joints
-        for time, traj_point in trajectory.items():
-            p = JointTrajectoryPoint()
-            p.time_from_start = rospy.Duration(time)
-            for joint_name in self.controller_joints:
-                if joint_name in traj_point:
-                    p.positions.append(traj_point[joint_name].position)
-                    if self.fill_velocity_values:
-                        p.velocities.append(traj_point[joint_name].velocity)
-                else:
-                    p.positions.append(self.start_js[joint_name].position)
-                    if self.fill_velocity_values:
-                        p.velocities.append(self.start_js[joint_name].velocity)
-            trajectory_msg.points.append(p)
-        return trajectory_msg
+        return trajectory_to_msg(trajectory, self.controller_joints, self.start_js, self.fill_velocity_values)
+
+    def post_process_trajectory(self, trajectory, retime=True):
+        """
+        Removes unnecessary points and retimes the trajectory, depending on trajectory_tolerance and
+        retiming_velocity_scale.
+        :type trajectory: giskardpy.data_types.ArrayTrajectory
+        :param retime: whether the trajectory may be retimed
+        :type retime: bool
+        :rtype: giskardpy.data_types.ArrayTrajectory
+        """
+        if self.trajectory_tolerance > 0:
+            # if velocities are sent, the robot interpolates the points with cubic splines
+            trajectory = reduce_trajectory(trajectory, self.trajectory_tolerance, self.fill_velocity_values)
+        if retime and self.retiming_velocity_scale > 0:
+            trajectory = retime_trajectory(trajectory,
+                                           self.get_velocity_limits(trajectory.names) * self.retiming_velocity_scale)
+        return trajectory
+
+    def get_velocity_limits(self, joint_names):
+        """
+        :type joint_names: tuple
+        :return: the velocity limit of each joint, from the urdf in the god map
+        :rtype: np.ndarray
+        """
+        urdf = self.god_map.get_data([self.robot_description_identifier])
+        if self.robot is None or self.robot.urdf != urdf:
+            self.robot = Robot(urdf, self.default_joint_vel_limit)
+        limits = []
+        for joint_name in joint_names:
+            try:
+                limits.append(self.robot.get_joint_velocity_limit(joint_name))
+            except KeyError:
+                limits.append(self.default_joint_vel_limit)
+        return np.array(limits, dtype=float)
+
+    def stream_trajectory(self, god_map, safe_until):
+        """
+        Called in the parallel universe by LogTrajectoryPlugin, sends the new part of the trajectory to the robot,
+        but not more often than every STREAM_PERIOD s.
+        :type god_map: giskardpy.god_map.GodMap
+        :param safe_until: planning time until which the trajectory is collision free
+        :type safe_until: float
+        """
+        now = rospy.get_rostime()
+        if self.last_stream is not None and (now - self.last_stream).to_sec() < STREAM_PERIOD:
+            return
+        self.last_stream = now
+        self.send_streamed_points(god_map, safe_until)
+
+    def send_streamed_points(self, god_map, until):
+        """
+        Appends the points of the trajectory in god_map up to until to streamed_trajectory and sends only the new
+        points to the robot, which keeps executing the previously sent points until the first new one.
+        :type god_map: giskardpy.god_map.GodMap
+        :param until: planning time of the last point that is sent
+        :type until: float
+        """
+        trajectory = god_map.get_data([self.trajectory_identifier])
+        js = god_map.get_data([self.js_identifier])
+        new_points = trajectory.get_sub_trajectory(end_time=until).slice(self.streamed_points, None)
+        if len(new_points) == 0:
+            return
+        self.streamed_points += len(new_points)
+        # the times of the streamed points are already fixed by the execution
+        new_points = self.post_process_trajectory(new_points, retime=False)
+        if self.streamed_trajectory is None:
+            self.streamed_trajectory = JointTrajectory()
+            self.streamed_trajectory.joint_names = self.controller_joints
+            self.execution_start = rospy.get_rostime()
+            self.stream_delay = 0.
+            rospy.loginfo(u'executing first {:.3f} sec while planning'.format(until))
+        else:
+            # if the robot reached the end of the streamed trajectory already, it waits there until the new points
+            earliest_time_from_start = (rospy.get_rostime() - self.execution_start).to_sec() + PIPELINE_MARGIN
+            self.stream_delay += max(earliest_time_from_start - (new_points.times[0] + self.stream_delay), 0)
+        new_trajectory = trajectory_to_msg(new_points, self.controller_joints, js, self.fill_velocity_values,
+                                           self.stream_delay)
+        self.streamed_trajectory.points.extend(new_trajectory.points)
+        goal = FollowJointTrajectoryGoal()
+        goal.trajectory = new_trajectory
+        goal.trajectory.header.stamp = self.execution_start
+        self._ac.send_goal(goal)
 
     def exception_to_error_code(self, exception):
         """
@@ -286,6 +425,10 @@ class ActionServerPlugin(PluginBase):
             self._as.set_aborted(result)
         else:
             result = MoveResult()
+            self.stream = self.execute and self.stream_execution and len(goal.cmd_seq) == 1
+            self.streamed_trajectory = None
+            self.streamed_points = 0
+            self.last_stream = None
             for i, move_cmd in enumerate(goal.cmd_seq):  # type: (int, MoveCmd)
                 # TODO handle empty controller case
                 intermediate_result = self.send_to_process_manager_and_wait(move_cmd)
@@ -294,14 +437,21 @@ class ActionServerPlugin(PluginBase):
                     # clear traj from prev cmds
                     result.trajectory = JointTrajectory()
                     break
-                result.trajectory = self.append_trajectory(result.trajectory, intermediate_result.trajectory)
+                result.trajectory = self.append_trajectory(result.trajectory, intermediate_result.trajectory,
+                                                           self.get_earliest_time_from_start())
                 if i < len(goal.cmd_seq) - 1:
+                    if self.execute and self.pipeline_execution:
+                        # the next cmd starts at the end of this trajectory, it can be executed while planning
+                        self.send_to_robot_without_waiting(result.trajectory)
                     self.let_process_manager_continue()
             else:  # if not break
                 rospy.loginfo(u'found solution')
                 if result.error_code == MoveResult.SUCCESS and self.execute:
                     result.error_code = self.send_to_robot(result)
 
+            if result.error_code != MoveResult.SUCCESS and self.execution_start is not None:
+                self._ac.cancel_all_goals()
+            self.execution_start = None
             self.start_js = None
             if result.error_code != MoveResult.SUCCESS:
                 self._as.set_aborted(result)
@@ -323,26 +473,58 @@ class ActionServerPlugin(PluginBase):
             self._ac.cancel_all_goals()
             error_code = MoveResult.INTERRUPTED
         else:
-            self._ac.send_goal(goal)
+            if self.streamed_trajectory is None:
+                if self.execution_start is not None:
+                    # replaces the trajectory that is being executed, without changing its past
+                    goal.trajectory.header.stamp = self.execution_start
+                self._ac.send_goal(goal)
+            # else all points were already streamed to the robot
             expected_duration = goal.trajectory.points[-1].time_from_start.to_sec()
             rospy.loginfo(u'waiting for {:.3f} sec with {} points'.format(expected_duration,
                                                                           len(goal.trajectory.points)))
-            error_code = self.wait_for_result_and_feed_back_feedback(expected_duration)
+            error_code = self.wait_for_result_and_feed_back_feedback(expected_duration, self.execution_start)
         return error_code
 
-    def append_trajectory(self, traj1, traj2):
+    def send_to_robot_without_waiting(self, trajectory):
+        """
+        Starts the execution of trajectory or replaces the trajectory that is being executed, if trajectory starts
+        with it.
+        :type trajectory: JointTrajectory
+        """
+        if self.execution_start is None:
+            self.execution_start = rospy.get_rostime()
+            rospy.loginfo(u'executing first {:.3f} sec while planning'.format(
+                trajectory.points[-1].time_from_start.to_sec()))
+        goal = FollowJointTrajectoryGoal()
+        goal.trajectory = trajectory
+        goal.trajectory.header.stamp = self.execution_start
+        self._ac.send_goal(goal)
+
+    def get_earliest_time_from_start(self):
+        """
+        :return: time since the start of the execution plus a safety margin in s, None if nothing is being executed
+        :rtype: Union[float, None]
+        """
+        if self.execution_start is None:
+            return None
+        return (rospy.get_rostime() - self.execution_start).to_sec() + PIPELINE_MARGIN
+
+    def append_trajectory(self, traj1, traj2, earliest_time_from_start=None):
         """
         :type traj1: JointTrajectory
         :type traj2: JointTrajectory
+        :param earliest_time_from_start: traj2 starts no earlier than this, because traj1 is already being executed.
+                                            The robot waits at the end of traj1 in between.
+        :type earliest_time_from_start: float
         :rtype: JointTrajectory
         """
         # FIXME probably overwrite traj1
         if len(traj1.points) == 0:
             return traj2
-        # FIXME this step size assume a fixed distance between traj points
-        step_size = traj1.points[1].time_from_start - \
-                    traj1.points[0].time_from_start
-        end_of_last_point = traj1.points[-1].time_from_start + step_size
+        # the points may be reduced or retimed, traj2 starts one planning step after traj1
+        end_of_last_point = traj1.points[-1].time_from_start + rospy.Duration(self.sample_period)
+        if earliest_time_from_start is not None and end_of_last_point.to_sec() < earliest_time_from_start:
+            end_of_last_point = rospy.Duration(earliest_time_from_start)
         for point in traj2.points:  # type: JointTrajectoryPoint
             point.time_from_start += end_of_last_point
             traj1.points.append(point)
@@ -354,13 +536,15 @@ class ActionServerPlugin(PluginBase):
         feedback.progress = progress
         self._as.publish_feedback(feedback)
 
-    def wait_for_result_and_feed_back_feedback(self, expected_duration):
+    def wait_for_result_and_feed_back_feedback(self, expected_duration, start=None):
         """
         :type expected_duration: float
+        :param start: when the execution started, None for now
+        :type start: rospy.Time
         :return: error code from MoveResult
         :rtype: int
         """
-        t = rospy.get_rostime()
+        t = rospy.get_rostime() if start is None else start
         phase = MoveFeedback.EXECUTION
         error_code = MoveResult.SUCCESS
         while not self._ac.wait_for_result(rospy.Duration(.1)):
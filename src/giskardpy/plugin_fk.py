@@ -1,5 +1,7 @@
 import hashlib
 
+import numpy as np
+
 from geometry_msgs.msg import PoseStamped, Quaternion
 from tf.transformations import quaternion_from_matrix
 
@@ -68,11 +70,15 @@ class FKPlugin(RobotPlugin):
     def __init__(self, fk_identifier, js_identifier, robot_description_identifier):
         self.fk_identifier = fk_identifier
         self.fk = None
+        self.fk_param_indices = None
+        self.fk_params = None
+        self.fk_out = None
         self.robot = None
         super(FKPlugin, self).__init__(robot_description_identifier, js_identifier)
 
     def update(self):
-        exprs = self.god_map.get_symbol_map()
+        # all fk functions share the same parameters, they only have to be looked up once per update
+        self.god_map.get_symbol_values(self.fk_param_indices, self.fk_params)
 
         def on_demand_fk_evaluated(key):
             """
@@ -80,12 +86,14 @@ class FKPlugin(RobotPlugin):
             :type key: tuple
             :rtype: PoseStamped
             """
-            fk = self.fk[key](**exprs)
+            fk_function = self.fk[key]
+            fk = self.fk_out[key]
+            fk_function.evaluate(self.fk_params, fk.reshape(-1))
             p = PoseStamped()
             p.header.frame_id = key[1]
-            p.pose.position.x = sw.position_of(fk)[0, 0]
-            p.pose.position.y = sw.position_of(fk)[1, 0]
-            p.pose.position.z = sw.position_of(fk)[2, 0]
+            p.pose.position.x = fk[0, 3]
+            p.pose.position.y = fk[1, 3]
+            p.pose.position.z = fk[2, 3]
             p.pose.orientation = Quaternion(*quaternion_from_matrix(fk))
             return p
 
@@ -109,6 +117,9 @@ class FKPlugin(RobotPlugin):
                 return sw.speed_up(fk, free_symbols, backend=BACKEND)
 
             self.fk = keydefaultdict(on_demand_fk)
+            self.fk_param_indices = self.god_map.get_symbol_indices(free_symbols)
+            self.fk_params = np.zeros(len(free_symbols))
+            self.fk_out = keydefaultdict(lambda key: np.zeros((4, 4)))
 
     def stop(self):
         pass
@@ -116,5 +127,9 @@ class FKPlugin(RobotPlugin):
     def copy(self):
         cp = self.__class__(self.fk_identifier, self._joint_states_identifier, self._robot_description_identifier)
         cp.fk = self.fk
+        cp.fk_param_indices = self.fk_param_indices
+        # fks of the original universe are evaluated lazily, the parameters must not be overwritten by the copy
+        cp.fk_params = None if self.fk_params is None else np.zeros(len(self.fk_params))
+        cp.fk_out = self.fk_out
         cp.robot = self.robot
         return cp
@@ -1,11 +1,18 @@
+import traceback
+from collections import OrderedDict
+
+import numpy as np
 from giskard_msgs.msg import Controller
 
+from giskardpy.god_map import GodMap
 from giskardpy.input_system import FrameInput, Point3Input, Vector3Input, \
     ShortestAngularDistanceInput
+from giskardpy.plugin import PluginBase
 from giskardpy.plugin_fk import RobotPlugin
 from giskardpy.symengine_controller import SymEngineController, position_conv, rotation_conv, \
     link_to_link_avoidance, joint_position, continuous_joint_position
 import symengine_wrappers as sw
+from giskardpy.utils import urdfs_equal
 
 
 class CartesianBulletControllerPlugin(RobotPlugin):
@@ -16,7 +23,8 @@ class CartesianBulletControllerPlugin(RobotPlugin):
     def __init__(self, root_link, js_identifier, fk_identifier, goal_identifier, next_cmd_identifier,
                  collision_identifier, closest_point_identifier, controlled_joints_identifier,
                  controllable_links_identifier, robot_description_identifier,
-                 collision_goal_identifier, pyfunction_identifier, path_to_functions, nWSR, default_joint_vel_limit):
+                 collision_goal_identifier, pyfunction_identifier, path_to_functions, nWSR, default_joint_vel_limit,
+                 sparse_qp_matrices=False, compiler=None, qp_solver=u'qpoases', qp_problem_folder=u''):
         """
         :param root_link: the robots root link
         :type root_link: str
@@ -37,6 +45,14 @@ class CartesianBulletControllerPlugin(RobotPlugin):
         :type nWSR: Union[int, None]
         :param default_joint_vel_limit: caps the joint velocities defined in the urdf.
         :type default_joint_vel_limit: float
+        :param sparse_qp_matrices: if True, only the non constant entries of the qp matrices are evaluated each cycle.
+        :type sparse_qp_matrices: bool
+        :param compiler: if not None, controllers are compiled by its worker processes
+        :type compiler: ControllerCompiler
+        :param qp_solver: name of the qp solver backend, a key of giskardpy.qp_solver.QP_SOLVERS
+        :type qp_solver: str
+        :param qp_problem_folder: if not empty, all qp problems are saved in this folder, e.g. for benchmarks
+        :type qp_problem_folder: str
         """
         self.collision_goal_identifier = collision_goal_identifier
         self.controlled_joints_identifier = controlled_joints_identifier
@@ -47,6 +63,10 @@ class CartesianBulletControllerPlugin(RobotPlugin):
         self.path_to_functions = path_to_functions
         self.nWSR = nWSR
         self.default_joint_vel_limit = default_joint_vel_limit
+        self.sparse_qp_matrices = sparse_qp_matrices
+        self.compiler = compiler
+        self.qp_solver = qp_solver
+        self.qp_problem_folder = qp_problem_folder
         self.root = root_link
         self._joint_states_identifier = js_identifier
         self._goal_identifier = goal_identifier
@@ -59,18 +79,28 @@ class CartesianBulletControllerPlugin(RobotPlugin):
         self.robot = None
         self.used_joints = set()
         self.controllable_links = set()
+        self.param_indices = None
+        self.params = None
         super(CartesianBulletControllerPlugin, self).__init__(robot_description_identifier,
                                                               self._joint_states_identifier,
                                                               self.default_joint_vel_limit)
 
+    def make_empty_copy(self):
+        """
+        :return: a copy that shares nothing with this plugin
+        :rtype: CartesianBulletControllerPlugin
+        """
+        return self.__class__(self.root, self._joint_states_identifier, self._fk_identifier,
+                              self._goal_identifier, self._next_cmd_identifier, self._collision_identifier,
+                              self._closest_point_identifier, self.controlled_joints_identifier,
+                              self.controllable_links_identifier, self._robot_description_identifier,
+                              self.collision_goal_identifier, self._pyfunctions_identifier,
+                              self.path_to_functions, self.nWSR,
+                              self.default_joint_vel_limit, self.sparse_qp_matrices, self.compiler,
+                              self.qp_solver, self.qp_problem_folder)
+
     def copy(self):
-        cp = self.__class__(self.root, self._joint_states_identifier, self._fk_identifier,
-                            self._goal_identifier, self._next_cmd_identifier, self._collision_identifier,
-                            self._closest_point_identifier, self.controlled_joints_identifier,
-                            self.controllable_links_identifier, self._robot_description_identifier,
-                            self.collision_goal_identifier, self._pyfunctions_identifier,
-                            self.path_to_functions, self.nWSR,
-                            self.default_joint_vel_limit)
+        cp = self.make_empty_copy()
         cp.controller = self.controller
         cp.robot = self.robot
         cp.known_constraints = self.known_constraints
@@ -78,6 +108,9 @@ class CartesianBulletControllerPlugin(RobotPlugin):
         return cp
 
     def start_always(self):
+        if self.controller is not None:
+            # the problems of the previous goal are complete
+            self.controller.flush_qp_problems()
         super(CartesianBulletControllerPlugin, self).start_always()
         self.next_cmd = {}
         self.update_controlled_joints_and_links()
@@ -87,14 +120,47 @@ class CartesianBulletControllerPlugin(RobotPlugin):
             self.add_collision_avoidance_soft_constraints()
         self.add_cart_controller_soft_constraints()
         self.set_unused_joint_goals_to_current()
+        # the constraints might have changed, the parameter indices are looked up again during the next update
+        self.param_indices = None
+        self.params = None
 
     def update(self):
-        expr = self.god_map.get_symbol_map()
-        next_cmd = self.controller.get_cmd(expr, self.nWSR)
+        if self.param_indices is None:
+            self.param_indices = self.god_map.get_symbol_indices(self.controller.get_str_params())
+            self.params = np.zeros(len(self.param_indices))
+        self.god_map.get_symbol_values(self.param_indices, self.params)
+        next_cmd = self.controller.get_cmd(self.params, self.nWSR)
         self.next_cmd.update(next_cmd)
-
         self.god_map.set_data([self._next_cmd_identifier], self.next_cmd)
 
+    def get_warm_up_jobs(self, urdf, controlled_joints, chains):
+        """
+        :param chains: list of (root, tip)
+        :type chains: list
+        :return: args for warm_up_controller for a controller without cartesian goals and one for translation and
+                    rotation goals for each chain.
+        :rtype: list
+        """
+        plugin = self.make_empty_copy()
+        # the pool can't be send to worker processes
+        plugin.compiler = None
+        goals = [{}]
+        for root, tip in chains:
+            for t in [Controller.TRANSLATION_3D, Controller.ROTATION_3D]:
+                goals.append({str(t): {(str(root), str(tip)): Controller()}})
+        jobs = []
+        for goal in goals:
+            goal.setdefault(str(Controller.JOINT), {})
+            goal.setdefault(str(Controller.TRANSLATION_3D), {})
+            goal.setdefault(str(Controller.ROTATION_3D), {})
+            # joint states are only needed for the goals of unused joints
+            js = {joint_name: {u'position': 0.} for joint_name in controlled_joints}
+            jobs.append((plugin, {self._robot_description_identifier: urdf,
+                                  self.controlled_joints_identifier: list(controlled_joints),
+                                  self._joint_states_identifier: js,
+                                  self._goal_identifier: goal}))
+        return jobs
+
     def update_controlled_joints_and_links(self):
         """
         Gets controlled joints from god map and uses this to calculate the controllable link, which are written to
@@ -107,7 +173,8 @@ class CartesianBulletControllerPlugin(RobotPlugin):
         self.god_map.set_data([self.controllable_links_identifier], self.controllable_links)
 
     def init_controller(self):
-        self.controller = SymEngineController(self.robot, self.path_to_functions)
+        self.controller = SymEngineController(self.robot, self.path_to_functions, self.sparse_qp_matrices,
+                                              self.compiler, self.qp_solver, self.qp_problem_folder)
         self.controller.set_controlled_joints(self.controlled_joints)
 
     def set_unused_joint_goals_to_current(self):
@@ -117,16 +184,15 @@ class CartesianBulletControllerPlugin(RobotPlugin):
         joint_goal = self.god_map.get_data([self._goal_identifier, str(Controller.JOINT)])
         for joint_name in self.controlled_joints:
             if joint_name not in joint_goal:
-                joint_goal[joint_name] = {u'weight': 0.0,
-                                          u'p_gain': 10,
-                                          u'max_speed': self.get_robot().default_joint_velocity_limit,
-                                          u'position': self.god_map.get_data([self._joint_states_identifier,
-                                                                              joint_name,
-                                                                              u'position'])}
-                if joint_name not in self.used_joints:
-                    joint_goal[joint_name][u'weight'] = 1
-
-        self.god_map.set_data([self._goal_identifier, str(Controller.JOINT)], joint_goal)
+                # set_data copies the goal dicts on the first write, such that the goal of the parent universe
+                # stays untouched
+                self.god_map.set_data([self._goal_identifier, str(Controller.JOINT), joint_name],
+                                      {u'weight': 0.0 if joint_name in self.used_joints else 1,
+                                       u'p_gain': 10,
+                                       u'max_speed': self.get_robot().default_joint_velocity_limit,
+                                       u'position': self.god_map.get_data([self._joint_states_identifier,
+                                                                           joint_name,
+                                                                           u'position'])})
 
     def get_expr_joint_current_position(self, joint_name):
         """
@@ -185,6 +251,7 @@ class CartesianBulletControllerPlugin(RobotPlugin):
         to self.controller and saves functions for continuous joints in god map.
         """
         pyfunctions = {}
+        soft_constraints = OrderedDict()
         for joint_name in self.controlled_joints:
 
             joint_current_expr = self.get_expr_joint_current_position(joint_name)
@@ -196,16 +263,16 @@ class CartesianBulletControllerPlugin(RobotPlugin):
             if self.get_robot().is_joint_continuous(joint_name):
                 change = self.get_expr_joint_distance_to_goal(joint_name)
                 pyfunctions[change.get_key()] = change
-                soft_constraints = continuous_joint_position(joint_current_expr,
-                                                             change.get_expression(),
-                                                             weight_expr,
-                                                             gain_expr,
-                                                             max_speed_expr, joint_name)
-                self.controller.update_soft_constraints(soft_constraints, self.god_map.get_registered_symbols())
+                soft_constraints.update(continuous_joint_position(joint_current_expr,
+                                                                  change.get_expression(),
+                                                                  weight_expr,
+                                                                  gain_expr,
+                                                                  max_speed_expr, joint_name))
             else:
-                soft_constraints = joint_position(joint_current_expr, goal_joint_expr, weight_expr,
-                                                  gain_expr, max_speed_expr, joint_name)
-            self.controller.update_soft_constraints(soft_constraints, self.god_map.get_registered_symbols())
+                soft_constraints.update(joint_position(joint_current_expr, goal_joint_expr, weight_expr,
+                                                       gain_expr, max_speed_expr, joint_name))
+        # all joint constraints are compiled as one block
+        self.controller.update_soft_constraints(soft_constraints)
 
         self.god_map.set_data([self._pyfunctions_identifier], pyfunctions)
 
@@ -240,7 +307,7 @@ class CartesianBulletControllerPlugin(RobotPlugin):
                                                            contact_normal.get_expression(),
                                                            min_dist))
 
-        self.controller.update_soft_constraints(soft_constraints, self.god_map.get_registered_symbols())
+        self.controller.update_soft_constraints(soft_constraints)
 
     def add_cart_controller_soft_constraints(self):
         """
@@ -251,8 +318,7 @@ class CartesianBulletControllerPlugin(RobotPlugin):
             for (root, tip), value in self.god_map.get_data([self._goal_identifier, str(t)]).items():
                 self.used_joints.update(self.get_robot().get_joint_names_from_chain_controllable(root, tip))
                 print(u'{} -> {} type: {}'.format(root, tip, t))
-                self.controller.update_soft_constraints(self.cart_goal_to_soft_constraints(root, tip, t),
-                                                        self.god_map.get_registered_symbols())
+                self.controller.update_soft_constraints(self.cart_goal_to_soft_constraints(root, tip, t))
 
     def cart_goal_to_soft_constraints(self, root, tip, type):
         """
@@ -310,3 +376,66 @@ class CartesianBulletControllerPlugin(RobotPlugin):
                                  ns=u'{}/{}'.format(root, tip))
 
         return {}
+
+
+def warm_up_controller(plugin, god_map_data):
+    """
+    Builds all constraints of plugin for the goals in god_map_data and compiles the blocks, that are not being
+    compiled by another process, into its path_to_functions. Runs in a worker process of a ControllerCompiler.
+    :type plugin: CartesianBulletControllerPlugin
+    :param god_map_data: namespace -> value, used to initialize the god map
+    :type god_map_data: dict
+    """
+    try:
+        god_map = GodMap()
+        for namespace, value in god_map_data.items():
+            god_map.set_data([namespace], value)
+        plugin.start(god_map)
+        plugin.controller.warm_up()
+    except Exception:
+        traceback.print_exc()
+
+
+class WarmUpControllerPlugin(PluginBase):
+    """
+    Compiles likely controllers in the background, whenever the urdf or the controlled joints change.
+    """
+
+    def __init__(self, controller_plugin, compiler, chains, robot_description_identifier,
+                 controlled_joints_identifier):
+        """
+        :param controller_plugin: the plugin whose controllers get compiled
+        :type controller_plugin: CartesianBulletControllerPlugin
+        :type compiler: ControllerCompiler
+        :param chains: list of (root, tip), for which translation and rotation controllers get compiled
+        :type chains: list
+        :type robot_description_identifier: str
+        :type controlled_joints_identifier: str
+        """
+        self.controller_plugin = controller_plugin
+        self.compiler = compiler
+        self.chains = chains
+        self.robot_description_identifier = robot_description_identifier
+        self.controlled_joints_identifier = controlled_joints_identifier
+        self.urdf = None
+        self.controlled_joints = None
+        super(WarmUpControllerPlugin, self).__init__()
+
+    def start_always(self):
+        urdf = self.god_map.get_data([self.robot_description_identifier])
+        controlled_joints = list(self.god_map.get_data([self.controlled_joints_identifier]))
+        if self.urdf is None or not urdfs_equal(self.urdf, urdf) or self.controlled_joints != controlled_joints:
+            self.urdf = urdf
+            self.controlled_joints = controlled_joints
+            self.compiler.warm_up(warm_up_controller,
+                                  self.controller_plugin.get_warm_up_jobs(urdf, controlled_joints, self.chains))
+
+    def stop(self):
+        self.compiler.stop()
+
+    def copy(self):
+        cp = self.__class__(self.controller_plugin, self.compiler, self.chains, self.robot_description_identifier,
+                            self.controlled_joints_identifier)
+        cp.urdf = self.urdf
+        cp.controlled_joints = self.controlled_joints
+        return cp
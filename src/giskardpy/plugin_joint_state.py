@@ -4,6 +4,7 @@ import rospy
 
 from sensor_msgs.msg import JointState
 
+from giskardpy.event_scheduler import JOINT_STATE
 from giskardpy.plugin import PluginBase
 from giskardpy.plugin_kinematic_sim import KinematicSimPlugin
 from giskardpy.utils import to_joint_state_dict
@@ -37,6 +38,7 @@ class JointStatePlugin(PluginBase):
         except Empty:
             pass
         self.lock.put(data)
+        self.notify(JOINT_STATE)
 
     def update(self):
         try:
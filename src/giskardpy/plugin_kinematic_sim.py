@@ -1,12 +1,13 @@
-from collections import OrderedDict
+import numpy as np
 
-from giskardpy.data_types import SingleJointState
+from giskardpy.data_types import MultiJointState
 from giskardpy.plugin import PluginBase
 
 
 class KinematicSimPlugin(PluginBase):
     """
     Takes joint commands from the god map, add them to the current joint state and writes the js back to the god map.
+    The joint state is kept as MultiJointState, such that each step is a vector operation.
     """
     def __init__(self, js_identifier, next_cmd_identifier, time_identifier, sample_period):
         """
@@ -23,18 +24,35 @@ class KinematicSimPlugin(PluginBase):
         self.time = -self.frequency
         super(KinematicSimPlugin, self).__init__()
 
+    def get_velocities(self, current_js, motor_commands):
+        """
+        :type current_js: MultiJointState
+        :param motor_commands: joint name -> velocity
+        :type motor_commands: dict
+        :return: velocity for each joint in current_js, 0 for joints without command
+        :rtype: np.ndarray
+        """
+        command_names = motor_commands.keys()
+        if current_js.names is not self.names or command_names != self.command_names:
+            # the joints rarely change, the mapping from commands to joints is only computed if they do
+            self.names = current_js.names
+            self.command_names = command_names
+            known = [i for i, joint_name in enumerate(command_names) if joint_name in current_js]
+            self.command_indices = np.array(known, dtype=int)
+            self.joint_indices = np.array([current_js.name_to_index[command_names[i]] for i in known], dtype=int)
+        velocities = np.zeros(len(current_js))
+        velocities[self.joint_indices] = np.array(motor_commands.values(), dtype=float)[self.command_indices]
+        return velocities
+
     def update(self):
         self.time += self.frequency
         motor_commands = self.god_map.get_data([self.next_cmd_identifier])
         current_js = self.god_map.get_data([self.js_identifier])
         if motor_commands is not None:
-            self.next_js = OrderedDict()
-            for joint_name, sjs in current_js.items():
-                if joint_name in motor_commands:
-                    cmd = motor_commands[joint_name]
-                else:
-                    cmd = 0.0
-                self.next_js[joint_name] = SingleJointState(sjs.name, sjs.position + cmd * self.frequency, velocity=cmd)
+            if not isinstance(current_js, MultiJointState):
+                current_js = MultiJointState.from_dict(current_js)
+            velocities = self.get_velocities(current_js, motor_commands)
+            self.next_js = current_js.with_values(current_js.positions + velocities * self.frequency, velocities)
         if self.next_js is not None:
             self.god_map.set_data([self.js_identifier], self.next_js)
         else:
@@ -43,6 +61,8 @@ class KinematicSimPlugin(PluginBase):
 
     def start_always(self):
         self.next_js = None
+        self.names = None
+        self.command_names = None
 
     def copy(self):
         c = self.__class__(self.js_identifier, self.next_cmd_identifier, self.time_identifier, self.frequency)
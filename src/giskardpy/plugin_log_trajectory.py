@@ -1,12 +1,16 @@
 import numpy as np
 import pylab as plt
+from collections import deque
 from itertools import product
 
 from giskardpy.exceptions import SolverTimeoutError, InsolvableException, \
     SymengineException, PathCollisionException
 from giskardpy.plugin import PluginBase
-from giskardpy.data_types import SingleJointState, Transform, Point, Quaternion, Trajectory
-from giskardpy.utils import closest_point_constraint_violated
+from giskardpy.data_types import SingleJointState, Transform, Point, Quaternion, ArrayTrajectory, MultiJointState
+from giskardpy.utils import closest_point_constraint_violated, get_contact_distances
+
+# number of past joint states that are remembered for the wiggle detection
+WIGGLE_HISTORY_LENGTH = 1024
 
 
 class LogTrajectoryPlugin(PluginBase):
@@ -22,7 +26,7 @@ class LogTrajectoryPlugin(PluginBase):
                  closest_point_identifier,
                  controlled_joints_identifier, joint_convergence_threshold, wiggle_precision_threshold,
                  collision_time_threshold, max_traj_length,
-                 plot_trajectory=False, is_preempted=lambda: False):
+                 plot_trajectory=False, is_preempted=lambda: False, safe_prefix_cb=None, safe_prefix_length=1.):
         """
         :type trajectory_identifier: str
         :type joint_state_identifier: str
@@ -41,6 +45,12 @@ class LogTrajectoryPlugin(PluginBase):
         :param plot_trajectory: saves a plot of the joint traj for debugging.
         :type plot_trajectory: bool
         :param is_preempted: if this function evaluates to True, the planning is stopped
+        :param safe_prefix_cb: if not None, it is called with the god map and the time until which the trajectory is
+                                checked for collisions after every update, as long as this part is at least
+                                safe_prefix_length s long and no collision constraint was violated so far, such that
+                                it can be executed while the planning continues.
+        :param safe_prefix_length: in s
+        :type safe_prefix_length: float
         """
         self.plot = plot_trajectory
         self.closest_point_identifier = closest_point_identifier
@@ -54,27 +64,70 @@ class LogTrajectoryPlugin(PluginBase):
         self.max_traj_length = max_traj_length
         self.collision_time_threshold = collision_time_threshold
         self.wiggle_precision = wiggle_precision_threshold
+        self.safe_prefix_cb = safe_prefix_cb
+        self.safe_prefix_length = safe_prefix_length
         super(LogTrajectoryPlugin, self).__init__()
 
-    def round_js(self, js):
+    def hash_js(self, js):
         """
         :param js: joint_name -> SingleJointState
         :type js: dict
-        :return: a sequence of all the rounded joint positions
-        :rtype: tuple
+        :return: hash of all the rounded joint positions
+        :rtype: int
+        """
+        if isinstance(js, MultiJointState):
+            positions = js.positions
+        else:
+            positions = np.fromiter((x.position for x in js.values()), dtype=float, count=len(js))
+        # + 0. turns -0. into 0., which has different bytes
+        return hash((np.round(positions, self.wiggle_precision) + 0.).tobytes())
+
+    def get_velocities(self, js):
+        """
+        :param js: joint_name -> SingleJointState
+        :type js: dict
+        :rtype: np.ndarray
+        """
+        if isinstance(js, MultiJointState):
+            return js.velocities
+        return np.fromiter((v.velocity for v in js.values()), dtype=float, count=len(js))
+
+    def is_wiggling(self, js_hash):
+        """
+        Remembers js_hash for the last WIGGLE_HISTORY_LENGTH updates.
+        :type js_hash: int
+        :return: whether js_hash was seen during these updates
+        :rtype: bool
         """
-        return tuple(round(x.position, self.wiggle_precision) for x in js.values())
+        if js_hash in self.past_joint_states:
+            return True
+        if len(self.past_joint_state_order) == WIGGLE_HISTORY_LENGTH:
+            self.past_joint_states.discard(self.past_joint_state_order.popleft())
+        self.past_joint_state_order.append(js_hash)
+        self.past_joint_states.add(js_hash)
+        return False
 
     def update(self):
         current_js = self.god_map.get_data([self.joint_state_identifier])
         time = self.god_map.get_data([self.time_identifier])
         trajectory = self.god_map.get_data([self.trajectory_identifier])
         # traj_length = self.god_map.get_data([self.goal_identifier, 'max_trajectory_length'])
-        rounded_js = self.round_js(current_js)
+        wiggling = self.is_wiggling(self.hash_js(current_js))
         if trajectory is None:
-            trajectory = Trajectory()
+            names = current_js.names if isinstance(current_js, MultiJointState) else tuple(current_js.keys())
+            trajectory = ArrayTrajectory(names)
         trajectory.set(time, current_js)
         self.god_map.set_data([self.trajectory_identifier], trajectory)
+        # the closest points were computed for the joint state of the previous update
+        cp = self.god_map.get_data([self.closest_point_identifier])
+        contact_distances = None if cp is None else get_contact_distances(cp)
+        if self.safe_prefix_cb is not None and self.prefix_is_safe:
+            if cp is not None and closest_point_constraint_violated(cp, contact_distances=contact_distances):
+                # everything from here on might be in collision
+                self.prefix_is_safe = False
+            elif self.previous_time is not None and self.previous_time >= self.safe_prefix_length:
+                self.safe_prefix_cb(self.god_map, self.previous_time)
+            self.previous_time = time
 
         if self.is_preempted():
             print(u'goal preempted')
@@ -84,27 +137,29 @@ class LogTrajectoryPlugin(PluginBase):
             if time > self.max_traj_length:
                 self.stop_universe = True
                 raise SolverTimeoutError(u'didn\'t a solution after {} s'.format(self.max_traj_length))
-            if np.abs([v.velocity for v in current_js.values()]).max() < self.precision or \
+            velocities = self.get_velocities(current_js)
+            if (velocities.max() < self.precision and velocities.min() > -self.precision) or \
                     (self.plot and time > self.max_traj_length):
                 print(u'done')
                 if self.plot:
                     plot_trajectory(trajectory, set(self.god_map.get_data([self.controlled_joints_identifier])))
                 self.stop_universe = True
                 return
-            if not self.plot and (rounded_js in self.past_joint_states):
+            if not self.plot and wiggling:
                 self.stop_universe = True
                 raise InsolvableException(u'endless wiggling detected')
             if time >= self.collision_time_threshold:
-                cp = self.god_map.get_data([self.closest_point_identifier])
-                if closest_point_constraint_violated(cp, tolerance=1):
+                if closest_point_constraint_violated(cp, tolerance=1, contact_distances=contact_distances):
                     self.stop_universe = True
                     raise PathCollisionException(
                         u'robot is in collision after {} seconds'.format(self.collision_time_threshold))
-        self.past_joint_states.add(rounded_js)
 
     def start_always(self):
         self.stop_universe = False
         self.past_joint_states = set()
+        self.past_joint_state_order = deque()
+        self.prefix_is_safe = True
+        self.previous_time = None
 
     def stop(self):
         pass
@@ -115,24 +170,18 @@ class LogTrajectoryPlugin(PluginBase):
 
 def plot_trajectory(tj, controlled_joints):
     """
-    :type tj: Trajectory
+    :type tj: ArrayTrajectory
     :param controlled_joints: only joints in this list will be added to the plot
     :type controlled_joints: list
     """
     colors = [u'b', u'g', u'r', u'c', u'm', u'y', u'k']
     line_styles = [u'', u'--', u'-.']
     fmts = [u''.join(x) for x in product(line_styles, colors)]
-    positions = []
-    velocities = []
-    times = []
-    names = [x for x in tj._points[0.0].keys() if x in controlled_joints]
-    for time, point in tj.items():
-        positions.append([v.position for j, v in point.items() if j in controlled_joints])
-        velocities.append([v.velocity for j, v in point.items() if j in controlled_joints])
-        times.append(time)
-    positions = np.array(positions)
-    velocities = np.array(velocities).T
-    times = np.array(times)
+    names = [x for x in tj.names if x in controlled_joints]
+    indices = [tj.name_to_index[x] for x in names]
+    positions = tj.positions[:, indices]
+    velocities = tj.velocities[:, indices].T
+    times = tj.times
 
     f, (ax1, ax2) = plt.subplots(2, sharex=True)
     ax1.set_title(u'position')
@@ -0,0 +1,108 @@
+import json
+from bisect import bisect_right
+from collections import OrderedDict
+
+# upper edges of the histogram bins in s, 4 bins per decade from 1us to 10s, the last bin collects everything above
+BIN_EDGES = [10 ** (e / 4.) for e in range(-24, 5)]
+
+
+class PluginProfiler(object):
+    """
+    Collects how long the updates of plugins take.
+    For every plugin only the number of updates, the total and max time and a histogram with logarithmic bins are
+    stored, such that adding a measurement is cheap and the memory doesn't grow with the number of updates.
+    """
+
+    def __init__(self):
+        # plugin name -> [number of updates, total time, max time, histogram]
+        self.statistics = OrderedDict()
+
+    def add(self, name, duration):
+        """
+        :param name: name of the plugin
+        :type name: str
+        :param duration: wall time of one update in s
+        :type duration: float
+        """
+        try:
+            statistics = self.statistics[name]
+        except KeyError:
+            statistics = [0, 0., 0., [0] * (len(BIN_EDGES) + 1)]
+            self.statistics[name] = statistics
+        statistics[0] += 1
+        statistics[1] += duration
+        if duration > statistics[2]:
+            statistics[2] = duration
+        statistics[3][bisect_right(BIN_EDGES, duration)] += 1
+
+    def merge(self, other):
+        """
+        Adds all measurements of other to this profiler.
+        :type other: PluginProfiler
+        """
+        for name, (count, total, max_time, histogram) in other.statistics.items():
+            statistics = self.statistics.setdefault(name, [0, 0., 0., [0] * (len(BIN_EDGES) + 1)])
+            statistics[0] += count
+            statistics[1] += total
+            statistics[2] = max(statistics[2], max_time)
+            statistics[3] = [a + b for a, b in zip(statistics[3], histogram)]
+
+    def get_percentile(self, name, percentile):
+        """
+        :param percentile: between 0 and 100
+        :type percentile: float
+        :return: upper edge of the histogram bin that contains the percentile, which is at most the max time
+        :rtype: float
+        """
+        count, total, max_time, histogram = self.statistics[name]
+        threshold = count * percentile / 100.
+        cumulative = 0
+        for i, bin_count in enumerate(histogram):
+            cumulative += bin_count
+            if cumulative >= threshold and cumulative > 0:
+                if i < len(BIN_EDGES):
+                    return min(BIN_EDGES[i], max_time)
+                break
+        return max_time
+
+    def to_dict(self):
+        """
+        :return: plugin name -> dict with count, total, mean, max, bin_edges and histogram
+        :rtype: OrderedDict
+        """
+        result = OrderedDict()
+        for name, (count, total, max_time, histogram) in self.statistics.items():
+            result[name] = OrderedDict([(u'count', count),
+                                        (u'total', total),
+                                        (u'mean', total / count),
+                                        (u'max', max_time),
+                                        (u'bin_edges', BIN_EDGES),
+                                        (u'histogram', histogram)])
+        return result
+
+    def get_summary(self):
+        """
+        :return: one line per plugin with number of updates, mean, median, 95th percentile, max and share of the
+                    total time
+        :rtype: str
+        """
+        total_time = sum(total for _, total, _, _ in self.statistics.values())
+        lines = [u'{:<30} {:>7} {:>10} {:>10} {:>10} {:>10} {:>6}'.format(u'plugin', u'updates', u'mean', u'p50',
+                                                                          u'p95', u'max', u'share')]
+        for name, (count, total, max_time, histogram) in self.statistics.items():
+            lines.append(u'{:<30} {:>7} {:>9.5f}s {:>9.5f}s {:>9.5f}s {:>9.5f}s {:>5.1f}%'.format(
+                name, count, total / count, self.get_percentile(name, 50), self.get_percentile(name, 95), max_time,
+                100. * total / total_time if total_time > 0 else 0.))
+        return u'\n'.join(lines)
+
+
+def dump_profiles(file_name, profilers):
+    """
+    Saves the statistics of several profilers into a json file.
+    :type file_name: str
+    :param profilers: universe name -> PluginProfiler
+    :type profilers: dict
+    """
+    with open(file_name, u'w') as f:
+        json.dump(OrderedDict((universe, profiler.to_dict()) for universe, profiler in profilers.items()), f,
+                  indent=2)
@@ -1,5 +1,4 @@
 import traceback
-from itertools import product
 import numpy as np
 import rospy
 from geometry_msgs.msg import Point, Vector3
@@ -10,14 +9,15 @@ from std_srvs.srv import SetBool, SetBoolResponse
 from sensor_msgs.msg import JointState
 from giskard_msgs.srv import UpdateWorld, UpdateWorldResponse, UpdateWorldRequest
 from visualization_msgs.msg import Marker, MarkerArray
+from giskardpy.event_scheduler import WORLD_UPDATE
 from giskardpy.exceptions import CorruptShapeException, UnknownBodyException, \
     UnsupportedOptionException, DuplicateNameException, PhysicsWorldException
 from giskardpy.object import to_marker, world_body_to_urdf_object, from_pose_msg
 from giskardpy.plugin import PluginBase
-from giskardpy.pybullet_world import PyBulletWorld, ContactInfo
-from giskardpy.tfwrapper import transform_pose, lookup_transform, transform_point, transform_vector
+from giskardpy.pybullet_world import PyBulletWorld, ContactInfo, CollisionMatrix
+from giskardpy.tfwrapper import transform_pose, lookup_transform
 from giskardpy.data_types import ClosestPointInfo
-from giskardpy.utils import keydefaultdict, to_joint_state_dict, to_point_stamped, to_vector3_stamped, msg_to_list
+from giskardpy.utils import keydefaultdict, to_joint_state_dict, pose_msg_to_matrix
 
 
 class PyBulletPlugin(PluginBase):
@@ -43,6 +43,10 @@ class PyBulletPlugin(PluginBase):
         self.lock = Lock()
         self.object_js_subs = {}  # JointState subscribers for articulated world objects
         self.object_joint_states = {}  # JointStates messages for articulated world objects
+        self.collision_matrix = None
+        # collision goals and controllable links for which collision_matrix was computed
+        self.collision_matrix_goals = None
+        self.collision_matrix_links = None
         super(PyBulletPlugin, self).__init__()
 
     def copy(self):
@@ -94,6 +98,8 @@ class PyBulletPlugin(PluginBase):
         """
         # TODO block or queue updates while planning
         with self.lock:
+            # update waits for the lock, so it will see the changed world
+            self.notify(WORLD_UPDATE)
             try:
                 if req.operation is UpdateWorldRequest.ADD:
                     if req.rigidly_attached:
@@ -164,7 +170,7 @@ class PyBulletPlugin(PluginBase):
                 except:
                     pass
         elif self.world.get_robot().has_attached_object(name):
-            self.world.get_robot().detach_object(name)
+            self.world.detach_object(name)
         else:
             raise UnknownBodyException(u'Cannot delete unknown object {}'.format(name))
 
@@ -180,7 +186,7 @@ class PyBulletPlugin(PluginBase):
         for object_name in self.world.get_object_names():
             if object_name != u'plane': #TODO get rid of this hard coded special case
                 self.remove_object(object_name)
-        self.world.get_robot().detach_all_objects()
+        self.world.detach_all_objects()
 
     def update(self):
         """
@@ -196,7 +202,6 @@ class PyBulletPlugin(PluginBase):
             for object_name, object_joint_state in self.object_joint_states.items():
                 self.world.get_object(object_name).set_joint_state(object_joint_state)
 
-            # TODO we can look up the transform outside of this loop
             p = lookup_transform(self.map_frame, self.robot_root)
             self.world.get_robot().set_base_pose(position=[p.pose.position.x,
                                                            p.pose.position.y,
@@ -205,36 +210,55 @@ class PyBulletPlugin(PluginBase):
                                                               p.pose.orientation.y,
                                                               p.pose.orientation.z,
                                                               p.pose.orientation.w])
-            # TODO not necessary to parse collision goals every time
-            collision_goals = self.god_map.get_data([self.collision_goal_identifier])
-            collision_matrix = self.collision_goals_to_collision_matrix(collision_goals)
+            collision_matrix = self.get_collision_matrix()
             collisions = self.world.check_collisions(collision_matrix,
                                                      enable_self_collision=self.enable_self_collision)
+            rospy.logdebug(u'{} of {} link pairs culled'.format(self.world.culled_pairs, self.world.checked_pairs))
 
-            closest_point = self.collisions_to_closest_point(collisions, collision_matrix)
+            root_T_map = np.linalg.inv(pose_msg_to_matrix(p.pose))
+            closest_point = self.collisions_to_closest_point(collisions, collision_matrix, root_T_map)
 
             if self.marker:
                 self.publish_cpi_markers(closest_point)
 
             self.god_map.set_data([self.closest_point_identifier], closest_point)
 
-    def collision_goals_to_collision_matrix(self, collision_goals):
+    def get_collision_matrix(self):
+        """
+        The collision matrix is only computed again, if the collision goals, the world or the controllable links
+        have changed.
+        :rtype: CollisionMatrix
+        """
+        collision_goals = self.god_map.get_data([self.collision_goal_identifier])
+        controllable_links = self.god_map.get_data([self.controllable_links_identifier])
+        if self.collision_matrix is None or \
+                self.collision_matrix.version != self.world.version or \
+                collision_goals is not self.collision_matrix_goals or \
+                controllable_links is not self.collision_matrix_links:
+            self.collision_matrix = self.collision_goals_to_collision_matrix(collision_goals, controllable_links)
+            self.collision_matrix_goals = collision_goals
+            self.collision_matrix_links = controllable_links
+        return self.collision_matrix
+
+    def collision_goals_to_collision_matrix(self, collision_goals, controllable_links):
         """
         :param collision_goals: list of CollisionEntry
         :type collision_goals: list
-        :return: dict mapping (robot_link, body_b, link_b) -> min allowed distance
-        :rtype: dict
+        :param controllable_links: only these robot links are checked, all links if None
+        :type controllable_links: set
+        :return: (robot_link, body_b, link_b) -> min allowed distance
+        :rtype: CollisionMatrix
         """
         if collision_goals is None:
             collision_goals = []
-        min_allowed_distance = dict()
+        min_allowed_distance = CollisionMatrix(self.world)
         if len([x for x in collision_goals if x.type in [CollisionEntry.AVOID_ALL_COLLISIONS,
                                                          CollisionEntry.ALLOW_ALL_COLLISIONS]]) == 0:
             # add avoid all collision if there is no other avoid or allow all
-            collision_goals.insert(0, CollisionEntry(type=CollisionEntry.AVOID_ALL_COLLISIONS,
-                                                     min_dist=self.default_collision_avoidance_distance))
-
-        controllable_links = self.god_map.get_data([self.controllable_links_identifier])
+            collision_goals = [CollisionEntry(type=CollisionEntry.AVOID_ALL_COLLISIONS,
+                                              min_dist=self.default_collision_avoidance_distance)] + \
+                              list(collision_goals)
+        all_robot_links = set(self.world.get_robot().get_link_names())
 
         for collision_entry in collision_goals:  # type: CollisionEntry
             # check if msg got properly filled
@@ -243,9 +267,8 @@ class PyBulletPlugin(PluginBase):
 
             # if robot link is empty, use all robot links
             if collision_entry.robot_link == u'':
-                robot_links = set(self.world.get_robot().get_link_names())
-            elif collision_entry.robot_link in self.world.get_robot().get_link_names():
-                # TODO this check is linear but could be constant
+                robot_links = set(all_robot_links)
+            elif collision_entry.robot_link in all_robot_links:
                 robot_links = {collision_entry.robot_link}
             else:
                 raise UnknownBodyException(u'robot_link \'{}\' unknown'.format(collision_entry.robot_link))
@@ -273,24 +296,23 @@ class PyBulletPlugin(PluginBase):
                 else:
                     raise UnknownBodyException(u'link_b \'{}\' unknown'.format(collision_entry.link_b))
 
-                for robot_link, link_b in product(robot_links, links_b):
-                    key = (robot_link, body_b, link_b)
-                    if collision_entry.type == CollisionEntry.ALLOW_COLLISION or \
-                            collision_entry.type == CollisionEntry.ALLOW_ALL_COLLISIONS:
-                        if key in min_allowed_distance:
-                            del min_allowed_distance[key]
-                    elif collision_entry.type == CollisionEntry.AVOID_COLLISION or \
-                            collision_entry.type == CollisionEntry.AVOID_ALL_COLLISIONS:
-                        min_allowed_distance[key] = collision_entry.min_dist
+                if collision_entry.type == CollisionEntry.ALLOW_COLLISION or \
+                        collision_entry.type == CollisionEntry.ALLOW_ALL_COLLISIONS:
+                    min_allowed_distance.set_cut_off_distance(robot_links, body_b, links_b, -np.inf)
+                elif collision_entry.type == CollisionEntry.AVOID_COLLISION or \
+                        collision_entry.type == CollisionEntry.AVOID_ALL_COLLISIONS:
+                    min_allowed_distance.set_cut_off_distance(robot_links, body_b, links_b, collision_entry.min_dist)
 
         return min_allowed_distance
 
-    def collisions_to_closest_point(self, collisions, min_allowed_distance):
+    def collisions_to_closest_point(self, collisions, min_allowed_distance, root_T_map):
         """
         :param collisions: (robot_link, body_b, link_b) -> ContactInfo
         :type collisions: dict
         :param min_allowed_distance: (robot_link, body_b, link_b) -> min allowed distance
-        :type min_allowed_distance: dict
+        :type min_allowed_distance: CollisionMatrix
+        :param root_T_map: 4x4 transformation from map_frame to robot_root, used for all contacts
+        :type root_T_map: np.ndarray
         :return: robot_link -> ClosestPointInfo of closest thing
         :rtype: dict
         """
@@ -301,24 +323,31 @@ class PyBulletPlugin(PluginBase):
                                                                   k,
                                                                   '',
                                                                   (1, 0, 0)))
+        keys = []
+        collision_infos = []
+        min_dists = []
         for key, collision_info in collisions.items():  # type: ((str, str, str), ContactInfo)
             if collision_info is None:
                 continue
-            link1 = key[0]
-            a_in_robot_root = msg_to_list(transform_point(self.robot_root,
-                                                          to_point_stamped(self.map_frame,
-                                                                       collision_info.position_on_a)))
-            b_in_robot_root = msg_to_list(transform_point(self.robot_root,
-                                                          to_point_stamped(self.map_frame,
-                                                                       collision_info.position_on_b)))
-            n_in_robot_root = msg_to_list(transform_vector(self.robot_root,
-                                                           to_vector3_stamped(self.map_frame,
-                                                                          collision_info.contact_normal_on_b)))
             try:
-                cpi = ClosestPointInfo(a_in_robot_root, b_in_robot_root, collision_info.contact_distance,
-                                       min_allowed_distance[key], key[0], u'{} - {}'.format(key[1], key[2]), n_in_robot_root)
+                min_dists.append(min_allowed_distance[key])
             except KeyError:
                 continue
+            keys.append(key)
+            collision_infos.append(collision_info)
+        if len(collision_infos) == 0:
+            return closest_point
+        # all contacts are converted at once
+        columns = zip(*collision_infos)
+        rotation = root_T_map[:3, :3].T
+        translation = root_T_map[:3, 3]
+        a_in_robot_root = (np.array(columns[5]).dot(rotation) + translation).tolist()
+        b_in_robot_root = (np.array(columns[6]).dot(rotation) + translation).tolist()
+        n_in_robot_root = np.array(columns[7]).dot(rotation).tolist()
+        for i, key in enumerate(keys):
+            link1 = key[0]
+            cpi = ClosestPointInfo(a_in_robot_root[i], b_in_robot_root[i], collision_infos[i].contact_distance,
+                                   min_dists[i], key[0], u'{} - {}'.format(key[1], key[2]), n_in_robot_root[i])
             if link1 in closest_point:
                 closest_point[link1] = min(closest_point[link1], cpi, key=lambda x: x.contact_distance)
             else:
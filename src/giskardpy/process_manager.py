@@ -1,33 +1,60 @@
+import json
 import traceback
 from collections import OrderedDict
 from copy import copy
 from time import sleep, time
 
 import rospy
+from std_msgs.msg import String
 
+from giskardpy.event_scheduler import EventScheduler
 from giskardpy.god_map import GodMap
+from giskardpy.plugin_profiler import PluginProfiler, dump_profiles
 from giskardpy.exceptions import MAX_NWSR_REACHEDException, QPSolverException
 
 
 class ProcessManager(object):
     """A process manager whom plugins can be registered to, which are then executed regularly."""
 
-    def __init__(self, initial_state=None):
+    def __init__(self, initial_state=None, profile_file=u'', candidate_planner=None):
         """Initializes the process manager.
 
         Arguments:
         initial_state -- An initial god map for this process manager
+        profile_file -- if not empty, the plugin timings are saved as json in this file after every planning run
+        candidate_planner -- if not None, it runs the parallel universes in worker processes, instead of this process
         """
         self._plugins = OrderedDict()
+        self.candidate_planner = candidate_planner
         self._god_map = GodMap() if initial_state is None else copy(initial_state)
         self.original_universe = initial_state is None
+        self.scheduler = EventScheduler()
+        # wall time of the plugin updates in this universe
+        self.profiler = PluginProfiler()
+        # sum of all parallel universes and the last one
+        self.planning_profiler = PluginProfiler()
+        self.last_planning_profiler = PluginProfiler()
+        self.profile_file = profile_file
+        if self.original_universe:
+            self.profile_pub = rospy.Publisher(u'~plugin_timing', String, queue_size=1, latch=True)
+
+    def register_plugin(self, name, plugin, triggers=None, rate=None, max_rate=None):
+        """Registers a plugin with the process manager. The name needs to be unique.
 
-
-    def register_plugin(self, name, plugin):
-        """Registers a plugin with the process manager. The name needs to be unique."""
+        Arguments:
+        triggers -- events, that cause an update of the plugin in the original universe, e.g. event_scheduler.JOINT_STATE
+        rate -- the plugin is updated at least this often per second in the original universe
+        max_rate -- if the plugin has no triggers and rate, it is updated at most this often per second in the original
+                    universe, None for no limit
+        Plugins without triggers and rate are updated, whenever another plugin is updated.
+        In parallel universes, all plugins are updated every cycle.
+        """
         if name in self._plugins:
             raise KeyError(u'A plugin with name "{}" already exists.'.format(name))
         self._plugins[name] = plugin
+        self.scheduler.add_plugin(name, triggers, rate, max_rate)
+        if plugin.scheduler is None:
+            plugin.scheduler = self.scheduler
 
     def start_loop(self):
         """Starts the loop of the project manager.
@@ -37,10 +64,16 @@ class ProcessManager(object):
         """
         self.start_plugins()
         print(u'init complete')
-        while self.update() and not rospy.is_shutdown():
-            # TODO make sure this can be properly killed without rospy dependency
+        # TODO make sure this can be properly killed without rospy dependency
+        while not rospy.is_shutdown():
             if self.original_universe:
-                rospy.sleep(0.1)
+                plugin_names = self.scheduler.wait()
+                if len(plugin_names) == 0:
+                    continue
+            else:
+                plugin_names = None
+            if not self.update(plugin_names):
+                break
 
     def start_plugins(self):
         for plugin in self._plugins.values():
@@ -50,52 +83,93 @@ class ProcessManager(object):
         """Calls stop() on all registered plugins."""
         for plugin in self._plugins.values():
             plugin.stop()
+        if self.profile_file:
+            dump_profiles(self.profile_file, self.get_profilers())
+        for event, (count, mean, max_latency) in self.scheduler.get_latency_statistics().items():
+            print(u'{}: {} events, latency mean {:.4f}s, max {:.4f}s'.format(event, count, mean, max_latency))
+
+    def get_profilers(self):
+        """
+        :return: universe name -> PluginProfiler
+        :rtype: OrderedDict
+        """
+        return OrderedDict([(u'original', self.profiler),
+                            (u'planning', self.planning_profiler),
+                            (u'last planning', self.last_planning_profiler)])
+
+    def publish_profiles(self):
+        """Publishes the plugin timings as json and saves them, if profile_file is set."""
+        profilers = self.get_profilers()
+        self.profile_pub.publish(String(json.dumps(OrderedDict((universe, profiler.to_dict())
+                                                               for universe, profiler in profilers.items()))))
+        if self.profile_file:
+            dump_profiles(self.profile_file, profilers)
+
+    def make_parallel_universe(self):
+        """Returns a new process manager with a copy of the god map and the replacements of all registered plugins."""
+        parallel_universe = ProcessManager(initial_state=self._god_map)
+        for n, p in self._plugins.items():
+            parallel_universe.register_plugin(n, p.get_replacement())
+        return parallel_universe
 
     def get_god_map(self):
         """Returns the process manager's god map."""
         return self._god_map
 
-    def update(self):
+    def update(self, plugin_names=None):
         """Calls update on registered plugins.
 
-        Sequentially calls the update function on registered plugins.
+        Sequentially calls the update function on registered plugins, or only on those in plugin_names, if it is not None.
         If a plugin calls for the creation of a new parallel universe,
         it is created, a new process manager is created, replacements for
         the registered plugins are registered to it and the new process manager
         is updated until it terminates. Its resulting god map is copied to the old god map.
 
+        The wall time of every plugin update is added to the profiler of this process manager.
+
         Returns True as long as no plugin calls for the destruction of a parallel universe.
         """
         # TODO doesn't die during planning
         for plugin_name, plugin in self._plugins.items():
+            if plugin_names is not None and plugin_name not in plugin_names:
+                continue
             while True:
+                t = time()
                 plugin.update()
+                self.profiler.add(plugin_name, time() - t)
                 if plugin.end_parallel_universe():
                     print(u'destroying parallel universe')
                     return False
                 if plugin.create_parallel_universe():
-                    print(u'creating new parallel universe')
-                    parallel_universe = ProcessManager(initial_state=self._god_map)
-                    for n, p in self._plugins.items():
-                        parallel_universe.register_plugin(n, p.get_replacement())
                     t = time()
-                    e = None
-                    try:
-                        parallel_universe.start_loop()
-                    except MAX_NWSR_REACHEDException as e:
-                        print(e)
-                    except Exception as e:
-                        traceback.print_exc()
-                    finally:
-                        print(u'parallel universe died')
-                    # parallel_universe.stop()
+                    if self.candidate_planner is not None:
+                        print(u'creating {} parallel universes'.format(len(self.candidate_planner.strategies)))
+                        god_map, e, profiler = self.candidate_planner.plan(self)
+                    else:
+                        print(u'creating new parallel universe')
+                        parallel_universe = self.make_parallel_universe()
+                        e = None
+                        try:
+                            parallel_universe.start_loop()
+                        except MAX_NWSR_REACHEDException as e:
+                            print(e)
+                        except Exception as e:
+                            traceback.print_exc()
+                        finally:
+                            print(u'parallel universe died')
+                        # parallel_universe.stop()
+
+                        # copy new expressions
+                        self._god_map.copy_symbols_from(parallel_universe.get_god_map())
+                        god_map = parallel_universe.get_god_map()
+                        profiler = parallel_universe.profiler
                     rospy.loginfo(u'parallel universe existed for {}s'.format(time()-t))
 
-                    # copy new expressions
-                    self._god_map.expr_to_key = parallel_universe.get_god_map().expr_to_key
-                    self._god_map.key_to_expr = parallel_universe.get_god_map().key_to_expr
-
-                    plugin.post_mortem_analysis(parallel_universe.get_god_map(), e)
+                    self.last_planning_profiler = profiler
+                    self.planning_profiler.merge(profiler)
+                    if self.original_universe:
+                        self.publish_profiles()
+                    plugin.post_mortem_analysis(god_map, e, profiler)
                 else:
                     break
         return True
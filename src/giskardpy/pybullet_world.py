@@ -1,19 +1,20 @@
-import pickle
 import pybullet as p
 import rospkg
 import string
 import random
 import os
-from collections import namedtuple, OrderedDict, defaultdict
+from collections import namedtuple, OrderedDict, defaultdict, deque
 from itertools import combinations
+from multiprocessing import Pool, cpu_count
 from pybullet import JOINT_REVOLUTE, JOINT_PRISMATIC, JOINT_PLANAR, JOINT_SPHERICAL
 from time import time
 
-import errno
 from numpy.random.mtrand import seed
 
-from giskardpy.exceptions import UnknownBodyException, RobotExistsException, DuplicateNameException
-from giskardpy.data_types import SingleJointState, Transform, Point, Quaternion
+from giskardpy.exceptions import UnknownBodyException, RobotExistsException, DuplicateNameException, \
+    PhysicsWorldException
+from giskardpy.data_types import SingleJointState, Transform, Point, Quaternion, MultiJointState
+from giskardpy.function_cache import FunctionCache
 import numpy as np
 
 from giskardpy.utils import keydefaultdict, suppress_stdout
@@ -27,6 +28,14 @@ JointInfo = namedtuple(u'JointInfo', [u'joint_index', u'joint_name', u'joint_typ
                                      u'joint_max_force', u'joint_max_velocity', u'link_name', u'joint_axis',
                                      u'parent_frame_pos', u'parent_frame_orn', u'parent_index'])
 
+# increase this if the computation of the self collision matrix changes, such that cached matrices are outdated
+SELF_COLLISION_MATRIX_VERSION = 1
+# subfolder of path_to_data_folder for the self collision matrices, such that the eviction of compiled functions
+# doesn't delete them
+SELF_COLLISION_MATRIX_FOLDER = u'self_collision_matrices'
+# number of random joint states that a self collision worker checks at once
+SELF_COLLISION_BATCH_SIZE = 10
+
 ContactInfo = namedtuple(u'ContactInfo', [u'contact_flag', u'body_unique_id_a', u'body_unique_id_b', u'link_index_a',
                                          u'link_index_b', u'position_on_a', u'position_on_b', u'contact_normal_on_b',
                                          u'contact_distance', u'normal_force'])
@@ -80,13 +89,15 @@ def random_string(size=6):
     return u''.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(size))
 
 
-def load_urdf_string_into_bullet(urdf_string, pose):
+def load_urdf_string_into_bullet(urdf_string, pose, physics_client_id=0):
     """
     Loads a URDF string into the bullet world.
     :param urdf_string: XML string of the URDF to load.
     :type urdf_string: str
     :param pose: Pose at which to load the URDF into the world.
     :type pose: Transform
+    :param physics_client_id: pybullet client that loads the urdf
+    :type physics_client_id: int
     :return: internal PyBullet id of the loaded urdf
     :rtype: int
     """
@@ -94,11 +105,216 @@ def load_urdf_string_into_bullet(urdf_string, pose):
     # with suppress_stdout():
     id = p.loadURDF(filename, [pose.translation.x, pose.translation.y, pose.translation.z],
                     [pose.rotation.x, pose.rotation.y, pose.rotation.z, pose.rotation.w],
-                    flags=p.URDF_USE_SELF_COLLISION_EXCLUDE_PARENT)
+                    flags=p.URDF_USE_SELF_COLLISION_EXCLUDE_PARENT, physicsClientId=physics_client_id)
     os.remove(filename)
     return id
 
 
+# (pybullet client, robot id) of a self collision worker process
+self_collision_worker = None
+
+
+def init_self_collision_worker(urdf):
+    """
+    Loads urdf into a new pybullet client of a worker process.
+    :type urdf: str
+    """
+    global self_collision_worker
+    # the random state of the parent is copied, the temporary urdf files of the workers would have the same name
+    random.seed()
+    client = p.connect(p.DIRECT)
+    self_collision_worker = (client, load_urdf_string_into_bullet(urdf, Transform(), client))
+
+
+def check_self_collisions(link_pairs, d, joint_states):
+    """
+    Runs in a worker process.
+    :param link_pairs: list of (link id, link id)
+    :type link_pairs: list
+    :param d: link pairs that are closer than this are in collision
+    :type d: float
+    :param joint_states: list of joint states, each one a list of (joint index, position)
+    :type joint_states: list
+    :return: for every joint state, the set of link pairs that are in collision and were not in collision in one of the
+                previous joint states
+    :rtype: list
+    """
+    client, robot_id = self_collision_worker
+    results = []
+    for joint_state in joint_states:
+        for joint_index, position in joint_state:
+            p.resetJointState(robot_id, joint_index, position, physicsClientId=client)
+        collisions = {(link_a, link_b) for link_a, link_b in link_pairs
+                      if len(p.getClosestPoints(robot_id, robot_id, d, link_a, link_b, physicsClientId=client)) > 0}
+        link_pairs = [link_pair for link_pair in link_pairs if link_pair not in collisions]
+        results.append(collisions)
+    return results
+
+
+def sample_self_collisions(urdf, link_pairs, d, joint_states, patience, processes=None):
+    """
+    Checks the joint states in parallel worker processes, each with its own pybullet client in DIRECT mode. The
+    results are processed in the order of joint_states, such that the result doesn't depend on the number of processes.
+    :type urdf: str
+    :param link_pairs: set of (link id, link id)
+    :type link_pairs: set
+    :param d: link pairs that are closer than this are in collision
+    :type d: float
+    :param joint_states: list of joint states, each one a list of (joint index, position)
+    :type joint_states: list
+    :param patience: stops after this many joint states without new collisions
+    :type patience: int
+    :param processes: number of worker processes, the number of cpus if None
+    :type processes: int
+    :return: link pairs that are in collision in at least one of the checked joint states
+    :rtype: set
+    """
+    if processes is None:
+        processes = cpu_count()
+    rest = set(link_pairs)
+    sometimes = set()
+    joint_states_without_collisions = 0
+    batches = [joint_states[i:i + SELF_COLLISION_BATCH_SIZE]
+               for i in range(0, len(joint_states), SELF_COLLISION_BATCH_SIZE)]
+    pool = Pool(processes, initializer=init_self_collision_worker, initargs=(urdf,))
+    try:
+        pending = deque()
+        while len(rest) > 0:
+            # link pairs that were found while a batch was pending are checked again, but that doesn't change the result
+            while len(batches) > 0 and len(pending) < 2 * processes:
+                pending.append(pool.apply_async(check_self_collisions, (list(rest), d, batches.pop(0))))
+            if len(pending) == 0:
+                break
+            for collisions in pending.popleft().get():
+                new_collisions = collisions.difference(sometimes)
+                if len(new_collisions) > 0:
+                    sometimes.update(new_collisions)
+                    rest.difference_update(new_collisions)
+                    joint_states_without_collisions = 0
+                else:
+                    joint_states_without_collisions += 1
+                    if joint_states_without_collisions >= patience:
+                        print(u'no new self collisions found in the last {} joint states'.format(patience))
+                        return sometimes
+    finally:
+        pool.terminate()
+        pool.join()
+    return sometimes
+
+
+def get_aabbs(body_id, number_of_links):
+    """
+    :type body_id: int
+    :param number_of_links: including the base
+    :type number_of_links: int
+    :return: number_of_links x 2 x 3, the min and max corner of the aabb of every link, starting with the base.
+                Links without collision shape get an aabb far away from everything else.
+    :rtype: np.ndarray
+    """
+    aabbs = np.full((number_of_links, 2, 3), 1e9)
+    for i in range(number_of_links):
+        try:
+            aabbs[i] = p.getAABB(body_id, i - 1)
+        except p.error:
+            pass
+    return aabbs
+
+
+def get_aabb_distances(aabbs_a, aabbs_b):
+    """
+    :param aabbs_a: n x 2 x 3
+    :type aabbs_a: np.ndarray
+    :param aabbs_b: m x 2 x 3
+    :type aabbs_b: np.ndarray
+    :return: n x m, distance between every pair of aabbs, 0 if they overlap
+    :rtype: np.ndarray
+    """
+    gaps = np.maximum(aabbs_b[None, :, 0, :] - aabbs_a[:, None, 1, :], aabbs_a[:, None, 0, :] - aabbs_b[None, :, 1, :])
+    return np.sqrt((np.maximum(gaps, 0) ** 2).sum(axis=2))
+
+
+def get_closest_per_link(link_ids, distances):
+    """
+    :type link_ids: np.ndarray
+    :type distances: np.ndarray
+    :return: for every link id, the index of its smallest distance
+    :rtype: np.ndarray
+    """
+    order = np.lexsort((distances, link_ids))
+    sorted_link_ids = link_ids[order]
+    return order[np.r_[True, sorted_link_ids[1:] != sorted_link_ids[:-1]]]
+
+
+class CollisionMatrix(object):
+    """
+    Cut off distances between robot links and object links, stored as one matrix per object with a row for every
+    robot link and a column for every link of the object. Links are indexed by their pybullet link id + 1, because
+    the base has id -1. Pairs that are not checked have a cut off distance of -inf.
+    Link ids change when objects are attached to the robot, so a matrix is only valid for the world version it was
+    created for.
+    """
+
+    def __init__(self, world):
+        """
+        :type world: PyBulletWorld
+        """
+        self.robot = world.get_robot()
+        self.objects = {name: world.get_object(name) for name in world.get_object_names()}
+        self.version = world.version
+        # body_b -> number of robot links x number of links of body_b
+        self.cut_off_matrices = {}
+
+    @classmethod
+    def from_dict(cls, world, cut_off_distances):
+        """
+        :type world: PyBulletWorld
+        :param cut_off_distances: (robot_link, body_b, link_b) -> cut off distance
+        :type cut_off_distances: dict
+        :rtype: CollisionMatrix
+        """
+        collision_matrix = cls(world)
+        for (robot_link, body_b, link_b), distance in cut_off_distances.items():
+            collision_matrix.set_cut_off_distance([robot_link], body_b, [link_b], distance)
+        return collision_matrix
+
+    def set_cut_off_distance(self, robot_links, body_b, links_b, distance):
+        """
+        :param robot_links: names of robot links
+        :type robot_links: iterable
+        :type body_b: str
+        :param links_b: names of links of body_b
+        :type links_b: iterable
+        :param distance: cut off distance of all pairs of robot_links and links_b, -inf to not check them
+        :type distance: float
+        """
+        body = self.objects[body_b]
+        if body_b not in self.cut_off_matrices:
+            self.cut_off_matrices[body_b] = np.full((len(self.robot.link_id_to_name), len(body.link_id_to_name)),
+                                                    -np.inf)
+        rows = np.array([self.robot.link_name_to_id[robot_link] + 1 for robot_link in robot_links], dtype=int)
+        columns = np.array([body.link_name_to_id[link_b] + 1 for link_b in links_b], dtype=int)
+        self.cut_off_matrices[body_b][np.ix_(rows, columns)] = distance
+
+    def __getitem__(self, key):
+        """
+        :param key: (robot_link, body_b, link_b)
+        :type key: tuple
+        :rtype: float
+        """
+        robot_link, body_b, link_b = key
+        try:
+            distance = self.cut_off_matrices[body_b][self.robot.link_name_to_id[robot_link] + 1,
+                                                     self.objects[body_b].link_name_to_id[link_b] + 1]
+        except KeyError:
+            raise KeyError(key)
+        if distance == -np.inf:
+            raise KeyError(key)
+        return distance
+
+    def __len__(self):
+        return sum(np.count_nonzero(m > -np.inf) for m in self.cut_off_matrices.values())
+
+
 class PyBulletRobot(object):
     """
     Keeps track of and offers convenience functions for an urdf object in bullet.
@@ -122,39 +338,39 @@ class PyBulletRobot(object):
         self.init_js_info()
         self.attached_objects = {}
         if calc_self_collision_matrix:
-            if not self.load_self_collision_matrix():
-                self.sometimes = self.calc_self_collision_matrix(set(combinations(self.joint_id_to_info.keys(), 2)))
-                self.save_self_collision_matrix()
+            self.sometimes = self.get_self_collision_matrix(set(combinations(self.joint_id_to_info.keys(), 2)))
         else:
             self.sometimes = set()
 
-    def load_self_collision_matrix(self):
-        """
-        :rtype: bool
-        """
-        urdf_hash = hashlib.md5(self.original_urdf).hexdigest()
-        path = self.path_to_data_folder + urdf_hash
-        if os.path.isfile(path):
-            with open(path) as f:
-                self.sometimes = pickle.load(f)
-                print(u'loaded self collision matrix {}'.format(urdf_hash))
-                return True
-        return False
-
-    def save_self_collision_matrix(self):
-        urdf_hash = hashlib.md5(self.original_urdf).hexdigest()
-        path = self.path_to_data_folder + urdf_hash
-        if not os.path.exists(os.path.dirname(path)):
-            try:
-                dir_name = os.path.dirname(path)
-                if dir_name != u'':
-                    os.makedirs(dir_name)
-            except OSError as exc:  # Guard against race condition
-                if exc.errno != errno.EEXIST:
-                    raise
-        with open(path, u'w') as file:
-            print(u'saved self collision matrix {}'.format(path))
-            pickle.dump(self.sometimes, file)
+    def get_self_collision_matrix(self, combis, d=0.05, d2=0.0, num_rnd_tries=1000, patience=200):
+        """
+        Loads the self collision matrix from the cache in path_to_data_folder or computes and saves it. The cache is
+        keyed by the urdf, combis and the parameters.
+        The matrix of older versions, which was pickled in path_to_data_folder under the md5 of the urdf, is deleted.
+        :param combis: set of (link id, link id) that are checked
+        :type combis: set
+        :rtype: set
+        """
+        combi_names = sorted((self.link_id_to_name[link_a], self.link_id_to_name[link_b]) for link_a, link_b in combis)
+        key = u'self collision matrix {} {} {} {} {} {} {}'.format(SELF_COLLISION_MATRIX_VERSION,
+                                                                 hashlib.md5(self.get_urdf()).hexdigest(),
+                                                                 hashlib.md5(str(combi_names)).hexdigest(),
+                                                                 d, d2, num_rnd_tries, patience)
+
+        def calc_self_collision_matrix():
+            # link names are saved, because the link ids depend on the order in which the links are loaded
+            return sorted((self.link_id_to_name[link_a], self.link_id_to_name[link_b])
+                          for link_a, link_b in self.calc_self_collision_matrix(combis, d, d2, num_rnd_tries,
+                                                                                patience))
+
+        data_folder = self.path_to_data_folder or os.getcwd()
+        try:
+            os.remove(os.path.join(data_folder, hashlib.md5(self.original_urdf).hexdigest()))
+        except OSError:
+            pass
+        cache = FunctionCache(os.path.join(data_folder, SELF_COLLISION_MATRIX_FOLDER), depends_on_symengine=False)
+        sometimes = cache.get_or_compute(key, calc_self_collision_matrix)
+        return {(self.link_name_to_id[link_a], self.link_name_to_id[link_b]) for link_a, link_b in sometimes}
 
     def get_attached_objects(self):
         """
@@ -169,8 +385,12 @@ class PyBulletRobot(object):
         :type multi_joint_state: dict
         :return:
         """
-        for joint_name, singe_joint_state in multi_joint_state.items():
-            p.resetJointState(self.id, self.joint_name_to_info[joint_name].joint_index, singe_joint_state.position)
+        if isinstance(multi_joint_state, MultiJointState):
+            positions = zip(multi_joint_state.names, multi_joint_state.positions)
+        else:
+            positions = ((joint_name, sjs.position) for joint_name, sjs in multi_joint_state.items())
+        for joint_name, position in positions:
+            p.resetJointState(self.id, self.joint_name_to_info[joint_name].joint_index, position)
 
     def set_base_pose(self, position=(0, 0, 0), orientation=(0, 0, 0, 1)):
         """
@@ -243,8 +463,23 @@ class PyBulletRobot(object):
                 mjs[sjs.name] = sjs
         return mjs
 
-    def calc_self_collision_matrix(self, combis, d=0.05, d2=0.0, num_rnd_tries=1000):
-        # TODO computational expansive because of too many collision checks
+    def calc_self_collision_matrix(self, combis, d=0.05, d2=0.0, num_rnd_tries=1000, patience=200, processes=None):
+        """
+        :param combis: set of (link id, link id) that are checked
+        :type combis: set
+        :param d: link pairs that are closer than this in the zero joint state are always in collision
+        :type d: float
+        :param d2: link pairs that are closer than this in some joint state are sometimes in collision
+        :type d2: float
+        :param num_rnd_tries: max number of random joint states
+        :type num_rnd_tries: int
+        :param patience: stops checking random joint states after this many without new collisions
+        :type patience: int
+        :param processes: number of worker processes for the random joint states, the number of cpus if None
+        :type processes: int
+        :return: link pairs that are sometimes in collision
+        :rtype: set
+        """
         print(u'calculating self collision matrix')
         seed(1337)
         always = set()
@@ -264,11 +499,13 @@ class PyBulletRobot(object):
         sometimes2 = self._check_all_collisions(rest, d2, self.get_max_joint_state())
         rest = rest.difference(sometimes2)
         sometimes = sometimes.union(sometimes2)
-        for i in range(num_rnd_tries):
-            sometimes2 = self._check_all_collisions(rest, d2, self.get_rnd_joint_state())
-            if len(sometimes2) > 0:
-                rest = rest.difference(sometimes2)
-                sometimes = sometimes.union(sometimes2)
+        # the joint states are drawn here, such that they don't depend on the number of processes
+        joint_states = [[(self.joint_name_to_info[joint_name].joint_index, sjs.position)
+                         for joint_name, sjs in self.get_rnd_joint_state().items()]
+                        for _ in range(num_rnd_tries)]
+        if len(rest) > 0 and len(joint_states) > 0:
+            sometimes = sometimes.union(sample_self_collisions(self.get_urdf(), rest, d2, joint_states, patience,
+                                                               processes))
         return sometimes
 
     def _check_all_collisions(self, test_links, d, js):
@@ -378,8 +615,8 @@ class PyBulletRobot(object):
         # update the collision matrix for the newly attached object
         object_id = self.link_name_to_id[object.name]
         link_pairs = {(object_id, link_id) for link_id in self.joint_id_to_info.keys()}
-        new_collisions = self.calc_self_collision_matrix(link_pairs)
-        self.sometimes.union(new_collisions)
+        new_collisions = self.get_self_collision_matrix(link_pairs)
+        self.sometimes.update(new_collisions)
         print(u'object {} attached to {} in pybullet world'.format(object.name, self.name))
 
     def get_urdf(self):
@@ -490,6 +727,12 @@ class PyBulletWorld(object):
         self._objects = {}
         self._robot = None
         self.path_to_data_folder = path_to_data_folder
+        # number of link pairs in the cut off distances of the last check_collisions and how many of them were skipped,
+        # because their aabbs are further apart than their cut off distance
+        self.checked_pairs = 0
+        self.culled_pairs = 0
+        # changes whenever objects are added, removed, attached or detached
+        self.version = 0
 
     def spawn_robot_from_urdf_file(self, robot_name, urdf_file, base_pose=Transform()):
         """
@@ -519,6 +762,7 @@ class PyBulletWorld(object):
         self.deactivate_rendering()
         self._robot = PyBulletRobot(robot_name, urdf, base_pose, path_to_data_folder=self.path_to_data_folder)
         self.activate_rendering()
+        self.version += 1
 
     def spawn_object_from_urdf_str(self, name, urdf, base_pose=Transform()):
         """
@@ -534,6 +778,7 @@ class PyBulletWorld(object):
         self.deactivate_rendering()
         self._objects[name] = PyBulletRobot(name, urdf, base_pose, False)
         self.activate_rendering()
+        self.version += 1
         print(u'object {} added to pybullet world'.format(name))
 
     def spawn_object_from_urdf_file(self, object_name, urdf_file, base_pose=Transform()):
@@ -564,6 +809,18 @@ class PyBulletWorld(object):
             raise DuplicateNameException(
                 u'Can\'t attach existing object \'{}\'.'.format(object.name))
         self.get_robot().attach_object(object, parent_link, transform)
+        self.version += 1
+
+    def detach_object(self, object_name):
+        """
+        :type object_name: str
+        """
+        self.get_robot().detach_object(object_name)
+        self.version += 1
+
+    def detach_all_objects(self):
+        self.get_robot().detach_all_objects()
+        self.version += 1
 
     def has_robot(self):
         """
@@ -618,6 +875,7 @@ class PyBulletWorld(object):
         if self._robot is not None:
             p.removeBody(self._robot.id)
             self._robot = None
+            self.version += 1
 
     def delete_object(self, object_name):
         """
@@ -630,6 +888,7 @@ class PyBulletWorld(object):
         p.removeBody(self._objects[object_name].id)
         self.activate_rendering()
         del (self._objects[object_name])
+        self.version += 1
         print(u'object {} deleted from pybullet world'.format(object_name))
 
     def delete_all_objects(self, remaining_objects=(u'plane',)):
@@ -642,14 +901,18 @@ class PyBulletWorld(object):
             if not object_name in remaining_objects:
                 self.delete_object(object_name)
 
-    def check_collisions(self, cut_off_distances, self_collision_d=0.1, enable_self_collision=True):
+    def check_collisions(self, cut_off_distances, self_collision_d=0.1, enable_self_collision=True, aabb_culling=True):
         """
-        :param cut_off_distances: (robot_link, body_b, link_b) -> cut off distance. Contacts between objects not in this
-                                    dict or further away than the cut off distance will be ignored.
-        :type cut_off_distances: dict
+        Only the closest contact of every robot link is returned.
+        :param cut_off_distances: (robot_link, body_b, link_b) -> cut off distance, as dict or CollisionMatrix.
+                                    Contacts between objects not in here or further away than the cut off distance
+                                    will be ignored.
+        :type cut_off_distances: Union[dict, CollisionMatrix]
         :param self_collision_d: distances grater than this value will be ignored
         :type self_collision_d: float
         :type enable_self_collision: bool
+        :param aabb_culling: if True, link pairs whose aabbs are further apart than their cut off distance are skipped
+        :type aabb_culling: bool
         :return: (robot_link, body_b, link_b) -> ContactInfo
         :rtype: dict
         """
@@ -658,20 +921,44 @@ class PyBulletWorld(object):
         collisions = defaultdict(lambda: None)
         if enable_self_collision:
             # TODO use cut_off_distances in self collision
-            if collisions is None:
-                collisions = self._robot.check_self_collision(self_collision_d)
-            else:
-                collisions.update(self._robot.check_self_collision(self_collision_d))
-        for k, distance in cut_off_distances.items():
-            (robot_link, body_b, link_b) = k
-            object_id = self._objects[body_b].id
-            robot_link_id = self.get_robot().link_name_to_id[robot_link]
-            link_b_id = self._objects[body_b].link_name_to_id[link_b]
-            contacts = [ContactInfo(*x) for x in p.getClosestPoints(self._robot.id, object_id,
-                                                                    distance,
-                                                                    robot_link_id, link_b_id)]
-            if len(contacts) > 0:
-                collisions.update({k: min(contacts, key=lambda x: x.contact_distance)})
+            collisions.update(self._robot.check_self_collision(self_collision_d))
+        if not isinstance(cut_off_distances, CollisionMatrix):
+            cut_off_distances = CollisionMatrix.from_dict(self, cut_off_distances)
+        elif cut_off_distances.version != self.version:
+            raise PhysicsWorldException(u'collision matrix was created for a different world')
+        robot = self.get_robot()
+        self.checked_pairs = len(cut_off_distances)
+        self.culled_pairs = 0
+        if aabb_culling and len(cut_off_distances.cut_off_matrices) > 0:
+            robot_aabbs = get_aabbs(robot.id, len(robot.link_id_to_name))
+        # one query for every object, the contacts of all link pairs are split with numpy
+        contacts = []
+        link_ids_a = []
+        distances = []
+        for body_b, cut_off_matrix in cut_off_distances.cut_off_matrices.items():
+            if aabb_culling:
+                object_aabbs = get_aabbs(self._objects[body_b].id, len(self._objects[body_b].link_id_to_name))
+                culled = get_aabb_distances(robot_aabbs, object_aabbs) > cut_off_matrix
+                self.culled_pairs += np.count_nonzero(culled & (cut_off_matrix > -np.inf))
+                cut_off_matrix = np.where(culled, -np.inf, cut_off_matrix)
+            if not (cut_off_matrix > -np.inf).any():
+                continue
+            body_contacts = p.getClosestPoints(robot.id, self._objects[body_b].id, cut_off_matrix.max())
+            if len(body_contacts) == 0:
+                continue
+            columns = zip(*body_contacts)
+            body_link_ids_a = np.array(columns[3])
+            body_distances = np.array(columns[8])
+            close = np.flatnonzero(body_distances <= cut_off_matrix[body_link_ids_a + 1, np.array(columns[4]) + 1])
+            contacts.extend((body_b, body_contacts[i]) for i in close)
+            link_ids_a.append(body_link_ids_a[close])
+            distances.append(body_distances[close])
+        if len(contacts) > 0:
+            for i in get_closest_per_link(np.concatenate(link_ids_a), np.concatenate(distances)):
+                body_b, contact = contacts[i]
+                contact = ContactInfo(*contact)
+                collisions[robot.link_id_to_name[contact.link_index_a], body_b,
+                           self._objects[body_b].link_id_to_name[contact.link_index_b]] = contact
         return collisions
 
     def activate_viewer(self):
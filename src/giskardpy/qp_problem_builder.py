@@ -1,16 +1,16 @@
-import pickle
 from collections import OrderedDict, namedtuple
 import numpy as np
 from itertools import chain
 from time import time
 
 from giskardpy import BACKEND
+from giskardpy.exceptions import SymengineException
 
 import giskardpy.symengine_wrappers as spw
-from giskardpy.qp_solver import QPSolver
+from giskardpy.qp_solver import QP_SOLVERS
 import hashlib
 
-from giskardpy.symengine_wrappers import load_compiled_function, safe_compiled_function
+from giskardpy.function_cache import FunctionCache
 
 SoftConstraint = namedtuple(u'SoftConstraint', [u'lower', u'upper', u'weight', u'expression'])
 HardConstraint = namedtuple(u'HardConstraint', [u'lower', u'upper', u'expression'])
@@ -19,181 +19,440 @@ JointConstraint = namedtuple(u'JointConstraint', [u'lower', u'upper', u'weight']
 BIG_NUMBER = 1e9
 
 
+class CompiledScatter(object):
+    """
+    Compiles only the entries of several matrices that depend on symbols into one function, such that they benefit
+    from cse, and scatters the results into preallocated arrays.
+    Zero and constant entries are only written once, when the arrays are created.
+    """
+    def __init__(self, matrices, free_symbols=None, backend=BACKEND, sparse=True):
+        """
+        :param matrices: list of (name, matrix) tuples
+        :type matrices: list
+        :param free_symbols: parameters of the compiled function, if None all symbols in matrices sorted by name.
+        :type free_symbols: list
+        :param sparse: if False, constant entries are also evaluated every time.
+        :type sparse: bool
+        """
+        self.shapes = OrderedDict()
+        self.constants = OrderedDict()
+        self.dynamic = OrderedDict()
+        # names of the matrices without symbols, independent of sparse
+        self.constant_matrices = set()
+        # name -> indices of the entries that are not always 0, independent of sparse
+        self.nonzero = OrderedDict()
+        dynamic_expressions = []
+        symbols = set()
+        for name, matrix in matrices:
+            self.shapes[name] = matrix.shape
+            constant_indices = []
+            constant_values = []
+            dynamic_indices = []
+            start = len(dynamic_expressions)
+            constant = True
+            nonzero_indices = []
+            for i, expression in enumerate(chain.from_iterable(matrix.tolist())):
+                expression = spw.sympify(expression)
+                constant = constant and len(expression.free_symbols) == 0
+                if len(expression.free_symbols) > 0 or float(expression) != 0:
+                    nonzero_indices.append(i)
+                if sparse and len(expression.free_symbols) == 0:
+                    value = float(expression)
+                    if value != 0:
+                        constant_indices.append(i)
+                        constant_values.append(value)
+                else:
+                    symbols.update(expression.free_symbols)
+                    dynamic_indices.append(i)
+                    dynamic_expressions.append(expression)
+            self.constants[name] = (np.array(constant_indices, dtype=int),
+                                    np.nan_to_num(np.array(constant_values, dtype=float)))
+            self.dynamic[name] = (np.array(dynamic_indices, dtype=int), slice(start, len(dynamic_expressions)))
+            if constant:
+                self.constant_matrices.add(name)
+            self.nonzero[name] = np.array(nonzero_indices, dtype=int)
+        if free_symbols is None:
+            free_symbols = sorted(symbols, key=str)
+        if len(dynamic_expressions) > 0:
+            self.compiled_function = spw.speed_up(spw.Matrix(dynamic_expressions), free_symbols, backend=backend)
+            self.str_params = self.compiled_function.str_params
+            self.compact = self.compiled_function.make_out_buffer()
+        else:
+            self.compiled_function = None
+            self.str_params = [str(x) for x in free_symbols]
+            self.compact = np.zeros(0)
+
+    def get_number_of_entries(self):
+        """
+        :rtype: int
+        """
+        return sum(rows * columns for rows, columns in self.shapes.values())
+
+    def get_number_of_dynamic_entries(self):
+        """
+        :rtype: int
+        """
+        return len(self.compact)
+
+    def make_buffers(self):
+        """
+        :return: name -> array with the shape of the matrix that has the zero and constant entries already filled in
+        :rtype: OrderedDict
+        """
+        buffers = OrderedDict()
+        for name, shape in self.shapes.items():
+            buffer = np.zeros(shape)
+            indices, values = self.constants[name]
+            np.put(buffer, indices, values)
+            buffers[name] = buffer
+        return buffers
+
+    def make_params_buffer(self):
+        """
+        :rtype: np.ndarray
+        """
+        return np.zeros(len(self.str_params))
+
+    def kwargs_to_params(self, kwargs, params=None):
+        """
+        :type kwargs: dict
+        :type params: np.ndarray
+        :rtype: np.ndarray
+        """
+        if params is None:
+            params = self.make_params_buffer()
+        if self.compiled_function is not None:
+            self.compiled_function.kwargs_to_params(kwargs, params)
+        return params
+
+    def evaluate_compact(self, params, nan_to_num=False):
+        """
+        Evaluates all non constant entries.
+        :param params: contiguous float64 vector ordered like self.str_params
+        :type params: np.ndarray
+        :type nan_to_num: bool
+        :return: vector with the values of all non constant entries, use self.dynamic to find out where they belong.
+                    It gets overwritten during the next call.
+        :rtype: np.ndarray
+        """
+        if self.compiled_function is not None:
+            self.compiled_function.evaluate(params, self.compact, nan_to_num)
+        return self.compact
+
+    def evaluate(self, params, buffers, nan_to_num=False):
+        """
+        Evaluates all non constant entries and writes them into buffers.
+        :param params: contiguous float64 vector ordered like self.str_params
+        :type params: np.ndarray
+        :param buffers: as returned by make_buffers
+        :type buffers: dict
+        :type nan_to_num: bool
+        """
+        compact = self.evaluate_compact(params, nan_to_num)
+        for name, (indices, s) in self.dynamic.items():
+            np.put(buffers[name], indices, compact[s])
+
+
+def compile_joint_constraints(joint_constraints_dict, hard_constraints_dict, controlled_joint_symbols, sparse=True):
+    """
+    :type joint_constraints_dict: dict
+    :type hard_constraints_dict: dict
+    :type controlled_joint_symbols: list
+    :type sparse: bool
+    :return: block with the joint weights, joint limits and the rows of the hard constraints
+    :rtype: CompiledScatter
+    """
+    matrices = [(u'weights', spw.Matrix([c.weight for c in joint_constraints_dict.values()])),
+                (u'lb', spw.Matrix([c.lower for c in joint_constraints_dict.values()])),
+                (u'ub', spw.Matrix([c.upper for c in joint_constraints_dict.values()]))]
+    if len(hard_constraints_dict) > 0:
+        A = spw.Matrix([c.expression for c in hard_constraints_dict.values()])
+        matrices.extend([(u'A', A.jacobian(spw.Matrix(controlled_joint_symbols))),
+                         (u'lbA', spw.Matrix([c.lower for c in hard_constraints_dict.values()])),
+                         (u'ubA', spw.Matrix([c.upper for c in hard_constraints_dict.values()]))])
+    return CompiledScatter(matrices, sparse=sparse)
+
+
+def compile_soft_constraints(soft_constraints_dict, controlled_joint_symbols, sparse=True):
+    """
+    :type soft_constraints_dict: dict
+    :type controlled_joint_symbols: list
+    :type sparse: bool
+    :return: block with the weights of the slack variables and the rows of the soft constraints
+    :rtype: CompiledScatter
+    """
+    for c in soft_constraints_dict.values():
+        assert not isinstance(c.expression, spw.Matrix), u'Matrices are not allowed as soft constraint expression'
+    A = spw.Matrix([c.expression for c in soft_constraints_dict.values()])
+    t = time()
+    A = A.jacobian(spw.Matrix(controlled_joint_symbols))
+    print(u'jacobian took {}'.format(time() - t))
+    return CompiledScatter([(u'weights', spw.Matrix([c.weight for c in soft_constraints_dict.values()])),
+                            (u'A', A),
+                            (u'lbA', spw.Matrix([c.lower for c in soft_constraints_dict.values()])),
+                            (u'ubA', spw.Matrix([c.upper for c in soft_constraints_dict.values()]))],
+                           sparse=sparse)
+
+
+def constraints_hash(constraints_dicts, controlled_joint_symbols, sparse):
+    """
+    :param constraints_dicts: list of dicts that map names to constraints
+    :type constraints_dicts: list
+    :type controlled_joint_symbols: list
+    :type sparse: bool
+    :return: hash that changes if anything that influences the compiled block changes
+    :rtype: str
+    """
+    h = hashlib.md5()
+    h.update(u'{} {}'.format(BACKEND, sparse))
+    for joint_symbol in controlled_joint_symbols:
+        h.update(str(joint_symbol))
+    for constraints_dict in constraints_dicts:
+        h.update(u'|')
+        for name, constraint in constraints_dict.items():
+            h.update(str(name))
+            for expression in constraint:
+                h.update(str(expression))
+    return h.hexdigest()
+
+
+def get_block_specs(joint_constraints_dict, hard_constraints_dict, soft_constraint_blocks, controlled_joint_symbols,
+                    sparse):
+    """
+    :return: list of (hash, compile function, args) for every block of a qp problem, the first one is the block for
+                the joint and hard constraints, followed by one for each soft constraint block.
+    :rtype: list
+    """
+    specs = [(constraints_hash([joint_constraints_dict, hard_constraints_dict], controlled_joint_symbols, sparse),
+              compile_joint_constraints,
+              (joint_constraints_dict, hard_constraints_dict, controlled_joint_symbols, sparse))]
+    for soft_constraints_dict in soft_constraint_blocks:
+        specs.append((constraints_hash([soft_constraints_dict], controlled_joint_symbols, sparse),
+                      compile_soft_constraints,
+                      (soft_constraints_dict, controlled_joint_symbols, sparse)))
+    return specs
+
+
+def compile_block(path_to_functions, block_hash, compile_function, *args):
+    """
+    Compiles a block into the cache in path_to_functions, if it is not already there.
+    Used by worker processes, which is why it doesn't return the block.
+    :type path_to_functions: str
+    :type block_hash: str
+    """
+    FunctionCache(path_to_functions).get_or_compute(block_hash, compile_function, *args)
+
+
 class QProblemBuilder(object):
     """
     Wraps around QPOases. Builds the required matrices from constraints.
+    The matrices are assembled from independently compiled blocks, one for the joint and hard constraints and one for
+    each soft constraint block, such that a new soft constraint block does not require a recompilation of the others.
     """
-    def __init__(self, joint_constraints_dict, hard_constraints_dict, soft_constraints_dict, controlled_joint_symbols,
-                 free_symbols=None, path_to_functions=''):
+    def __init__(self, joint_constraints_dict, hard_constraints_dict, soft_constraint_blocks, controlled_joint_symbols,
+                 compiled_blocks=None, path_to_functions='', sparse=False, compiler=None, qp_solver=u'qpoases',
+                 qp_problem_folder=u''):
         """
         :type joint_constraints_dict: dict
         :type hard_constraints_dict: dict
-        :type soft_constraints_dict: dict
-        :type controlled_joint_symbols: set
-        :type free_symbols: set
-        :param path_to_functions: location where the compiled functions can be safed.
+        :param soft_constraint_blocks: list of dicts mapping names to SoftConstraints, each is compiled separately
+        :type soft_constraint_blocks: list
+        :type controlled_joint_symbols: list
+        :param compiled_blocks: hash -> CompiledScatter, missing blocks are loaded or compiled and added
+        :type compiled_blocks: dict
+        :param path_to_functions: folder where the compiled blocks are cached, nothing is cached if empty or None.
         :type path_to_functions: str
+        :param sparse: if True, only the entries of the matrices that are not constant are evaluated each cycle.
+        :type sparse: bool
+        :param compiler: compiles missing blocks in parallel, requires path_to_functions
+        :type compiler: giskardpy.controller_compiler.ControllerCompiler
+        :param qp_solver: name of the qp solver backend, a key of QP_SOLVERS
+        :type qp_solver: str
+        :param qp_problem_folder: if not empty, all qp problems are saved in this folder
+        :type qp_problem_folder: str
         """
         assert (not len(controlled_joint_symbols) > len(joint_constraints_dict))
         assert (not len(controlled_joint_symbols) < len(joint_constraints_dict))
         assert (len(hard_constraints_dict) <= len(controlled_joint_symbols))
         self.path_to_functions = path_to_functions
-        self.free_symbols = free_symbols
+        self.function_cache = FunctionCache(path_to_functions) if path_to_functions else None
         self.joint_constraints_dict = joint_constraints_dict
         self.hard_constraints_dict = hard_constraints_dict
-        self.soft_constraints_dict = soft_constraints_dict
+        self.soft_constraint_blocks = list(soft_constraint_blocks)
+        self.soft_constraints_dict = OrderedDict(chain.from_iterable(block.items()
+                                                                     for block in self.soft_constraint_blocks))
+        assert len(self.soft_constraints_dict) == sum(len(block) for block in self.soft_constraint_blocks), \
+            u'soft constraint names have to be unique'
         self.controlled_joints = controlled_joint_symbols
-        self.make_matrices()
+        self.compiled_blocks = {} if compiled_blocks is None else compiled_blocks
+        self.sparse = sparse
+        self.compiler = compiler if self.function_cache is not None else None
 
         self.shape1 = len(self.hard_constraints_dict) + len(self.soft_constraints_dict)
         self.shape2 = len(self.joint_constraints_dict) + len(self.soft_constraints_dict)
+        self.make_matrices()
 
-        self.qp_solver = QPSolver(len(self.joint_constraints_dict) + len(self.soft_constraints_dict),
-                                  len(self.hard_constraints_dict) + len(self.soft_constraints_dict))
+        self.init_buffers()
+        self.qp_solver = QP_SOLVERS[qp_solver](self.shape2, self.shape1, constant_A=self.is_A_constant(),
+                                               A_sparsity=self.A_sparsity, problem_folder=qp_problem_folder)
 
-    # @profile
     def make_matrices(self):
         """
-        Turns constrains into a function that computes the matrices needed for QPOases.
+        Loads or compiles the blocks of the qp matrices.
         """
-        # TODO split this into smaller functions to increase readability
         t_total = time()
-        # TODO cpu intensive
-        weights = []
-        lb = []
-        ub = []
-        lbA = []
-        ubA = []
-        soft_expressions = []
-        hard_expressions = []
-        for k, c in self.joint_constraints_dict.items():
-            weights.append(c.weight)
-            lb.append(c.lower)
-            ub.append(c.upper)
-        for k, c in self.hard_constraints_dict.items():
-            lbA.append(c.lower)
-            ubA.append(c.upper)
-            hard_expressions.append(c.expression)
-        for k, c in self.soft_constraints_dict.items():
-            weights.append(c.weight)
-            lbA.append(c.lower)
-            ubA.append(c.upper)
-            lb.append(-BIG_NUMBER)
-            ub.append(BIG_NUMBER)
-            assert not isinstance(c.expression, spw.Matrix), u'Matrices are not allowed as soft constraint expression'
-            soft_expressions.append(c.expression)
-
-        self.cython_big_ass_M = load_compiled_function(self.path_to_functions)
-        self.np_g = np.zeros(len(weights))
-
-        if self.cython_big_ass_M is None:
-            print(u'new controller requested; compiling')
-            self.H = spw.diag(*weights)
-
-            self.lb = spw.Matrix(lb)
-            self.ub = spw.Matrix(ub)
-
-            # make A
-            # hard part
-            M_controlled_joints = spw.Matrix(self.controlled_joints)
-            A_hard = spw.Matrix(hard_expressions)
-            A_hard = A_hard.jacobian(M_controlled_joints)
-            zerosHxS = spw.zeros(A_hard.shape[0], len(soft_expressions))
-            A_hard = A_hard.row_join(zerosHxS)
-
-            # soft part
-            A_soft = spw.Matrix(soft_expressions)
+        specs = get_block_specs(self.joint_constraints_dict, self.hard_constraints_dict, self.soft_constraint_blocks,
+                                self.controlled_joints, self.sparse)
+        if self.compiler is not None:
+            self.compiler.compile(self.path_to_functions,
+                                  [spec for spec in specs if spec[0] not in self.compiled_blocks])
+        # list of (hash, compiled block, first row in A, first column of its weights)
+        self.blocks = []
+        row = 0
+        column = 0
+        for i, (block_hash, compile_function, args) in enumerate(specs):
+            self.blocks.append((block_hash, self.get_block(block_hash, compile_function, *args), row, column))
+            if i == 0:
+                row += len(self.hard_constraints_dict)
+                column += len(self.joint_constraints_dict)
+            else:
+                row += len(self.soft_constraint_blocks[i - 1])
+                column += len(self.soft_constraint_blocks[i - 1])
+        number_of_entries = sum(block.get_number_of_entries() for _, block, _, _ in self.blocks)
+        number_of_dynamic_entries = sum(block.get_number_of_dynamic_entries() for _, block, _, _ in self.blocks)
+        print(u'{} of {} block entries are evaluated each cycle'.format(number_of_dynamic_entries, number_of_entries))
+        print(u'controller ready {}s'.format(time() - t_total))
+
+    def get_block(self, block_hash, compile_function, *args):
+        """
+        :param block_hash: as returned by constraints_hash
+        :type block_hash: str
+        :param compile_function: called with args, if the block is neither in memory nor on disk
+        :rtype: CompiledScatter
+        """
+        if block_hash not in self.compiled_blocks:
             t = time()
-            A_soft = A_soft.jacobian(M_controlled_joints)
-            print(u'jacobian took {}'.format(time() - t))
-            identity = spw.eye(A_soft.shape[0])
-            A_soft = A_soft.row_join(identity)
+            if self.function_cache is None:
+                block = compile_function(*args)
+            else:
+                block = self.function_cache.get_or_compute(block_hash, compile_function, *args)
+            print(u'controller block ready {}s'.format(time() - t))
+            self.compiled_blocks[block_hash] = block
+        return self.compiled_blocks[block_hash]
 
-            # final A
-            self.A = A_hard.col_join(A_soft)
+    def get_compiled_blocks(self):
+        """
+        :return: hash -> CompiledScatter of all blocks used by this qp problem
+        :rtype: dict
+        """
+        return {block_hash: block for block_hash, block, _, _ in self.blocks}
 
-            self.lbA = spw.Matrix(lbA)
-            self.ubA = spw.Matrix(ubA)
+    def init_buffers(self):
+        """
+        Preallocates all arrays needed in get_cmd, such that no memory has to be allocated during the control loop.
+        Constant entries are written here and the scatter indices of all blocks are computed.
+        """
+        number_of_joints = len(self.joint_constraints_dict)
+        number_of_hard_constraints = len(self.hard_constraints_dict)
+        self.np_H = np.zeros((self.shape2, self.shape2))
+        self.np_A = np.zeros((self.shape1, self.shape2))
+        self.np_lb = np.zeros(self.shape2)
+        self.np_ub = np.zeros(self.shape2)
+        self.np_lbA = np.zeros(self.shape1)
+        self.np_ubA = np.zeros(self.shape1)
+        self.np_g = np.zeros(self.shape2)
+        # entries of A that can be non zero
+        self.A_sparsity = np.zeros((self.shape1, self.shape2), dtype=bool)
+        # slack variables
+        for i in range(len(self.soft_constraints_dict)):
+            self.np_A[number_of_hard_constraints + i, number_of_joints + i] = 1
+            self.A_sparsity[number_of_hard_constraints + i, number_of_joints + i] = True
+            self.np_lb[number_of_joints + i] = -BIG_NUMBER
+            self.np_ub[number_of_joints + i] = BIG_NUMBER
 
-            big_ass_M_A = self.A.row_join(self.lbA).row_join(self.ubA)
-            big_ass_M_H = self.H.row_join(self.lb).row_join(self.ub)
-            # putting everything into one big matrix to take full advantage of cse in speed_up()
-            self.big_ass_M = big_ass_M_A.col_join(big_ass_M_H)
+        self.str_params = []
+        param_to_index = {}
+        for _, block, _, _ in self.blocks:
+            for str_param in block.str_params:
+                if str_param not in param_to_index:
+                    param_to_index[str_param] = len(self.str_params)
+                    self.str_params.append(str_param)
+        self.np_params = np.zeros(len(self.str_params))
 
-            t = time()
-            if self.free_symbols is None:
-                self.free_symbols = self.big_ass_M.free_symbols
-            self.cython_big_ass_M = spw.speed_up(self.big_ass_M, self.free_symbols, backend=BACKEND)
-            if self.path_to_functions is not None:
-                safe_compiled_function(self.cython_big_ass_M, self.path_to_functions)
-            print(u'autowrap took {}'.format(time() - t))
-        else:
-            print(u'controller loaded {}'.format(self.path_to_functions))
-        print(u'controller ready {}s'.format(time() - t_total))
+        # list of (block, parameter indices, block parameter buffer, list of (target, target indices, slice))
+        self.evaluation_plan = []
+        for _, block, row, column in self.blocks:
+            targets = {u'weights': (self.np_H, lambda i: (column + i) * (self.shape2 + 1)),
+                       u'lb': (self.np_lb, lambda i: column + i),
+                       u'ub': (self.np_ub, lambda i: column + i),
+                       u'A': (self.np_A, lambda i: (row + i // number_of_joints) * self.shape2 + i % number_of_joints),
+                       u'lbA': (self.np_lbA, lambda i: row + i),
+                       u'ubA': (self.np_ubA, lambda i: row + i)}
+            dynamic = []
+            for name in block.shapes:
+                target, to_target_index = targets[name]
+                indices, values = block.constants[name]
+                np.put(target, to_target_index(indices), values)
+                indices, s = block.dynamic[name]
+                if len(indices) > 0:
+                    dynamic.append((target, to_target_index(indices), s))
+            if u'A' in block.nonzero:
+                np.put(self.A_sparsity, targets[u'A'][1](block.nonzero[u'A']), True)
+            param_indices = np.array([param_to_index[str_param] for str_param in block.str_params], dtype=int)
+            self.evaluation_plan.append((block, param_indices, block.make_params_buffer(), dynamic))
+
+    def flush_qp_problems(self):
+        """
+        Saves the recorded qp problems, that are not saved yet.
+        """
+        self.qp_solver.flush_recording()
 
-    def save_pickle(self, hash, f):
-        with open(u'/tmp/{}'.format(hash), u'w') as file:
-            pickle.dump(f, file)
-
-    def load_pickle(self, hash):
-        return pickle.load(hash)
-
-    def debug_print(self, np_H, np_A, np_lb, np_ub, np_lbA, np_ubA, xdot_full=None):
-        import pandas as pd
-        lb = []
-        ub = []
-        lbA = []
-        ubA = []
-        weights = []
-        xdot = []
-        for iJ, k in enumerate(self.joint_constraints_dict.keys()):
-            key = 'j -- ' + str(k)
-            lb.append(key)
-            ub.append(key)
-            weights.append(key)
-            xdot.append(key)
-
-        for iH, k in enumerate(self.hard_constraints_dict.keys()):
-            key = 'h -- ' + str(k)
-            lbA.append(key)
-            ubA.append(key)
-
-        for iS, k in enumerate(self.soft_constraints_dict.keys()):
-            key = 's -- ' + str(k)
-            lbA.append(key)
-            ubA.append(key)
-            weights.append(key)
-            xdot.append(key)
-        p_lb = pd.DataFrame(np_lb[:-len(self.soft_constraints_dict)], lb)
-        p_ub = pd.DataFrame(np_ub[:-len(self.soft_constraints_dict)], ub)
-        p_lbA = pd.DataFrame(np_lbA, lbA)
-        p_ubA = pd.DataFrame(np_ubA, ubA)
-        p_weights = pd.DataFrame(np_H.dot(np.ones(np_H.shape[0])), weights)
-        if xdot_full is not None:
-            p_xdot = pd.DataFrame(xdot_full, xdot)
-        p_A = pd.DataFrame(np_A, lbA, weights)
-        pass
+    def is_A_constant(self):
+        """
+        :return: True, if no entry of A depends on a symbol
+        :rtype: bool
+        """
+        return all(u'A' not in block.shapes or u'A' in block.constant_matrices for _, block, _, _ in self.blocks)
+
+    def get_str_params(self):
+        """
+        :return: names of the symbols in the order expected by get_cmd, if substitutions are passed as vector.
+        :rtype: list
+        """
+        return self.str_params
+
+    def evaluate_matrices(self, substitutions):
+        """
+        Evaluates all blocks and scatters their results into the buffers created in init_buffers.
+        :type substitutions: Union[dict, np.ndarray]
+        """
+        if isinstance(substitutions, dict):
+            try:
+                for i, str_param in enumerate(self.str_params):
+                    self.np_params[i] = substitutions[str_param]
+            except KeyError as e:
+                raise SymengineException(u'KeyError: {}'.format(e.message))
+            params = self.np_params
+        else:
+            params = substitutions
+        for block, param_indices, block_params, dynamic in self.evaluation_plan:
+            np.take(params, param_indices, out=block_params)
+            # TODO nan to num is kinda dangerous, but e.g. position_conv produces nan if the goal is reached
+            compact = block.evaluate_compact(block_params, nan_to_num=True)
+            for target, indices, s in dynamic:
+                np.put(target, indices, compact[s])
 
     def get_cmd(self, substitutions, nWSR=None):
         """
         Uses substitutions for each symbol to compute the next commands for each joint.
-        :param substitutions: symbol -> value
-        :type substitutions: dict
+        :param substitutions: symbol -> value or a float64 vector with the values ordered like get_str_params()
+        :type substitutions: Union[dict, np.ndarray]
         :return: joint name -> joint command
         :rtype: dict
         """
-        np_big_ass_M = self.cython_big_ass_M(**substitutions)
-        # TODO create functions to extract the different matrices.
-        np_H = np.array(np_big_ass_M[self.shape1:, :-2])
-        np_A = np.array(np_big_ass_M[:self.shape1, :self.shape2])
-        np_lb = np.array(np_big_ass_M[self.shape1:, -2])
-        np_ub = np.array(np_big_ass_M[self.shape1:, -1])
-        np_lbA = np.array(np_big_ass_M[:self.shape1, -2])
-        np_ubA = np.array(np_big_ass_M[:self.shape1, -1])
-        # self.debug_print(np_H, np_A, np_lb, np_ub, np_lbA, np_ubA)
-        xdot_full = self.qp_solver.solve(np_H, self.np_g, np_A, np_lb, np_ub, np_lbA, np_ubA, nWSR)
+        self.evaluate_matrices(substitutions)
+        xdot_full = self.qp_solver.solve(self.np_H, self.np_g, self.np_A, self.np_lb, self.np_ub, self.np_lbA,
+                                         self.np_ubA, nWSR)
         if xdot_full is None:
             return None
-        # TODO enable debug print in an elegant way, preferably without slowing anything down
-        # self.debug_print(np_H, np_A, np_lb, np_ub, np_lbA, np_ubA, xdot_full)
         return OrderedDict((observable, xdot_full[i]) for i, observable in enumerate(self.controlled_joints))
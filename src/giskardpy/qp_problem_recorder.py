@@ -0,0 +1,159 @@
+import os
+from collections import OrderedDict, defaultdict
+from glob import glob
+from itertools import count
+from time import time
+
+import numpy as np
+
+from giskardpy.exceptions import QPSolverException
+
+DEFAULT_CHUNK_SIZE = 200
+# makes the prefixes of recorders, that are created at the same time, unique
+recorder_ids = count()
+
+
+class QPProblemRecorder(object):
+    """
+    Records every qp problem of a QPSolver together with its solution into a folder.
+    The problems are collected in preallocated arrays and written as one npz file every chunk_size problems,
+    such that recording doesn't allocate memory or write files during most control cycles.
+    H is assumed to be diagonal and only its diagonal is saved, of A only the entries in A_sparsity are saved.
+    """
+
+    def __init__(self, folder, dim_a, dim_b, A_sparsity, constant_A=False, chunk_size=DEFAULT_CHUNK_SIZE):
+        """
+        :param folder: where the chunks are saved
+        :type folder: str
+        :param dim_a: number of joint constraints + number of soft constraints
+        :type dim_a: int
+        :param dim_b: number of hard constraints + number of soft constraints
+        :type dim_b: int
+        :param A_sparsity: boolean matrix with the shape of A, False for entries that are always 0
+        :type A_sparsity: np.ndarray
+        :type constant_A: bool
+        :param chunk_size: number of problems per file
+        :type chunk_size: int
+        """
+        self.folder = folder
+        if not os.path.isdir(self.folder):
+            os.makedirs(self.folder)
+        # all files of one recording start with this prefix
+        self.prefix = u'{:x}-{}'.format(int(time() * 1e6), next(recorder_ids))
+        self.dim_a = dim_a
+        self.dim_b = dim_b
+        self.A_sparsity = A_sparsity
+        self.A_indices = np.flatnonzero(A_sparsity)
+        self.constant_A = constant_A
+        self.chunk_size = chunk_size
+        self.chunk = OrderedDict([(u'weights', np.zeros((chunk_size, dim_a))),
+                                  (u'g', np.zeros((chunk_size, dim_a))),
+                                  (u'A', np.zeros((chunk_size, len(self.A_indices)))),
+                                  (u'lb', np.zeros((chunk_size, dim_a))),
+                                  (u'ub', np.zeros((chunk_size, dim_a))),
+                                  (u'lbA', np.zeros((chunk_size, dim_b))),
+                                  (u'ubA', np.zeros((chunk_size, dim_b))),
+                                  (u'xdot', np.zeros((chunk_size, dim_a))),
+                                  (u'solve_time', np.zeros(chunk_size)),
+                                  (u'success', np.zeros(chunk_size, dtype=bool))])
+        self.number_of_problems = 0
+        self.number_of_chunks = 0
+
+    def record(self, H, g, A, lb, ub, lbA, ubA, xdot=None, solve_time=0.):
+        """
+        :param xdot: solution of the problem or None if the solver failed
+        :type xdot: np.ndarray
+        :param solve_time: how long the solver needed in s
+        :type solve_time: float
+        """
+        i = self.number_of_problems
+        c = self.chunk
+        c[u'weights'][i] = H.diagonal()
+        c[u'g'][i] = g
+        A.take(self.A_indices, out=c[u'A'][i])
+        c[u'lb'][i] = lb
+        c[u'ub'][i] = ub
+        c[u'lbA'][i] = lbA
+        c[u'ubA'][i] = ubA
+        c[u'success'][i] = xdot is not None
+        if xdot is not None:
+            c[u'xdot'][i] = xdot
+        else:
+            c[u'xdot'][i] = np.nan
+        c[u'solve_time'][i] = solve_time
+        self.number_of_problems += 1
+        if self.number_of_problems == self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes all problems that are not saved yet into a new file.
+        """
+        if self.number_of_problems == 0:
+            return
+        file_name = os.path.join(self.folder, u'{}_{:05d}.npz'.format(self.prefix, self.number_of_chunks))
+        arrays = {name: value[:self.number_of_problems] for name, value in self.chunk.items()}
+        np.savez(file_name, A_sparsity=self.A_sparsity, constant_A=self.constant_A, **arrays)
+        self.number_of_chunks += 1
+        self.number_of_problems = 0
+
+
+def load_recordings(folder):
+    """
+    :param folder: folder of one or more QPProblemRecorders
+    :type folder: str
+    :return: list of recordings, each is a dict with A_sparsity, constant_A and one array per recorded value, whose
+                first dimension is the number of problems
+    :rtype: list
+    """
+    chunks = defaultdict(list)
+    for file_name in sorted(glob(os.path.join(folder, u'*.npz'))):
+        prefix = os.path.basename(file_name).split(u'_')[0]
+        chunks[prefix].append(dict(np.load(file_name)))
+    recordings = []
+    for prefix in sorted(chunks):
+        first = chunks[prefix][0]
+        recording = {u'A_sparsity': first[u'A_sparsity'],
+                     u'constant_A': bool(first[u'constant_A'])}
+        for name in first:
+            if name not in recording:
+                recording[name] = np.concatenate([chunk[name] for chunk in chunks[prefix]])
+        recordings.append(recording)
+    return recordings
+
+
+def get_problem(recording, i):
+    """
+    :return: H, g, A, lb, ub, lbA, ubA of the i-th problem in recording
+    :rtype: tuple
+    """
+    A_sparsity = recording[u'A_sparsity']
+    A = np.zeros(A_sparsity.shape)
+    A[A_sparsity] = recording[u'A'][i]
+    return (np.diag(recording[u'weights'][i]), recording[u'g'][i], A, recording[u'lb'][i], recording[u'ub'][i],
+            recording[u'lbA'][i], recording[u'ubA'][i])
+
+
+def replay(recording, solver_class, **kwargs):
+    """
+    Solves all problems in a recording again.
+    :type recording: dict
+    :param solver_class: subclass of giskardpy.qp_solver.QPSolver
+    :param kwargs: passed to solver_class
+    :return: (solutions, solve times), solutions of failed problems are nan
+    :rtype: tuple
+    """
+    A_sparsity = recording[u'A_sparsity']
+    dim_b, dim_a = A_sparsity.shape
+    solver = solver_class(dim_a, dim_b, constant_A=recording[u'constant_A'], A_sparsity=A_sparsity, **kwargs)
+    number_of_problems = len(recording[u'solve_time'])
+    solutions = np.zeros((number_of_problems, dim_a))
+    solve_times = np.zeros(number_of_problems)
+    for i in range(number_of_problems):
+        try:
+            solutions[i] = solver.solve(*get_problem(recording, i))
+            solve_times[i] = solver.solve_time
+        except QPSolverException as e:
+            print(u'problem {} failed: {}'.format(i, e))
+            solutions[i] = np.nan
+    return solutions, solve_times
@@ -1,27 +1,94 @@
+from time import time
+
 import numpy as np
 import qpoases
 from qpoases import PyReturnValue
 
 from giskardpy.exceptions import MAX_NWSR_REACHEDException, QPSolverException
+from giskardpy.qp_problem_recorder import QPProblemRecorder
+
+try:
+    import osqp
+    import scipy.sparse as sp
+except ImportError:
+    # osqp is optional and only needed for QPSolverOSQP
+    osqp = None
 
 
 class QPSolver(object):
-    RETURN_VALUE_DICT = {value: name for name, value in vars(PyReturnValue).items()}
+    """
+    Interface for qp solver backends. The dimensions of the problem and the sparsity of A are fixed at construction.
+    """
 
-    def __init__(self, dim_a, dim_b):
+    def __init__(self, dim_a, dim_b, constant_A=False, A_sparsity=None, problem_folder=u''):
         """
         :param dim_a: number of joint constraints + number of soft constraints
         :type int
         :param dim_b: number of hard constraints + number of soft constraints
         :type int
+        :param constant_A: True if A has the same value in every cycle, e.g. because it contains no symbols.
+        :type constant_A: bool
+        :param A_sparsity: boolean matrix with the shape of A, False for entries that are always 0, None if unknown
+        :type A_sparsity: np.ndarray
+        :param problem_folder: if not empty, every problem passed to solve and its solution are recorded in this folder
+        :type problem_folder: str
         """
-        self.qpProblem = qpoases.PySQProblem(dim_a, dim_b)
-        options = qpoases.PyOptions()
-        options.printLevel = qpoases.PyPrintLevel.NONE
-        self.qpProblem.setOptions(options)
+        self.dim_a = dim_a
+        self.dim_b = dim_b
+        self.constant_A = constant_A
+        if A_sparsity is None:
+            A_sparsity = np.ones((dim_b, dim_a), dtype=bool)
+        self.A_sparsity = A_sparsity
+        if problem_folder:
+            self.recorder = QPProblemRecorder(problem_folder, dim_a, dim_b, self.A_sparsity, constant_A)
+        else:
+            self.recorder = None
         self.xdot_full = np.zeros(dim_a)
+        self.mode = self.__class__.__name__
 
         self.started = False
+        self.solve_time = 0.
+        self.total_solve_time = 0.
+        self.number_of_solves = 0
+
+    def get_mode(self):
+        """
+        :return: name of the backend and the kind of problem it solves
+        :rtype: str
+        """
+        return self.mode
+
+    def get_average_solve_time(self):
+        """
+        :return: average time in s spend in solve
+        :rtype: float
+        """
+        if self.number_of_solves == 0:
+            return 0.
+        return self.total_solve_time / self.number_of_solves
+
+    def init(self, H, g, A, lb, ub, lbA, ubA, nWSR):
+        """
+        Solves the problem without any information from previous solves and writes the solution into xdot_full.
+        Raises a QPSolverException, if no solution was found.
+        Parameters are the same as in solve.
+        """
+        raise NotImplementedError
+
+    def hotstart(self, H, g, A, lb, ub, lbA, ubA, nWSR):
+        """
+        Solves the problem, using the solution of the previous solve as starting point, and writes the solution into
+        xdot_full. Raises a QPSolverException, if no solution was found.
+        Parameters are the same as in solve.
+        """
+        raise NotImplementedError
+
+    def flush_recording(self):
+        """
+        Writes all recorded problems, that are not saved yet, to disk.
+        """
+        if self.recorder is not None:
+            self.recorder.flush()
 
     def solve(self, H, g, A, lb, ub, lbA, ubA, nWSR=None):
         """
@@ -42,31 +109,158 @@ class QPSolver(object):
         :type np.array
         :param ubA: 1d vector containing upper bounds for the change of hc and sc, len = hc+sc
         :type np.array
-        :param nWSR:
+        :param nWSR: max number of working set recalculations, only used by qpOASES
         :type np.array
         :return: x according to the equations above, len = number of joints
         :type np.array
         """
+        t = time()
+        try:
+            if not self.started:
+                self.init(H, g, A, lb, ub, lbA, ubA, nWSR)
+            else:
+                self.hotstart(H, g, A, lb, ub, lbA, ubA, nWSR)
+        except QPSolverException:
+            self.started = False
+            if self.recorder is not None:
+                self.recorder.record(H, g, A, lb, ub, lbA, ubA, None, time() - t)
+            raise
+        self.started = True
+        self.solve_time = time() - t
+        if self.recorder is not None:
+            self.recorder.record(H, g, A, lb, ub, lbA, ubA, self.xdot_full, self.solve_time)
+        self.total_solve_time += self.solve_time
+        self.number_of_solves += 1
+        return self.xdot_full
+
+
+class QPSolverQPOases(QPSolver):
+    """
+    Dense active set solver.
+    """
+    RETURN_VALUE_DICT = {value: name for name, value in vars(PyReturnValue).items()}
+    # H and A can change every cycle
+    SQPROBLEM = u'SQProblem'
+    # H and A are constant, only the vectors are passed to hotstart
+    QPROBLEM = u'QProblem'
+    # H is constant and there are no constraints besides the bounds of x
+    QPROBLEMB = u'QProblemB'
+
+    def __init__(self, dim_a, dim_b, constant_A=False, A_sparsity=None, problem_folder=u''):
+        """
+        Uses a QProblem instead of a SQProblem, if A is constant and H doesn't change.
+        """
+        super(QPSolverQPOases, self).__init__(dim_a, dim_b, constant_A, A_sparsity, problem_folder)
+        if dim_b == 0:
+            self.mode = self.QPROBLEMB
+            self.qpProblem = qpoases.PyQProblemB(dim_a)
+        elif constant_A:
+            self.mode = self.QPROBLEM
+            self.qpProblem = qpoases.PyQProblem(dim_a, dim_b)
+        else:
+            self.mode = self.SQPROBLEM
+            self.qpProblem = qpoases.PySQProblem(dim_a, dim_b)
+        options = qpoases.PyOptions()
+        options.printLevel = qpoases.PyPrintLevel.NONE
+        self.qpProblem.setOptions(options)
+        # H used during the last init, QProblem and QProblemB have to be initialized again if it changes
+        self.init_H = np.zeros((dim_a, dim_a))
+        print(u'using qpOASES {} for a qp with {} variables and {} constraints'.format(self.mode, dim_a, dim_b))
+
+    def get_nWSR(self, A, nWSR):
         # TODO kevins bug somehow results in /0
         if nWSR is None:
-            nWSR = np.array([sum(A.shape)*2])
+            return np.array([sum(A.shape)*2])
+        return np.array([nWSR])
+
+    def check_return_value(self, success, msg):
+        if success == PyReturnValue.MAX_NWSR_REACHED:
+            raise MAX_NWSR_REACHEDException(msg)
+        if success != PyReturnValue.SUCCESSFUL_RETURN:
+            raise QPSolverException(self.RETURN_VALUE_DICT[success])
+        self.qpProblem.getPrimalSolution(self.xdot_full)
+
+    def init(self, H, g, A, lb, ub, lbA, ubA, nWSR):
+        nWSR = self.get_nWSR(A, nWSR)
+        if self.mode == self.QPROBLEMB:
+            success = self.qpProblem.init(H, g, lb, ub, nWSR)
         else:
-            nWSR = np.array([nWSR])
-        if not self.started:
             success = self.qpProblem.init(H, g, A, lb, ub, lbA, ubA, nWSR)
-            if success == PyReturnValue.MAX_NWSR_REACHED:
-                self.started = False
-                raise MAX_NWSR_REACHEDException(u'Failed to initialize QP-problem.')
-        else:
+        if self.mode != self.SQPROBLEM:
+            self.init_H[:] = H
+        self.check_return_value(success, u'Failed to initialize QP-problem.')
+
+    def hotstart(self, H, g, A, lb, ub, lbA, ubA, nWSR):
+        if self.mode != self.SQPROBLEM and not np.array_equal(H, self.init_H):
+            # the weights changed, which is only possible with a new init
+            return self.init(H, g, A, lb, ub, lbA, ubA, nWSR)
+        nWSR = self.get_nWSR(A, nWSR)
+        if self.mode == self.SQPROBLEM:
             success = self.qpProblem.hotstart(H, g, A, lb, ub, lbA, ubA, nWSR)
-            if success == PyReturnValue.MAX_NWSR_REACHED:
-                self.started = False
-                raise MAX_NWSR_REACHEDException(u'Failed to hot start QP-problem.')
-        if success == PyReturnValue.SUCCESSFUL_RETURN:
-            self.started = True
+        elif self.mode == self.QPROBLEM:
+            success = self.qpProblem.hotstart(g, lb, ub, lbA, ubA, nWSR)
         else:
-            self.started = False
-            raise QPSolverException(self.RETURN_VALUE_DICT[success])
+            success = self.qpProblem.hotstart(g, lb, ub, nWSR)
+        self.check_return_value(success, u'Failed to hot start QP-problem.')
 
-        self.qpProblem.getPrimalSolution(self.xdot_full)
-        return self.xdot_full
\ No newline at end of file
+
+class QPSolverOSQP(QPSolver):
+    """
+    Sparse operator splitting solver, scales better than qpOASES if there are many collision avoidance constraints.
+    The bounds of x are added as additional rows to A.
+    """
+    # solved, solved inaccurate
+    SUCCESS_STATUS = (1, 2)
+
+    def __init__(self, dim_a, dim_b, constant_A=False, A_sparsity=None, problem_folder=u''):
+        if osqp is None:
+            raise QPSolverException(u'osqp is not installed')
+        super(QPSolverOSQP, self).__init__(dim_a, dim_b, constant_A, A_sparsity, problem_folder)
+        # P has to be upper triangular, only the diagonal of H is used, because it is always a diagonal matrix
+        self.P = sp.identity(dim_a, format=u'csc')
+        sparsity = np.vstack((self.A_sparsity, np.eye(dim_a, dtype=bool)))
+        # osqp expects the data in column major order
+        rows, columns = np.nonzero(sparsity.T)[::-1]
+        self.A_full = np.zeros(sparsity.shape)
+        self.A_full[dim_b:] = np.eye(dim_a)
+        self.A_indices = (rows, columns)
+        self.A = sp.csc_matrix((self.A_full[self.A_indices], (rows, columns)), shape=sparsity.shape)
+        self.l = np.zeros(dim_b + dim_a)
+        self.u = np.zeros(dim_b + dim_a)
+        self.problem = None
+        print(u'using osqp for a qp with {} variables, {} constraints and {} non zero entries'.format(
+            dim_a, dim_b, self.A.nnz))
+
+    def update_vectors(self, A, lbA, ubA, lb, ub):
+        self.A_full[:self.dim_b] = A
+        self.l[:self.dim_b] = lbA
+        self.l[self.dim_b:] = lb
+        self.u[:self.dim_b] = ubA
+        self.u[self.dim_b:] = ub
+
+    def get_solution(self):
+        result = self.problem.solve()
+        if result.info.status_val not in self.SUCCESS_STATUS:
+            raise QPSolverException(result.info.status)
+        self.xdot_full[:] = result.x
+
+    def init(self, H, g, A, lb, ub, lbA, ubA, nWSR):
+        self.update_vectors(A, lbA, ubA, lb, ub)
+        self.P.data[:] = np.diag(H)
+        self.A.data[:] = self.A_full[self.A_indices]
+        self.problem = osqp.OSQP()
+        self.problem.setup(P=self.P, q=g, A=self.A, l=self.l, u=self.u, verbose=False, warm_start=True)
+        self.get_solution()
+
+    def hotstart(self, H, g, A, lb, ub, lbA, ubA, nWSR):
+        self.update_vectors(A, lbA, ubA, lb, ub)
+        if self.constant_A:
+            self.problem.update(q=g, l=self.l, u=self.u, Px=np.diag(H))
+        else:
+            self.problem.update(q=g, l=self.l, u=self.u, Px=np.diag(H), Ax=self.A_full[self.A_indices])
+        self.get_solution()
+
+
+# name used by the qp_solver parameter -> backend
+QP_SOLVERS = {u'qpoases': QPSolverQPOases,
+              u'osqp': QPSolverOSQP}
@@ -1,9 +1,9 @@
-import hashlib
 from itertools import chain
 
 import symengine_wrappers as sw
 from collections import OrderedDict
-from giskardpy.qp_problem_builder import QProblemBuilder, SoftConstraint
+from giskardpy.function_cache import FunctionCache
+from giskardpy.qp_problem_builder import QProblemBuilder, SoftConstraint, get_block_specs
 from giskardpy.symengine_robot import Robot
 
 
@@ -13,19 +13,33 @@ class SymEngineController(object):
     """
     # TODO should anybody how uses this card know about constrains?
 
-    def __init__(self, robot, path_to_functions):
+    def __init__(self, robot, path_to_functions, sparse=False, compiler=None, qp_solver=u'qpoases',
+                 qp_problem_folder=u''):
         """
         :type robot: Robot
         :param path_to_functions: location where compiled functions are stored
         :type: str
+        :param sparse: if True, only the non constant entries of the qp matrices are evaluated each cycle
+        :type sparse: bool
+        :param compiler: if not None, blocks are compiled in parallel by its worker processes
+        :type compiler: giskardpy.controller_compiler.ControllerCompiler
+        :param qp_solver: name of the qp solver backend, a key of giskardpy.qp_solver.QP_SOLVERS
+        :type qp_solver: str
+        :param qp_problem_folder: if not empty, all qp problems are saved in this folder
+        :type qp_problem_folder: str
         """
         self.path_to_functions = path_to_functions
+        self.sparse = sparse
+        self.compiler = compiler
+        self.qp_solver = qp_solver
+        self.qp_problem_folder = qp_problem_folder
         self.robot = robot
         self.controlled_joints = []
         self.hard_constraints = {}
         self.joint_constraints = {}
-        self.soft_constraints = {}
-        self.free_symbols = set()
+        self.soft_constraints = OrderedDict()
+        self.soft_constraint_blocks = OrderedDict()
+        self.compiled_blocks = {}
         self.qp_problem_builder = None
 
     def set_controlled_joints(self, joint_names):
@@ -38,38 +52,80 @@ class SymEngineController(object):
                                              self.controlled_joints)
         self.hard_constraints = OrderedDict(((self.robot.get_name(), k), self.robot.hard_constraints[k]) for k in
                                             self.controlled_joints if k in self.robot.hard_constraints)
+        self.qp_problem_builder = None
 
-    def update_soft_constraints(self, soft_constraints, free_symbols):
+    def update_soft_constraints(self, soft_constraints):
         """
-        Triggers a recompile if the number of soft constraints has changed.
+        Adds soft_constraints as one block, that gets compiled separately. If a block with the same constraint names
+        already exists, it gets replaced. Triggers a recompile of this block, if any of its constraints has changed.
         :type soft_constraints: dict
-        :type free_symbols: set
         """
-        # TODO bug if soft constraints get replaced, actual amount does not change.
-        last_number_of_constraints = len(self.soft_constraints)
-        self.free_symbols.update(free_symbols)
-        self.soft_constraints.update(soft_constraints)
-        if last_number_of_constraints != len(self.soft_constraints):
+        if len(soft_constraints) == 0:
+            return
+        names = tuple(soft_constraints.keys())
+        for other_names, block in list(self.soft_constraint_blocks.items()):
+            if other_names != names and any(name in soft_constraints for name in other_names):
+                # constraints moved to the new block
+                del self.soft_constraint_blocks[other_names]
+                block = OrderedDict((k, v) for k, v in block.items() if k not in soft_constraints)
+                if len(block) > 0:
+                    self.soft_constraint_blocks[tuple(block.keys())] = block
+                self.qp_problem_builder = None
+        if names not in self.soft_constraint_blocks or self.soft_constraint_blocks[names] != soft_constraints:
+            self.soft_constraint_blocks[names] = OrderedDict(soft_constraints)
             self.qp_problem_builder = None
+        self.soft_constraints = OrderedDict(chain.from_iterable(block.items()
+                                                                for block in self.soft_constraint_blocks.values()))
+
+    def flush_qp_problems(self):
+        """
+        Saves the recorded qp problems, that are not saved yet, if qp_problem_folder is set.
+        """
+        if self.qp_problem_builder is not None:
+            self.qp_problem_builder.flush_qp_problems()
 
     def compile(self):
-        a = ''.join(str(x) for x in sorted(chain(self.soft_constraints.keys(),
-                                                 self.hard_constraints.keys(),
-                                                 self.joint_constraints.keys())))
-        function_hash = hashlib.md5(a + self.robot.get_hash()).hexdigest()
-        path_to_functions = self.path_to_functions + function_hash
+        self.flush_qp_problems()
         self.qp_problem_builder = QProblemBuilder(self.joint_constraints,
                                                   self.hard_constraints,
-                                                  self.soft_constraints,
+                                                  self.soft_constraint_blocks.values(),
                                                   self.joint_to_symbols_str.values(),
-                                                  self.free_symbols,
-                                                  path_to_functions)
+                                                  self.compiled_blocks,
+                                                  self.path_to_functions,
+                                                  self.sparse,
+                                                  self.compiler,
+                                                  self.qp_solver,
+                                                  self.qp_problem_folder)
+        # blocks that are not used anymore can still be loaded from disk
+        self.compiled_blocks = self.qp_problem_builder.get_compiled_blocks()
+
+    def warm_up(self):
+        """
+        Compiles all blocks into the cache in path_to_functions, except the ones another process is already compiling.
+        """
+        function_cache = FunctionCache(self.path_to_functions)
+        for block_hash, compile_function, args in get_block_specs(self.joint_constraints,
+                                                                  self.hard_constraints,
+                                                                  self.soft_constraint_blocks.values(),
+                                                                  self.joint_to_symbols_str.values(),
+                                                                  self.sparse):
+            function_cache.try_compute(block_hash, compile_function, *args)
+
+    def get_str_params(self):
+        """
+        Compiles the controller, if necessary.
+        :return: names of the symbols in the order expected by get_cmd, if substitutions are passed as vector.
+        :rtype: list
+        """
+        if self.qp_problem_builder is None:
+            self.compile()
+        return self.qp_problem_builder.get_str_params()
 
     def get_cmd(self, substitutions, nWSR=None):
         """
         Computes joint commands that satisfy constrains given substitutions.
-        :param substitutions: maps symbol names as str to floats.
-        :type substitutions: dict
+        :param substitutions: maps symbol names as str to floats or a float64 vector ordered like get_str_params().
+        :type substitutions: Union[dict, np.ndarray]
         :param nWSR: magic number, if None throws errors, increase this until it stops.
         :type nWSR: int
         :return: maps joint names to command
@@ -166,6 +166,19 @@ def load_compiled_function(file_name):
             raise EOFError(u'{} corrupted, pls delete'.format(file_name))
 
 
+def nan_to_num_in_place(a):
+    """
+    Like np.nan_to_num(a, copy=False), which needs numpy >= 1.13.
+    :param a: float array, nan is replaced with 0 and inf with the largest finite numbers
+    :type a: np.ndarray
+    :return: a
+    :rtype: np.ndarray
+    """
+    a[np.isnan(a)] = 0
+    finfo = np.finfo(a.dtype)
+    return np.clip(a, finfo.min, finfo.max, out=a)
+
+
 class CompiledFunction(object):
     def __init__(self, str_params, fast_f, l, shape):
         self.str_params = str_params
@@ -174,15 +187,95 @@ class CompiledFunction(object):
         self.shape = shape
 
     def __call__(self, **kwargs):
+        params = self.kwargs_to_params(kwargs)
+        out = self.make_out_buffer()
+        self.evaluate(params, out, nan_to_num=True)
+        return out.reshape(self.shape)
+
+    def kwargs_to_params(self, kwargs, params=None):
+        """
+        Writes the values of kwargs into a parameter vector, ordered like self.str_params.
+        :param kwargs: maps symbol names as str to floats
+        :type kwargs: dict
+        :param params: buffer of length len(self.str_params) that gets overwritten, a new one is created if None
+        :type params: np.ndarray
+        :rtype: np.ndarray
+        """
+        if params is None:
+            params = self.make_params_buffer()
         try:
-            filtered_args = [kwargs[k] for k in self.str_params]
-            out = np.empty(self.l)
-            self.fast_f.unsafe_real(np.array(filtered_args, dtype=np.double), out)
-            # TODO nan to num is kinda dangerous
-            return np.nan_to_num(out).reshape(self.shape)
+            for i, k in enumerate(self.str_params):
+                params[i] = kwargs[k]
         except KeyError as e:
             msg = u'KeyError: {}\ntry deleting the last loaded compiler to trigger recompilation'.format(e.message)
             raise SymengineException(msg)
+        return params
+
+    def make_params_buffer(self):
+        """
+        :return: a float64 vector which can be used as params for self.evaluate
+        :rtype: np.ndarray
+        """
+        return np.zeros(len(self.str_params))
+
+    def make_out_buffer(self):
+        """
+        :return: a flat float64 vector of length self.l which can be used as out for self.evaluate.
+                    Use out.reshape(self.shape) once to get a matrix view of it.
+        :rtype: np.ndarray
+        """
+        return np.zeros(self.l)
+
+    def evaluate(self, params, out, nan_to_num=False):
+        """
+        Evaluates the function without allocating memory.
+        :param params: contiguous float64 vector with the parameter values, ordered like self.str_params
+        :type params: np.ndarray
+        :param out: contiguous float64 vector of length self.l, gets overwritten with the result
+        :type out: np.ndarray
+        :param nan_to_num: replaces nan with 0 and inf with big numbers, this is kinda dangerous
+        :type nan_to_num: bool
+        :return: out
+        :rtype: np.ndarray
+        """
+        self.fast_f.unsafe_real(params, out)
+        if nan_to_num:
+            nan_to_num_in_place(out)
+        return out
+
+
+class ConstantFunction(CompiledFunction):
+    """
+    Used by speed_up if the function has no parameters.
+    """
+    def __init__(self, constant_result):
+        self.constant_result = constant_result
+        super(ConstantFunction, self).__init__([], None, constant_result.size, constant_result.shape)
+
+    def __call__(self, **kwargs):
+        return self.constant_result
+
+    def evaluate(self, params, out, nan_to_num=False):
+        out[:] = self.constant_result.reshape(-1)
+        if nan_to_num:
+            nan_to_num_in_place(out)
+        return out
+
+
+class SubsFunction(CompiledFunction):
+    """
+    Used by speed_up if the function could not be lambdified. Very slow.
+    """
+    def __init__(self, str_params, function):
+        self.function = function
+        super(SubsFunction, self).__init__(str_params, None, len(function), function.shape)
+
+    def evaluate(self, params, out, nan_to_num=False):
+        substitutions = {k: params[i] for i, k in enumerate(self.str_params)}
+        out[:] = np.array(self.function.subs(substitutions).tolist(), dtype=float).reshape(-1)
+        if nan_to_num:
+            nan_to_num_in_place(out)
+        return out
 
 
 def speed_up(function, parameters, backend=u'llvm'):
@@ -194,8 +287,7 @@ def speed_up(function, parameters, backend=u'llvm'):
         except:
             return
 
-        def f(**kwargs):
-            return constant_result
+        f = ConstantFunction(constant_result)
     else:
         if backend == u'llvm':
             try:
@@ -215,10 +307,7 @@ def speed_up(function, parameters, backend=u'llvm'):
         if backend in [u'llvm', u'lambda']:
             f = CompiledFunction(str_params, fast_f, len(function), function.shape)
         elif backend is None:
-            # @profile
-            def f(**kwargs):
-                filtered_kwargs = {str(k): kwargs[k] for k in str_params}
-                return np.array(function.subs(filtered_kwargs).tolist(), dtype=float).reshape(function.shape)
+            f = SubsFunction(str_params, function)
         if backend == u'python':
             f = function
 
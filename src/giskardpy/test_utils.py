@@ -131,6 +131,21 @@ class GiskardTestWrapper(object):
         rospy.set_param(u'~default_collision_avoidance_distance', 0.05)
         rospy.set_param(u'~fill_velocity_values', False)
         rospy.set_param(u'~nWSR', u'None')
+        rospy.set_param(u'~sparse_qp_matrices', False)
+        rospy.set_param(u'~compile_processes', 0)
+        rospy.set_param(u'~qp_solver', u'qpoases')
+        rospy.set_param(u'~qp_problem_folder', u'')
+        rospy.set_param(u'~update_rates', {u'action server': 10, u'bullet': 10})
+        rospy.set_param(u'~max_update_rate', 10)
+        rospy.set_param(u'~plugin_timing_file', u'')
+        rospy.set_param(u'~planning_strategies', [])
+        rospy.set_param(u'~candidate_selection', u'first')
+        rospy.set_param(u'~candidate_timeout', 30)
+        rospy.set_param(u'~pipeline_execution', False)
+        rospy.set_param(u'~stream_execution', False)
+        rospy.set_param(u'~stream_prefix_length', 1.)
+        rospy.set_param(u'~trajectory_tolerance', 0)
+        rospy.set_param(u'~retiming_velocity_scale', 0)
         rospy.set_param(u'~root_link', u'base_footprint')
         rospy.set_param(u'~enable_collision_marker', True)
         rospy.set_param(u'~enable_self_collision', False)
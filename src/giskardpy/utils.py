@@ -10,8 +10,10 @@ from numpy import pi
 import math
 from geometry_msgs.msg import PointStamped, Point, Vector3Stamped, Vector3, Pose, PoseStamped, QuaternionStamped, \
     Quaternion
+import rospy
 from sensor_msgs.msg import JointState
-from tf.transformations import quaternion_multiply, quaternion_conjugate
+from trajectory_msgs.msg import JointTrajectory, JointTrajectoryPoint
+from tf.transformations import quaternion_multiply, quaternion_conjugate, quaternion_matrix
 
 from giskardpy.data_types import SingleJointState
 from giskardpy.data_types import ClosestPointInfo
@@ -160,18 +162,37 @@ def cylinder_surface(r, h):
     return 2 * pi * r * (h + r)
 
 
-def closest_point_constraint_violated(closest_point_infos, tolerance=0.9):
+def get_contact_distances(closest_point_infos):
+    """
+    :param closest_point_infos: dict mapping a link name to a ClosestPointInfo
+    :type closest_point_infos: dict
+    :return: the ClosestPointInfos, their contact distances and their min dists
+    :rtype: (list, np.ndarray, np.ndarray)
+    """
+    cpis = list(closest_point_infos.values())
+    contact_distances = np.fromiter((cpi.contact_distance for cpi in cpis), dtype=float, count=len(cpis))
+    min_dists = np.fromiter((cpi.min_dist for cpi in cpis), dtype=float, count=len(cpis))
+    return cpis, contact_distances, min_dists
+
+
+def closest_point_constraint_violated(closest_point_infos, tolerance=0.9, contact_distances=None):
     """
     :param closest_point_infos: dict mapping a link name to a ClosestPointInfo
     :type closest_point_infos: dict
     :type tolerance: float
+    :param contact_distances: result of get_contact_distances(closest_point_infos), if it is already known
+    :type contact_distances: tuple
     :return: whether of not the contact distance for any link has been violated
     :rtype: bool
     """
-    for link_name, cpi_info in closest_point_infos.items():  # type: (str, ClosestPointInfo)
-        if cpi_info.contact_distance < cpi_info.min_dist * tolerance:
-            print(cpi_info.link_a, cpi_info.link_b, cpi_info.contact_distance)
-            return True
+    if contact_distances is None:
+        contact_distances = get_contact_distances(closest_point_infos)
+    cpis, distances, min_dists = contact_distances
+    violated = np.flatnonzero(distances < min_dists * tolerance)
+    if len(violated) > 0:
+        cpi_info = cpis[violated[0]]  # type: ClosestPointInfo
+        print(cpi_info.link_a, cpi_info.link_b, cpi_info.contact_distance)
+        return True
     return False
 
 
@@ -236,6 +257,158 @@ def dict_to_joint_states(joint_state_dict):
     return js
 
 
+def trajectory_to_msg(trajectory, joint_names, js, fill_velocity_values=False, time_offset=0.):
+    """
+    :type trajectory: giskardpy.data_types.ArrayTrajectory
+    :param joint_names: joints of the msg
+    :type joint_names: list
+    :param js: joint name -> SingleJointState, used for joints in joint_names that are not part of trajectory
+    :type js: dict
+    :param fill_velocity_values: whether velocities are added to the points
+    :type fill_velocity_values: bool
+    :param time_offset: added to the time from start of all points in s
+    :type time_offset: float
+    :rtype: JointTrajectory
+    """
+    indices = np.array([trajectory.name_to_index.get(joint_name, -1) for joint_name in joint_names], dtype=int)
+    known = indices >= 0
+    positions = np.empty((len(trajectory), len(joint_names)))
+    positions[:, known] = trajectory.positions[:, indices[known]]
+    positions[:, ~known] = [js[joint_name].position for joint_name, k in zip(joint_names, known) if not k]
+    if fill_velocity_values:
+        velocities = np.empty((len(trajectory), len(joint_names)))
+        velocities[:, known] = trajectory.velocities[:, indices[known]]
+        velocities[:, ~known] = [js[joint_name].velocity for joint_name, k in zip(joint_names, known) if not k]
+        velocities = velocities.tolist()
+    else:
+        velocities = [[] for _ in range(len(trajectory))]
+    msg = JointTrajectory()
+    msg.joint_names = joint_names
+    msg.points = [JointTrajectoryPoint(positions=p, velocities=v, time_from_start=rospy.Duration(t))
+                  for t, p, v in zip((trajectory.times + time_offset).tolist(), positions.tolist(), velocities)]
+    return msg
+
+
+def get_necessary_points(times, positions, tolerance, velocities=None):
+    """
+    Finds a subset of points, such that the interpolation between them deviates from all other points by at most
+    tolerance. Like Douglas-Peucker, but the worst point of every segment is added at the same time, such that each
+    iteration is one vector operation.
+    :param times: number of points
+    :type times: np.ndarray
+    :param positions: number of points x number of joints
+    :type positions: np.ndarray
+    :param tolerance: max position error of every joint, in rad or m
+    :type tolerance: float
+    :param velocities: number of points x number of joints, if not None the points are interpolated with cubic
+                        splines through the positions and velocities of the kept points, like joint trajectory
+                        controllers do, otherwise linearly
+    :type velocities: np.ndarray
+    :return: indices of the necessary points in ascending order, including the first and last point
+    :rtype: np.ndarray
+    """
+    if len(times) <= 2:
+        return np.arange(len(times))
+    indices = np.arange(len(times))
+    keep = np.array([0, len(times) - 1])
+    while True:
+        # index of the kept point at the start of the segment, that contains a point
+        segments = np.minimum(np.searchsorted(keep, indices, side='right') - 1, len(keep) - 2)
+        start = keep[segments]
+        end = keep[segments + 1]
+        durations = times[end] - times[start]
+        alpha = np.divide(times - times[start], durations, out=np.zeros(len(times)), where=durations > 0)
+        if velocities is None:
+            interpolated = positions[start] + alpha[:, None] * (positions[end] - positions[start])
+        else:
+            interpolated = hermite_interpolation(alpha, durations, positions[start], velocities[start],
+                                                 positions[end], velocities[end])
+        errors = np.abs(positions - interpolated).max(axis=1)
+        # rounding errors must not add kept points again
+        errors[keep] = 0.
+        # the point with the biggest error of every segment comes first
+        order = np.lexsort((-errors, segments))
+        worst = order[np.r_[True, segments[order][1:] != segments[order][:-1]]]
+        worst = worst[errors[worst] > tolerance]
+        if len(worst) == 0:
+            return keep
+        keep = np.union1d(keep, worst)
+
+
+def hermite_interpolation(alpha, durations, start_positions, start_velocities, end_positions, end_velocities):
+    """
+    Evaluates cubic splines, that are defined by the positions and velocities at the start and end of segments.
+    :param alpha: number of points, relative time of each point in its segment between 0 and 1
+    :type alpha: np.ndarray
+    :param durations: number of points, duration of the segment of each point in s
+    :type durations: np.ndarray
+    :param start_positions: number of points x number of joints
+    :type start_positions: np.ndarray
+    :type start_velocities: np.ndarray
+    :type end_positions: np.ndarray
+    :type end_velocities: np.ndarray
+    :return: number of points x number of joints
+    :rtype: np.ndarray
+    """
+    a = alpha[:, None]
+    a2 = a * a
+    a3 = a2 * a
+    d = durations[:, None]
+    return (2 * a3 - 3 * a2 + 1) * start_positions + (a3 - 2 * a2 + a) * d * start_velocities + \
+           (-2 * a3 + 3 * a2) * end_positions + (a3 - a2) * d * end_velocities
+
+
+def reduce_trajectory(trajectory, tolerance, use_velocities=False):
+    """
+    :type trajectory: giskardpy.data_types.ArrayTrajectory
+    :param tolerance: max position error of every joint, in rad or m
+    :type tolerance: float
+    :param use_velocities: whether the points are interpolated with cubic splines through the positions and velocities
+                            of the kept points, which should be True if the velocities are sent to the robot
+    :type use_velocities: bool
+    :return: trajectory without the points that can be interpolated from their neighbours
+    :rtype: giskardpy.data_types.ArrayTrajectory
+    """
+    velocities = trajectory.velocities if use_velocities else None
+    return trajectory.take(get_necessary_points(trajectory.times, trajectory.positions, tolerance, velocities))
+
+
+def retime_trajectory(trajectory, velocity_limits, min_duration=1e-3):
+    """
+    Makes the duration between two points as short as the velocity limits allow, while the positions stay the same.
+    The velocity of a point is the mean of the velocities of its adjacent segments, the robot stops at the first and
+    last point.
+    :type trajectory: giskardpy.data_types.ArrayTrajectory
+    :param velocity_limits: the max velocity of every joint of trajectory
+    :type velocity_limits: np.ndarray
+    :param min_duration: the duration between two points is at least this long in s
+    :type min_duration: float
+    :rtype: giskardpy.data_types.ArrayTrajectory
+    """
+    if len(trajectory) < 2:
+        return trajectory
+    steps = np.diff(trajectory.positions, axis=0)
+    durations = np.maximum((np.abs(steps) / velocity_limits).max(axis=1), min_duration)
+    times = np.empty(len(trajectory))
+    times[0] = trajectory.times[0]
+    times[1:] = times[0] + np.cumsum(durations)
+    segment_velocities = steps / durations[:, None]
+    velocities = np.zeros(trajectory.positions.shape)
+    velocities[1:-1] = (segment_velocities[:-1] + segment_velocities[1:]) / 2
+    return trajectory.from_arrays(trajectory.names, times, trajectory.positions.copy(), velocities)
+
+
+def pose_msg_to_matrix(pose):
+    """
+    :type pose: Pose
+    :return: 4x4 homogeneous transformation matrix
+    :rtype: np.ndarray
+    """
+    m = quaternion_matrix([pose.orientation.x, pose.orientation.y, pose.orientation.z, pose.orientation.w])
+    m[:3, 3] = [pose.position.x, pose.position.y, pose.position.z]
+    return m
+
+
 def to_point_stamped(frame_id, point):
     """
     Creates a PointStamped from a frame id and a list of floats.
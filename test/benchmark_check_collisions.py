@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Compares the time of PyBulletWorld.check_collisions with and without aabb culling in a world with many objects.
+Run it from the test folder: python benchmark_check_collisions.py [number of objects]
+"""
+import sys
+from timeit import default_timer
+
+import numpy as np
+
+from giskardpy.data_types import Transform, Point
+from giskardpy.object import Box
+from giskardpy.pybullet_world import PyBulletWorld
+
+
+def make_world(number_of_objects):
+    world = PyBulletWorld()
+    world.activate_viewer()
+    world.spawn_robot_from_urdf_file(u'pr2', u'urdfs/pr2.urdf')
+    np.random.seed(1337)
+    for i in range(number_of_objects):
+        # a kitchen with some objects close to the robot and most of them a few meters away
+        x, y = np.random.uniform(-5, 5, 2)
+        world.spawn_urdf_object(Box(u'box{}'.format(i), 0.2, 0.2, 0.2),
+                                Transform(translation=Point(x, y, np.random.uniform(0.1, 1.5))))
+    return world
+
+
+def make_cut_off_distances(world, distance=0.05):
+    robot = world.get_robot()
+    return {(robot_link, body_b, link_b): distance
+            for robot_link in robot.get_link_names()
+            for body_b in world.get_object_names()
+            for link_b in world.get_object(body_b).get_link_names()}
+
+
+def benchmark(world, cut_off_distances, aabb_culling, repetitions=100):
+    """
+    :return: mean time of check_collisions in s
+    :rtype: float
+    """
+    start = default_timer()
+    for _ in range(repetitions):
+        world.check_collisions(cut_off_distances, enable_self_collision=False, aabb_culling=aabb_culling)
+    return (default_timer() - start) / repetitions
+
+
+if __name__ == '__main__':
+    number_of_objects = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    world = make_world(number_of_objects)
+    cut_off_distances = make_cut_off_distances(world)
+    try:
+        without_culling = benchmark(world, cut_off_distances, False)
+        with_culling = benchmark(world, cut_off_distances, True)
+        print(u'{} objects, {} link pairs, {} culled'.format(number_of_objects, world.checked_pairs,
+                                                             world.culled_pairs))
+        print(u'without culling: {:.5f}s per tick'.format(without_culling))
+        print(u'with culling:    {:.5f}s per tick'.format(with_culling))
+    finally:
+        world.deactivate_viewer()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Measures the time from a new goal to the first command of a SymEngineController for the pr2, with a joint goal for
+all joints and a translation goal for the right gripper:
+cache miss: the blocks are compiled in this process, like without a ControllerCompiler
+cache miss, pool: the blocks are compiled in parallel by a ControllerCompiler
+warm pool: the blocks were compiled ahead of time and are loaded from the FunctionCache
+Every scenario starts with an empty cache in a new temporary folder.
+Run it from the test folder: python benchmark_controller_compiler.py [number of processes]
+"""
+import shutil
+import sys
+import tempfile
+from collections import OrderedDict
+from timeit import default_timer
+
+import numpy as np
+
+import giskardpy.symengine_wrappers as sw
+from giskardpy.controller_compiler import ControllerCompiler
+from giskardpy.symengine_controller import SymEngineController, joint_position, position_conv
+from giskardpy.symengine_robot import Robot
+
+ROOT = u'base_link'
+TIP = u'r_gripper_tool_frame'
+
+
+def make_controller(robot, path_to_functions, compiler):
+    """
+    :type robot: Robot
+    :type path_to_functions: str
+    :type compiler: ControllerCompiler
+    :rtype: SymEngineController
+    """
+    controller = SymEngineController(robot, path_to_functions, compiler=compiler)
+    joint_names = robot.get_joint_names_controllable()
+    controller.set_controlled_joints(joint_names)
+    soft_constraints = OrderedDict()
+    for joint_name in joint_names:
+        soft_constraints.update(joint_position(robot.get_joint_symbol(joint_name),
+                                               sw.Symbol(u'goal_{}'.format(joint_name)),
+                                               sw.Symbol(u'weight_{}'.format(joint_name)),
+                                               sw.Symbol(u'p_gain_{}'.format(joint_name)),
+                                               sw.Symbol(u'max_speed_{}'.format(joint_name)),
+                                               joint_name))
+    controller.update_soft_constraints(soft_constraints)
+    goal_position = sw.point3(sw.Symbol(u'goal_x'), sw.Symbol(u'goal_y'), sw.Symbol(u'goal_z'))
+    controller.update_soft_constraints(position_conv(goal_position,
+                                                     sw.position_of(robot.get_fk_expression(ROOT, TIP)),
+                                                     ns=u'{}/{}'.format(ROOT, TIP)))
+    return controller
+
+
+def goal_to_first_command(robot, path_to_functions, compiler):
+    """
+    :return: time in s from the creation of the controller to its first command
+    :rtype: float
+    """
+    start = default_timer()
+    controller = make_controller(robot, path_to_functions, compiler)
+    params = np.random.uniform(0.1, 1, len(controller.get_str_params()))
+    controller.get_cmd(params, nWSR=None)
+    return default_timer() - start
+
+
+if __name__ == '__main__':
+    processes = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    robot = Robot.from_urdf_file(u'urdfs/pr2.urdf')
+    np.random.seed(1337)
+    compiler = ControllerCompiler(processes)
+    folders = []
+    try:
+        folders.append(tempfile.mkdtemp())
+        cache_miss = goal_to_first_command(robot, folders[-1], None)
+        folders.append(tempfile.mkdtemp())
+        cache_miss_pool = goal_to_first_command(robot, folders[-1], compiler)
+        # compile ahead of time, like WarmUpControllerPlugin, and measure the goal afterwards
+        folders.append(tempfile.mkdtemp())
+        make_controller(robot, folders[-1], compiler).get_str_params()
+        warm_pool = goal_to_first_command(robot, folders[-1], compiler)
+        print(u'goal to first command')
+        print(u'cache miss:       {:.3f}s'.format(cache_miss))
+        print(u'cache miss, pool: {:.3f}s'.format(cache_miss_pool))
+        print(u'warm pool:        {:.3f}s'.format(warm_pool))
+    finally:
+        compiler.stop()
+        for folder in folders:
+            shutil.rmtree(folder)
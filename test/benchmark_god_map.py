@@ -0,0 +1,42 @@
+#!/usr/bin/env python
+"""
+Compares the time of GodMap.get_data for a registered identifier, which uses a compiled accessor chain, with the
+uncompiled lookup of GodMap._get_data.
+Run it from the test folder: python benchmark_god_map.py [number of lookups]
+"""
+import sys
+import timeit
+
+from giskardpy.god_map import GodMap
+
+
+class Quaternion(object):
+    def __init__(self):
+        self.x = 0.1
+        self.y = 0.2
+        self.z = 0.3
+        self.w = 0.4
+
+
+class Pose(object):
+    def __init__(self):
+        self.orientation = Quaternion()
+
+
+class PoseStamped(object):
+    def __init__(self):
+        self.pose = Pose()
+
+
+if __name__ == '__main__':
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    gm = GodMap()
+    gm.set_data([u'fk'], {(u'base', u'gripper'): PoseStamped()})
+    identifier = [u'fk', (u'base', u'gripper'), u'pose', u'orientation', u'x']
+    gm.to_symbol(identifier)
+    compiled = timeit.timeit(lambda: gm.get_data(identifier), number=number)
+    uncompiled = timeit.timeit(lambda: gm._get_data(identifier), number=number)
+    print(u'{} lookups'.format(number))
+    print(u'compiled accessor:   {:.5f}s'.format(compiled))
+    print(u'uncompiled accessor: {:.5f}s'.format(uncompiled))
+    print(u'speed up: {:.3f}'.format(uncompiled / compiled))
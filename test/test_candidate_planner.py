@@ -0,0 +1,118 @@
+import unittest
+from time import time, sleep
+
+from giskardpy.candidate_planner import CandidatePlanner, FIRST, BEST
+from giskardpy.exceptions import InsolvableException, SolverTimeoutError
+from giskardpy.plugin import PluginBase
+from giskardpy.process_manager import ProcessManager
+
+PKG = 'giskardpy'
+
+
+class CountPlugin(PluginBase):
+    """
+    Counts the time up to 10 / p_gain and ends the universe.
+    """
+
+    def update(self):
+        p_gain = self.god_map.get_data([u'goal', u'joint', u'j', u'p_gain'])
+        if p_gain == 0:
+            self.done = True
+            raise InsolvableException(u'p_gain is 0')
+        time = self.god_map.get_data([u'time']) + 1
+        self.god_map.set_data([u'time'], time)
+        self.god_map.set_data([u'js'], {u'j': time * p_gain})
+        self.done = time >= 10. / p_gain
+
+    def start_always(self):
+        self.done = False
+        self.god_map.to_symbol([u'js', u'j'])
+
+    def end_parallel_universe(self):
+        return self.done
+
+    def copy(self):
+        return self.__class__()
+
+
+class HangPlugin(PluginBase):
+    """
+    Blocks like a worker that deadlocked.
+    """
+
+    def update(self):
+        sleep(60)
+
+    def copy(self):
+        return self.__class__()
+
+
+class TestCandidatePlanner(unittest.TestCase):
+    def make_process_manager(self):
+        pm = ProcessManager()
+        pm.get_god_map().set_data([u'goal'], {u'joint': {u'j': {u'p_gain': 1.}}})
+        pm.get_god_map().set_data([u'time'], 0)
+        pm.get_god_map().set_data([u'cpi'], {})
+        pm.get_god_map().set_data([u'js'], {u'j': 0.})
+        pm.register_plugin(u'count', CountPlugin())
+        return pm
+
+    def test_best(self):
+        pm = self.make_process_manager()
+        planner = CandidatePlanner([{}, {u'p_gain_scale': 0.}, {u'p_gain_scale': 2.}], u'goal', u'time', u'cpi',
+                                   [], selection=BEST)
+        god_map, e, profiler = planner.plan(pm)
+        self.assertIsNone(e)
+        self.assertEqual(god_map.get_data([u'time']), 5)
+        self.assertEqual(profiler.statistics[u'count'][0], 5)
+        # the parent is unchanged
+        self.assertEqual(pm.get_god_map().get_data([u'time']), 0)
+        self.assertEqual(pm.get_god_map().get_data([u'goal', u'joint', u'j', u'p_gain']), 1.)
+
+    def test_first(self):
+        pm = self.make_process_manager()
+        planner = CandidatePlanner([{u'p_gain_scale': 0.}, {u'p_gain_scale': 0.5}], u'goal', u'time', u'cpi', [],
+                                   selection=FIRST)
+        god_map, e, profiler = planner.plan(pm)
+        self.assertIsNone(e)
+        self.assertEqual(god_map.get_data([u'time']), 20)
+
+    def test_result_identifiers(self):
+        pm = self.make_process_manager()
+        planner = CandidatePlanner([{u'p_gain_scale': 2.}], u'goal', u'time', u'cpi', [u'js'])
+        god_map, e, profiler = planner.plan(pm)
+        self.assertIsNone(e)
+        # the final joint state of the worker, not the start state of the parent
+        self.assertEqual(god_map.get_data([u'js', u'j']), 10.)
+        self.assertEqual(pm.get_god_map().get_data([u'js', u'j']), 0.)
+        # symbols that were registered in the worker are registered in the parent
+        self.assertIn((u'js', u'j'), pm.get_god_map().key_to_index)
+
+    def test_timeout(self):
+        pm = self.make_process_manager()
+        pm.register_plugin(u'hang', HangPlugin())
+        planner = CandidatePlanner([{}, {}], u'goal', u'time', u'cpi', [], timeout=0.5)
+        t = time()
+        god_map, e, profiler = planner.plan(pm)
+        self.assertLess(time() - t, 5)
+        self.assertIsInstance(e, SolverTimeoutError)
+
+    def test_all_failed(self):
+        pm = self.make_process_manager()
+        planner = CandidatePlanner([{u'p_gain_scale': 0.}, {u'p_gain_scale': 0.}], u'goal', u'time', u'cpi', [])
+        god_map, e, profiler = planner.plan(pm)
+        self.assertIsInstance(e, InsolvableException)
+
+    def test_unknown_strategy(self):
+        pm = self.make_process_manager()
+        planner = CandidatePlanner([{u'muh': 1}], u'goal', u'time', u'cpi', [])
+        god_map, e, profiler = planner.plan(pm)
+        self.assertIsInstance(e, KeyError)
+
+
+if __name__ == '__main__':
+    import rosunit
+
+    rosunit.unitrun(package=PKG,
+                    test_name='TestCandidatePlanner',
+                    test=TestCandidatePlanner)
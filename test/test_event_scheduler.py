@@ -0,0 +1,136 @@
+import unittest
+from threading import Thread
+from time import time, sleep
+
+from sensor_msgs.msg import JointState
+
+from giskardpy.event_scheduler import EventScheduler, JOINT_STATE, ACTION_GOAL, WORLD_UPDATE
+from giskardpy.plugin_joint_state import JointStatePlugin
+from giskardpy.process_manager import ProcessManager
+
+PKG = 'giskardpy'
+
+
+class TestEventScheduler(unittest.TestCase):
+
+    def test_triggers(self):
+        scheduler = EventScheduler()
+        scheduler.add_plugin(u'js', triggers=[JOINT_STATE])
+        scheduler.add_plugin(u'goal', triggers=[ACTION_GOAL])
+        scheduler.add_plugin(u'always')
+        scheduler.notify(ACTION_GOAL)
+        self.assertEqual(scheduler.wait(), {u'goal', u'always'})
+        scheduler.notify(JOINT_STATE)
+        scheduler.notify(ACTION_GOAL)
+        self.assertEqual(scheduler.wait(), {u'js', u'goal', u'always'})
+        # nobody is triggered by this event
+        scheduler.notify(WORLD_UPDATE)
+        self.assertEqual(scheduler.pending, {})
+
+    def test_rate(self):
+        scheduler = EventScheduler()
+        scheduler.add_plugin(u'timer', rate=20)
+        scheduler.add_plugin(u'always')
+        self.assertEqual(scheduler.wait(), {u'timer', u'always'})
+        t = time()
+        self.assertEqual(scheduler.wait(), {u'timer', u'always'})
+        self.assertGreaterEqual(time() - t, 0.03)
+
+    def test_max_rate(self):
+        scheduler = EventScheduler()
+        scheduler.add_plugin(u'js', triggers=[JOINT_STATE])
+        scheduler.add_plugin(u'always', max_rate=10)
+        scheduler.notify(JOINT_STATE)
+        self.assertEqual(scheduler.wait(), {u'js', u'always'})
+        # a burst of events is merged into one update of the plugins without triggers per min period
+        t = time()
+        for i in range(5):
+            scheduler.notify(JOINT_STATE)
+            self.assertEqual(scheduler.wait(), {u'js'})
+        self.assertEqual(scheduler.wait(), {u'always'})
+        self.assertGreaterEqual(time() - t, 0.09)
+
+    def test_triggers_bypass_max_rate(self):
+        # the configuration of ros_trajectory_controller_main.py
+        scheduler = EventScheduler()
+        scheduler.add_plugin(u'js', triggers=[JOINT_STATE])
+        scheduler.add_plugin(u'action server', triggers=[ACTION_GOAL], rate=10, max_rate=10)
+        scheduler.add_plugin(u'bullet', triggers=[WORLD_UPDATE, ACTION_GOAL], rate=10, max_rate=10)
+        scheduler.add_plugin(u'fk', max_rate=10)
+        self.assertEqual(scheduler.wait(), {u'action server', u'bullet', u'fk'})
+        # the timers just ran, but a goal is still handled right away
+        scheduler.notify(ACTION_GOAL)
+        t = time()
+        self.assertEqual(scheduler.wait(), {u'action server', u'bullet'})
+        self.assertLess(time() - t, 0.05)
+        scheduler.notify(WORLD_UPDATE)
+        self.assertEqual(scheduler.wait(), {u'bullet'})
+        for i in range(3):
+            scheduler.notify(JOINT_STATE)
+            self.assertEqual(scheduler.wait(), {u'js'})
+        self.assertEqual(scheduler.wait(), {u'action server', u'bullet', u'fk'})
+        statistics = scheduler.get_latency_statistics()
+        for event, count in [(ACTION_GOAL, 1), (WORLD_UPDATE, 1), (JOINT_STATE, 3)]:
+            self.assertEqual(statistics[event][0], count)
+            self.assertLess(statistics[event][2], 0.05)
+
+    def test_timer_is_reused(self):
+        scheduler = EventScheduler()
+        scheduler.add_plugin(u'goal', triggers=[ACTION_GOAL], rate=0.1)
+        scheduler.wait()
+
+        def notify():
+            for i in range(3):
+                sleep(0.05)
+                scheduler.notify(ACTION_GOAL)
+
+        Thread(target=notify).start()
+        scheduler.wait()
+        timer = scheduler.timer
+        scheduler.wait()
+        scheduler.wait()
+        self.assertIs(scheduler.timer, timer)
+
+    def test_notify_from_thread(self):
+        scheduler = EventScheduler()
+        scheduler.add_plugin(u'goal', triggers=[ACTION_GOAL], rate=0.1)
+        scheduler.wait()
+
+        def notify():
+            sleep(0.1)
+            scheduler.notify(ACTION_GOAL)
+
+        Thread(target=notify).start()
+        t = time()
+        self.assertEqual(scheduler.wait(), {u'goal'})
+        self.assertLess(time() - t, 0.5)
+        count, mean, max_latency = scheduler.get_latency_statistics()[ACTION_GOAL]
+        self.assertEqual(count, 1)
+        self.assertLess(max_latency, 0.05)
+
+    def test_joint_state_wakes_up_process_manager(self):
+        pm = ProcessManager()
+        js_plugin = JointStatePlugin(js_identifier=u'js', time_identifier=u'time', next_cmd_identifier=u'cmd',
+                                     sample_period=0.05)
+        pm.register_plugin(u'js', js_plugin, triggers=[JOINT_STATE])
+        # start would subscribe to the joint state topic
+        js_plugin.god_map = pm.get_god_map()
+
+        def cb():
+            sleep(0.1)
+            js_plugin.cb(JointState(name=[u'a'], position=[1.], velocity=[0.], effort=[0.]))
+
+        Thread(target=cb).start()
+        # wait returns an empty set after MAX_SLEEP, if the joint state doesn't wake up the loop
+        plugin_names = pm.scheduler.wait()
+        self.assertEqual(plugin_names, {u'js'})
+        pm.update(plugin_names)
+        self.assertEqual(pm.get_god_map().get_data([u'js', u'a']).position, 1.)
+
+
+if __name__ == '__main__':
+    import rosunit
+
+    rosunit.unitrun(package=PKG,
+                    test_name='TestEventScheduler',
+                    test=TestEventScheduler)
@@ -0,0 +1,106 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from hypothesis import given
+import hypothesis.strategies as st
+
+import giskardpy.function_cache as function_cache
+from giskardpy.function_cache import FunctionCache, LOCK_SUFFIX
+from giskardpy.test_utils import variable_name
+
+PKG = 'giskardpy'
+
+
+class TestFunctionCache(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @given(variable_name(),
+           st.lists(st.floats(allow_nan=False)))
+    def test_save_load(self, key, value):
+        cache = FunctionCache(self.path)
+        cache.save(key, value)
+        self.assertEqual(cache.load(key), value)
+        self.assertEqual(cache.load(key + u'muh'), None)
+
+    def test_corrupted_file(self):
+        cache = FunctionCache(self.path)
+        cache.save(u'key', [1, 2, 3])
+        with open(cache.get_file_name(u'key'), u'ab') as f:
+            f.write(b'muh')
+        self.assertEqual(cache.load(u'key'), None)
+        self.assertFalse(os.path.isfile(cache.get_file_name(u'key')))
+
+    def test_get_or_compute(self):
+        cache = FunctionCache(self.path)
+        calls = []
+
+        def compute(x):
+            calls.append(x)
+            return x * 2
+
+        self.assertEqual(cache.get_or_compute(u'key', compute, 21), 42)
+        self.assertEqual(cache.get_or_compute(u'key', compute, 21), 42)
+        self.assertEqual(FunctionCache(self.path).get_or_compute(u'key', compute, 21), 42)
+        self.assertEqual(calls, [21])
+
+    def test_try_compute(self):
+        cache = FunctionCache(self.path)
+        calls = []
+
+        def compute(x):
+            calls.append(x)
+            return x * 2
+
+        with cache.lock(u'key'):
+            self.assertFalse(cache.try_compute(u'key', compute, 21))
+        self.assertTrue(cache.try_compute(u'key', compute, 21))
+        self.assertTrue(cache.try_compute(u'key', compute, 21))
+        self.assertEqual(cache.load(u'key'), 42)
+        self.assertEqual(calls, [21])
+
+    def test_evict(self):
+        cache = FunctionCache(self.path)
+        cache.save(u'key0', u'a' * 1000)
+        file_size = cache.get_size()
+        cache.max_size = file_size * 3
+        for i in range(1, 10):
+            cache.save(u'key{}'.format(i), u'a' * 1000)
+            self.assertLessEqual(cache.get_size(), cache.max_size)
+        self.assertEqual(cache.load(u'key9'), u'a' * 1000)
+
+    def test_evict_lock_files(self):
+        cache = FunctionCache(self.path)
+        cache.get_or_compute(u'key0', lambda: u'a' * 1000)
+        cache.max_size = cache.get_size() * 3
+        for i in range(1, 10):
+            cache.get_or_compute(u'key{}'.format(i), lambda: u'a' * 1000)
+        lock_files = [f for f in os.listdir(self.path) if f.endswith(LOCK_SUFFIX)]
+        self.assertEqual(len(lock_files), len(cache.get_files()))
+        self.assertTrue(os.path.isfile(cache.get_lock_file_name(u'key9')))
+        self.assertFalse(os.path.isfile(cache.get_lock_file_name(u'key0')))
+
+
+    def test_symengine_version(self):
+        FunctionCache(self.path).save(u'key', 1)
+        FunctionCache(self.path, depends_on_symengine=False).save(u'key', 2)
+        version = function_cache.symengine.__version__
+        function_cache.symengine.__version__ = version + u'.muh'
+        try:
+            self.assertIsNone(FunctionCache(self.path).load(u'key'))
+            self.assertEqual(FunctionCache(self.path, depends_on_symengine=False).load(u'key'), 2)
+        finally:
+            function_cache.symengine.__version__ = version
+
+
+if __name__ == '__main__':
+    import rosunit
+
+    rosunit.unitrun(package=PKG,
+                    test_name='TestFunctionCache',
+                    test=TestFunctionCache)
@@ -1,8 +1,14 @@
 import unittest
 from collections import namedtuple
+from copy import copy
+
+import numpy as np
 from hypothesis import given, reproduce_failure, assume
 import hypothesis.strategies as st
+from giskard_msgs.msg import Controller
+
 import giskardpy.symengine_wrappers as sw
+from giskardpy.data_types import MultiJointState
 from giskardpy.god_map import GodMap
 from giskardpy.test_utils import variable_name, keys_values, lists_of_same_length
 
@@ -187,6 +193,183 @@ class TestGodMap(unittest.TestCase):
             gm.to_symbol([key])
         self.assertEqual(len(gm.get_symbol_map()), len(keys))
 
+    @given(lists_of_same_length([variable_name(), st.floats(allow_nan=False), st.floats(allow_nan=False)],
+                                unique=True))
+    def test_get_symbol_values(self, keys_values):
+        keys, values, new_values = keys_values
+        gm = GodMap()
+        d = {}
+        gm.set_data([u'dict'], d)
+        for key, value in zip(keys, values):
+            gm.set_data([u'dict', key], value)
+        indices = gm.get_symbol_indices([gm.to_symbol([u'dict', key]) for key in keys])
+        self.assertEqual(gm.get_symbol_values(indices).tolist(), values)
+        for key, value in zip(keys, new_values):
+            gm.set_data([u'dict', key], value)
+        self.assertEqual(gm.get_symbol_values(indices).tolist(), new_values)
+        gm.set_data([u'dict'], dict(zip(keys, values)))
+        out = np.zeros(len(keys))
+        gm.get_symbol_values(indices, out)
+        self.assertEqual(out.tolist(), values)
+        symbol_map = gm.get_symbol_map()
+        for key, value in zip(keys, values):
+            self.assertEqual(symbol_map[str(gm.to_symbol([u'dict', key]))], value)
+
+    @given(variable_name(),
+           st.floats(allow_nan=False))
+    def test_get_symbol_values_function(self, key, value):
+        gm = GodMap()
+        values = [value]
+        gm.set_data([key], lambda god_map: values[0])
+        indices = gm.get_symbol_indices([gm.to_symbol([key])])
+        self.assertEqual(gm.get_symbol_values(indices)[0], value)
+        values[0] = value + 1
+        self.assertEqual(gm.get_symbol_values(indices)[0], value + 1)
+
+    @given(variable_name(),
+           st.floats(allow_nan=False),
+           st.floats(allow_nan=False))
+    def test_get_symbol_values_copy(self, key, value, new_value):
+        gm = GodMap()
+        gm.set_data([key], value)
+        indices = gm.get_symbol_indices([gm.to_symbol([key])])
+        self.assertEqual(gm.get_symbol_values(indices)[0], value)
+        gm_copy = copy(gm)
+        gm_copy.set_data([key], new_value)
+        new_symbol = gm_copy.to_symbol([key, u'muh'])
+        self.assertEqual(gm_copy.get_symbol_values(indices)[0], new_value)
+        self.assertEqual(gm.get_symbol_values(indices)[0], value)
+        gm.copy_symbols_from(gm_copy)
+        self.assertEqual(gm.get_symbol_values(indices)[0], value)
+        self.assertEqual(len(gm.get_symbol_indices([new_symbol])), 1)
+
+    @given(variable_name(),
+           st.floats(allow_nan=False),
+           st.floats(allow_nan=False))
+    def test_copy_shares_symbols(self, key, value, new_value):
+        gm = GodMap()
+        gm.set_data([key], {u'x': value, u'y': value})
+        x_indices = gm.get_symbol_indices([gm.to_symbol([key, u'x'])])
+        gm_copy = copy(gm)
+        self.assertIs(gm_copy.key_to_index, gm.key_to_index)
+        self.assertIs(gm_copy._symbol_values, gm._symbol_values)
+        gm_copy.set_data([key, u'x'], new_value)
+        self.assertEqual(gm_copy.get_symbol_values(x_indices)[0], new_value)
+        self.assertEqual(gm.get_symbol_values(x_indices)[0], value)
+        # registering a symbol in the copy doesn't change the symbols of the original
+        y_indices = gm_copy.get_symbol_indices([gm_copy.to_symbol([key, u'y'])])
+        self.assertNotIn((key, u'y'), gm.key_to_index)
+        self.assertEqual(gm_copy.get_symbol_values(y_indices)[0], value)
+        gm.to_symbol([key, u'z'])
+        self.assertNotIn((key, u'z'), gm_copy.key_to_index)
+
+    @given(variable_name(),
+           variable_name(),
+           st.integers(),
+           st.integers())
+    def test_copy_on_write(self, key, dict_key, value, new_value):
+        assume(key != u'other')
+        assume(dict_key != u'l')
+        gm = GodMap()
+        gm.set_data([key], {dict_key: {u'position': value}, u'l': [value]})
+        gm.set_data([u'other'], {u'muh': value})
+        gm.to_symbol([key, dict_key, u'position'])
+        gm_copy = copy(gm)
+        self.assertIs(gm_copy._data, gm._data)
+        gm_copy.set_data([key, dict_key, u'position'], new_value)
+        gm_copy.set_data([key, u'l', u'0'], new_value)
+        self.assertEqual(gm_copy.get_data([key, dict_key, u'position']), new_value)
+        self.assertEqual(gm_copy.get_data([key, u'l', u'0']), new_value)
+        self.assertEqual(gm.get_data([key, dict_key, u'position']), value)
+        self.assertEqual(gm.get_data([key, u'l', u'0']), value)
+        # untouched namespaces are still shared
+        self.assertIs(gm_copy.get_data([u'other']), gm.get_data([u'other']))
+        # writes of the original don't leak into the copy either
+        gm.set_data([u'other', u'muh'], new_value + 1)
+        self.assertEqual(gm.get_data([u'other', u'muh']), new_value + 1)
+        self.assertEqual(gm_copy.get_data([u'other', u'muh']), value)
+        # containers that are owned already are changed in place
+        l = gm_copy.get_data([key, u'l'])
+        gm_copy.set_data([key, u'l', u'0'], value)
+        self.assertIs(gm_copy.get_data([key, u'l']), l)
+
+    @given(variable_name(),
+           st.floats(allow_nan=False),
+           st.floats(allow_nan=False))
+    def test_copy_on_write_msg(self, key, value, new_value):
+        controller = Controller(p_gain=value)
+        controller.goal_pose.pose.position.x = value
+        gm = GodMap()
+        gm.set_data([u'goal'], {key: controller})
+        gm_copy = copy(gm)
+        gm_copy.set_data([u'goal', key, u'p_gain'], new_value)
+        gm_copy.set_data([u'goal', key, u'goal_pose', u'pose', u'position', u'x'], new_value)
+        self.assertEqual(gm_copy.get_data([u'goal', key, u'p_gain']), new_value)
+        self.assertEqual(gm_copy.get_data([u'goal', key, u'goal_pose', u'pose', u'position', u'x']), new_value)
+        self.assertIs(gm.get_data([u'goal', key]), controller)
+        self.assertEqual(controller.p_gain, value)
+        self.assertEqual(controller.goal_pose.pose.position.x, value)
+        # members that weren't written are still shared
+        self.assertIs(gm_copy.get_data([u'goal', key, u'goal_pose', u'header']), controller.goal_pose.header)
+
+    @given(variable_name(),
+           st.floats(allow_nan=False),
+           st.floats(allow_nan=False))
+    def test_accessor_type_change(self, key, value, new_value):
+        Point = namedtuple(u'Point', [u'x'])
+        gm = GodMap()
+        gm.set_data([key], {u'0': Point(value)})
+        gm.to_symbol([key, u'0', u'x'])
+        self.assertEqual(gm.get_data([key, u'0', u'x']), value)
+        self.assertEqual(gm.get_data([key, u'0', u'x']), value)
+        gm.set_data([key], [{u'x': new_value}])
+        self.assertEqual(gm.get_data([key, u'0', u'x']), new_value)
+        gm.set_data([key], {})
+        self.assertEqual(gm.get_data([key, u'0', u'x']), gm.default_value)
+
+    @given(st.lists(variable_name(), min_size=1, max_size=10, unique=True),
+           st.floats(allow_nan=False, allow_infinity=False))
+    def test_multi_joint_state(self, joint_names, value):
+        js = MultiJointState(tuple(joint_names), np.arange(len(joint_names), dtype=float))
+        gm = GodMap()
+        gm.set_data([u'js'], js)
+        indices = gm.get_symbol_indices([gm.to_symbol([u'js', joint_name, u'position']) for joint_name in joint_names])
+        self.assertTrue(np.array_equal(gm.get_symbol_values(indices), js.positions))
+        self.assertEqual(gm.get_data([u'js', joint_names[0], u'velocity']), 0)
+        gm.set_data([u'js'], js.with_values(js.positions + value))
+        self.assertTrue(np.array_equal(gm.get_symbol_values(indices), js.positions + value))
+        # the accessors notice, that the joints have changed
+        gm.set_data([u'js'], MultiJointState(tuple(reversed(joint_names)), js.positions))
+        self.assertTrue(np.array_equal(gm.get_symbol_values(indices), js.positions[::-1]))
+        self.assertEqual(gm.get_data([u'js', joint_names[0]]).position, js.positions[-1])
+
+    def test_accessor_nested_objects(self):
+        class Quaternion(object):
+            def __init__(self):
+                self.x = 0.1
+                self.y = 0.2
+                self.z = 0.3
+                self.w = 0.4
+
+        class Pose(object):
+            def __init__(self):
+                self.orientation = Quaternion()
+
+        class PoseStamped(object):
+            def __init__(self):
+                self.pose = Pose()
+
+        gm = GodMap()
+        gm.set_data([u'fk'], {(u'base', u'gripper'): PoseStamped()})
+        identifier = [u'fk', (u'base', u'gripper'), u'pose', u'orientation', u'x']
+        gm.to_symbol(identifier)
+        self.assertEqual(gm.get_data(identifier), 0.1)
+        # the second call uses the learned chain
+        self.assertEqual(gm.get_data(identifier), 0.1)
+        self.assertIsNotNone(gm.index_to_accessor[gm.key_to_index[tuple(identifier)]].chain)
+        gm.set_data(identifier, 0.5)
+        self.assertEqual(gm.get_data(identifier), 0.5)
+        self.assertEqual(gm.get_data(identifier), gm._get_data(identifier)[0])
 
 if __name__ == '__main__':
     import rosunit
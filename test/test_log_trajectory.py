@@ -0,0 +1,56 @@
+import unittest
+from collections import OrderedDict
+
+import numpy as np
+
+from giskardpy.data_types import MultiJointState, SingleJointState
+from giskardpy.plugin_log_trajectory import LogTrajectoryPlugin, WIGGLE_HISTORY_LENGTH
+
+PKG = 'giskardpy'
+
+
+def make_plugin():
+    plugin = LogTrajectoryPlugin(trajectory_identifier=u'traj',
+                                 joint_state_identifier=u'js',
+                                 time_identifier=u'time',
+                                 goal_identifier=u'goal',
+                                 closest_point_identifier=u'cpi',
+                                 controlled_joints_identifier=u'controlled_joints',
+                                 joint_convergence_threshold=0.001,
+                                 wiggle_precision_threshold=4,
+                                 collision_time_threshold=15,
+                                 max_traj_length=30)
+    plugin.start_always()
+    return plugin
+
+
+class TestLogTrajectoryPlugin(unittest.TestCase):
+
+    def test_hash_js(self):
+        plugin = make_plugin()
+        names = (u'a', u'b')
+        js = MultiJointState(names, np.array([0.1, -0.00001]))
+        self.assertEqual(plugin.hash_js(js), plugin.hash_js(js.with_values(np.array([0.100001, 0.]))))
+        self.assertNotEqual(plugin.hash_js(js), plugin.hash_js(js.with_values(np.array([0.1001, 0.]))))
+        js_dict = OrderedDict([(u'a', SingleJointState(u'a', 0.1)), (u'b', SingleJointState(u'b', 0.))])
+        self.assertEqual(plugin.hash_js(js), plugin.hash_js(js_dict))
+
+    def test_wiggle_history(self):
+        plugin = make_plugin()
+        self.assertFalse(plugin.is_wiggling(0))
+        self.assertTrue(plugin.is_wiggling(0))
+        for i in range(1, WIGGLE_HISTORY_LENGTH + 1):
+            self.assertFalse(plugin.is_wiggling(i))
+        self.assertEqual(len(plugin.past_joint_states), WIGGLE_HISTORY_LENGTH)
+        self.assertEqual(len(plugin.past_joint_state_order), WIGGLE_HISTORY_LENGTH)
+        # 0 was forgotten
+        self.assertFalse(plugin.is_wiggling(0))
+        self.assertTrue(plugin.is_wiggling(WIGGLE_HISTORY_LENGTH))
+
+
+if __name__ == '__main__':
+    import rosunit
+
+    rosunit.unitrun(package=PKG,
+                    test_name='TestLogTrajectoryPlugin',
+                    test=TestLogTrajectoryPlugin)
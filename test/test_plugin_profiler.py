@@ -0,0 +1,67 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from hypothesis import given
+import hypothesis.strategies as st
+
+from giskardpy.plugin_profiler import PluginProfiler, dump_profiles
+
+PKG = 'giskardpy'
+
+
+class TestPluginProfiler(unittest.TestCase):
+
+    @given(st.lists(st.floats(min_value=0, max_value=100), min_size=1))
+    def test_add(self, durations):
+        profiler = PluginProfiler()
+        for duration in durations:
+            profiler.add(u'fk', duration)
+        count, total, max_time, histogram = profiler.statistics[u'fk']
+        self.assertEqual(count, len(durations))
+        self.assertAlmostEqual(total, sum(durations), places=5)
+        self.assertEqual(max_time, max(durations))
+        self.assertEqual(sum(histogram), len(durations))
+        self.assertLessEqual(profiler.get_percentile(u'fk', 50), profiler.get_percentile(u'fk', 95))
+        self.assertLessEqual(profiler.get_percentile(u'fk', 95), max_time)
+        self.assertGreaterEqual(profiler.get_percentile(u'fk', 100), sorted(durations)[-1] / 10 ** 0.25)
+
+    def test_merge(self):
+        a = PluginProfiler()
+        a.add(u'fk', 0.001)
+        a.add(u'bullet', 0.01)
+        b = PluginProfiler()
+        b.add(u'fk', 0.003)
+        a.merge(b)
+        self.assertEqual(a.statistics[u'fk'][0], 2)
+        self.assertAlmostEqual(a.statistics[u'fk'][1], 0.004)
+        self.assertEqual(a.statistics[u'fk'][2], 0.003)
+        self.assertEqual(sum(a.statistics[u'fk'][3]), 2)
+        self.assertEqual(b.statistics[u'fk'][0], 1)
+        summary = a.get_summary()
+        self.assertIn(u'fk', summary)
+        self.assertIn(u'bullet', summary)
+
+    def test_dump(self):
+        path = tempfile.mkdtemp()
+        try:
+            profiler = PluginProfiler()
+            profiler.add(u'fk', 0.002)
+            file_name = os.path.join(path, u'timing.json')
+            dump_profiles(file_name, {u'original': profiler})
+            with open(file_name) as f:
+                data = json.load(f)
+            self.assertEqual(data[u'original'][u'fk'][u'count'], 1)
+            self.assertAlmostEqual(data[u'original'][u'fk'][u'mean'], 0.002)
+        finally:
+            shutil.rmtree(path)
+
+
+if __name__ == '__main__':
+    import rosunit
+
+    rosunit.unitrun(package=PKG,
+                    test_name='TestPluginProfiler',
+                    test=TestPluginProfiler)
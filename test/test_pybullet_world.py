@@ -1,10 +1,15 @@
+import os
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
 from hypothesis.strategies import composite
 
-from giskardpy.exceptions import UnknownBodyException, RobotExistsException, DuplicateNameException
+from giskardpy.exceptions import UnknownBodyException, RobotExistsException, DuplicateNameException, \
+    PhysicsWorldException
 from giskardpy.object import UrdfObject, Box, Sphere, Cylinder
-from giskardpy.pybullet_world import PyBulletWorld
+from giskardpy.pybullet_world import PyBulletWorld, CollisionMatrix, sample_self_collisions
 import pybullet as p
 import hypothesis.strategies as st
 from hypothesis.stateful import Bundle, RuleBasedStateMachine, rule, invariant
@@ -141,5 +146,125 @@ class TestPyBulletWorld(RuleBasedStateMachine):
 
 TestTrees = TestPyBulletWorld.TestCase
 
+
+class TestCheckCollisions(unittest.TestCase):
+    def setUp(self):
+        self.world = PyBulletWorld()
+        self.world.activate_viewer()
+        self.world.spawn_robot_from_urdf_file(u'pr2', u'urdfs/pr2.urdf')
+        for i in range(3):
+            self.world.spawn_urdf_object(Box(u'box{}'.format(i), 0.1, 0.1, 0.1),
+                                         Transform(translation=Point(0.5, -0.3 + i * 0.3, 0.8)))
+
+    def tearDown(self):
+        self.world.deactivate_viewer()
+
+    def make_cut_off_distances(self, distance):
+        robot = self.world.get_robot()
+        return {(robot_link, body_b, link_b): distance
+                for robot_link in robot.get_link_names()
+                for body_b in self.world.get_object_names()
+                for link_b in self.world.get_object(body_b).get_link_names()}
+
+    def test_closest_contact_per_link(self):
+        cut_off_distances = self.make_cut_off_distances(0.3)
+        collisions = self.world.check_collisions(cut_off_distances, enable_self_collision=False)
+        robot = self.world.get_robot()
+        expected = {}
+        for (robot_link, body_b, link_b), distance in cut_off_distances.items():
+            for contact in p.getClosestPoints(robot.id, self.world.get_object(body_b).id, distance,
+                                              robot.link_name_to_id[robot_link],
+                                              self.world.get_object(body_b).link_name_to_id[link_b]):
+                expected[robot_link] = min(expected.get(robot_link, 1e9), contact[8])
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(set(expected), {robot_link for robot_link, _, _ in collisions})
+        for (robot_link, body_b, link_b), contact in collisions.items():
+            self.assertAlmostEqual(contact.contact_distance, expected[robot_link])
+            self.assertLessEqual(contact.contact_distance, cut_off_distances[robot_link, body_b, link_b])
+
+    def test_aabb_culling(self):
+        self.world.spawn_urdf_object(Box(u'far_away', 0.1, 0.1, 0.1), Transform(translation=Point(20, 0, 0.8)))
+        cut_off_distances = self.make_cut_off_distances(0.3)
+        culled = self.world.check_collisions(cut_off_distances, enable_self_collision=False)
+        self.assertEqual(self.world.checked_pairs, len(cut_off_distances))
+        self.assertGreaterEqual(self.world.culled_pairs, len(self.world.get_robot().get_link_names()))
+        not_culled = self.world.check_collisions(cut_off_distances, enable_self_collision=False, aabb_culling=False)
+        self.assertEqual(self.world.culled_pairs, 0)
+        self.assertEqual(set(culled), set(not_culled))
+        for key, contact in culled.items():
+            self.assertAlmostEqual(contact.contact_distance, not_culled[key].contact_distance)
+
+    def test_collision_matrix(self):
+        cut_off_distances = self.make_cut_off_distances(0.3)
+        del cut_off_distances[u'base_link', u'box0', u'base']
+        collision_matrix = CollisionMatrix.from_dict(self.world, cut_off_distances)
+        self.assertEqual(len(collision_matrix), len(cut_off_distances))
+        self.assertEqual(collision_matrix[u'r_gripper_palm_link', u'box1', u'base'], 0.3)
+        with self.assertRaises(KeyError):
+            collision_matrix[u'base_link', u'box0', u'base']
+        with self.assertRaises(KeyError):
+            collision_matrix[u'base_link', u'muh', u'muh']
+        collision_matrix.set_cut_off_distance([u'base_link', u'torso_lift_link'], u'box1', [u'base'], -np.inf)
+        del cut_off_distances[u'base_link', u'box1', u'base']
+        del cut_off_distances[u'torso_lift_link', u'box1', u'base']
+        self.assertEqual(len(collision_matrix), len(cut_off_distances))
+        self.assertEqual(set(self.world.check_collisions(collision_matrix, enable_self_collision=False)),
+                         set(self.world.check_collisions(cut_off_distances, enable_self_collision=False)))
+        self.world.spawn_urdf_object(Box(u'new_box', 0.1, 0.1, 0.1))
+        with self.assertRaises(PhysicsWorldException):
+            self.world.check_collisions(collision_matrix)
+
+    def test_ignore_missing_keys(self):
+        cut_off_distances = {k: v for k, v in self.make_cut_off_distances(0.3).items() if k[1] != u'box1'}
+        collisions = self.world.check_collisions(cut_off_distances, enable_self_collision=False)
+        self.assertNotIn(u'box1', {body_b for _, body_b, _ in collisions})
+
+
+class TestSelfCollisionMatrix(unittest.TestCase):
+    def setUp(self):
+        self.path_to_data_folder = tempfile.mkdtemp()
+        self.world = PyBulletWorld(path_to_data_folder=self.path_to_data_folder)
+        self.world.activate_viewer()
+
+    def tearDown(self):
+        self.world.deactivate_viewer()
+        shutil.rmtree(self.path_to_data_folder)
+
+    def test_parallel_equals_serial(self):
+        self.world.spawn_robot_from_urdf_file(u'pointy', u'urdfs/pointy.urdf')
+        robot = self.world.get_robot()
+        link_pairs = {(link_a, link_b) for link_a in robot.joint_id_to_info for link_b in robot.joint_id_to_info
+                      if link_a < link_b}
+        np.random.seed(23)
+        joint_states = [robot.get_rnd_joint_state() for _ in range(50)]
+        serial = set()
+        for js in joint_states:
+            serial.update(robot._check_all_collisions(link_pairs, 0.0, js))
+        joint_states = [[(robot.joint_name_to_info[joint_name].joint_index, sjs.position)
+                         for joint_name, sjs in js.items()]
+                        for js in joint_states]
+        for processes in (1, 3):
+            self.assertEqual(sample_self_collisions(robot.get_urdf(), link_pairs, 0.0, joint_states,
+                                                    len(joint_states), processes), serial)
+
+    def test_cache(self):
+        self.world.spawn_robot_from_urdf_file(u'pointy', u'urdfs/pointy.urdf')
+        sometimes = self.world.get_robot().sometimes
+        self.assertGreater(len(os.listdir(self.path_to_data_folder)), 0)
+        self.world.delete_robot()
+        self.world.spawn_robot_from_urdf_file(u'pointy', u'urdfs/pointy.urdf')
+        self.assertEqual(self.world.get_robot().sometimes, sometimes)
+
+    def test_attach_object(self):
+        self.world.spawn_robot_from_urdf_file(u'pr2', u'urdfs/pr2.urdf')
+        self.world.attach_object(Box(u'box', 0.1, 0.1, 0.1), u'r_gripper_palm_link',
+                                 Transform(translation=Point(0.1, 0, 0)))
+        robot = self.world.get_robot()
+        box_id = robot.link_name_to_id[u'box']
+        # loaded from the cache
+        new_collisions = robot.get_self_collision_matrix({(box_id, link_id) for link_id in robot.joint_id_to_info})
+        self.assertGreater(len(new_collisions), 0)
+        self.assertTrue(new_collisions.issubset(robot.sometimes))
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+
+from hypothesis import given
+import hypothesis.strategies as st
+
+import numpy as np
+
+import giskardpy.symengine_wrappers as spw
+from giskardpy.qp_problem_builder import CompiledScatter, SoftConstraint, constraints_hash
+from giskardpy.test_utils import limited_float
+
+PKG = 'giskardpy'
+
+
+class TestQPProblemBuilder(unittest.TestCase):
+
+    @given(limited_float(outer_limit=1e5),
+           limited_float(outer_limit=1e5))
+    def test_compiled_scatter(self, f1, f2):
+        f1_s = spw.Symbol('f1')
+        f2_s = spw.Symbol('f2')
+        A = spw.Matrix([[f1_s * f2_s, 0, 1],
+                        [0, spw.sin(f1_s), f2_s]])
+        lb = spw.Matrix([f1_s, -2, 0])
+        free_symbols = [f1_s, f2_s]
+        scatter = CompiledScatter([('A', A), ('lb', lb)], free_symbols)
+        self.assertEqual(scatter.get_number_of_dynamic_entries(), 4)
+        self.assertEqual(scatter.constant_matrices, set())
+        buffers = scatter.make_buffers()
+        params = scatter.kwargs_to_params({'f1': f1, 'f2': f2})
+        scatter.evaluate(params, buffers)
+        A_dense = spw.speed_up(A, free_symbols)(f1=f1, f2=f2)
+        lb_dense = spw.speed_up(lb, free_symbols)(f1=f1, f2=f2)
+        self.assertTrue(np.isclose(buffers['A'], A_dense).all(), msg='{} != {}'.format(buffers['A'], A_dense))
+        self.assertTrue(np.isclose(buffers['lb'], lb_dense).all(), msg='{} != {}'.format(buffers['lb'], lb_dense))
+
+    @given(st.integers(min_value=1, max_value=10))
+    def test_compiled_scatter_constant(self, size):
+        H = spw.diag(*[float(x + 1) for x in range(size)])
+        scatter = CompiledScatter([('H', H)], [spw.Symbol('f1')])
+        self.assertEqual(scatter.get_number_of_dynamic_entries(), 0)
+        self.assertEqual(scatter.constant_matrices, {'H'})
+        buffers = scatter.make_buffers()
+        scatter.evaluate(scatter.kwargs_to_params({'f1': 0}), buffers)
+        self.assertTrue(np.isclose(buffers['H'], np.diag(np.arange(size) + 1.)).all())
+
+    @given(limited_float(),
+           limited_float())
+    def test_constraints_hash(self, f1, f2):
+        j = spw.Symbol('j')
+        c1 = {'c': SoftConstraint(lower=f1, upper=f1, weight=1, expression=j)}
+        c2 = {'c': SoftConstraint(lower=f2, upper=f2, weight=1, expression=j)}
+        h1 = constraints_hash([c1], [j], True)
+        self.assertEqual(h1, constraints_hash([c1], [j], True))
+        self.assertNotEqual(h1, constraints_hash([c1], [j], False))
+        if str(f1) != str(f2):
+            self.assertNotEqual(h1, constraints_hash([c2], [j], True))
+
+
+if __name__ == '__main__':
+    import rosunit
+
+    rosunit.unitrun(package=PKG,
+                    test_name='TestQPProblemBuilder',
+                    test=TestQPProblemBuilder)
@@ -0,0 +1,66 @@
+import shutil
+import tempfile
+import unittest
+
+from hypothesis import given
+import hypothesis.strategies as st
+
+import numpy as np
+
+from giskardpy.qp_problem_recorder import QPProblemRecorder, load_recordings, get_problem, replay
+from giskardpy.qp_solver import QPSolverQPOases
+from giskardpy.test_utils import limited_float
+
+PKG = 'giskardpy'
+
+
+class TestQPProblemRecorder(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    @given(st.lists(limited_float(outer_limit=1e5), min_size=1, max_size=20),
+           st.integers(min_value=1, max_value=7))
+    def test_record_load(self, values, chunk_size):
+        folder = tempfile.mkdtemp(dir=self.path)
+        A_sparsity = np.array([[True, False, True],
+                               [False, True, True]])
+        recorder = QPProblemRecorder(folder, 3, 2, A_sparsity, chunk_size=chunk_size)
+        problems = []
+        for v in values:
+            problem = (np.diag([v, 1, 2]), np.zeros(3), np.array([[v, 0, 1], [0, -v, 2]]), np.ones(3) * -v,
+                       np.ones(3) * v, np.array([v, 0]), np.array([v, 1]))
+            problems.append(problem)
+            recorder.record(*problem, xdot=np.ones(3) * v)
+        recorder.flush()
+        recordings = load_recordings(folder)
+        self.assertEqual(len(recordings), 1)
+        recording = recordings[0]
+        self.assertEqual(len(recording[u'xdot']), len(values))
+        self.assertTrue(recording[u'success'].all())
+        for i, problem in enumerate(problems):
+            for expected, actual in zip(problem, get_problem(recording, i)):
+                self.assertTrue(np.array_equal(expected, actual), msg=u'{} != {}'.format(expected, actual))
+
+    @given(st.lists(limited_float(outer_limit=2), min_size=1, max_size=10))
+    def test_replay(self, goals):
+        folder = tempfile.mkdtemp(dir=self.path)
+        solver = QPSolverQPOases(2, 1, problem_folder=folder)
+        for goal in goals:
+            solver.solve(np.diag([1., 1.]), np.zeros(2), np.array([[1., 1.]]), np.array([-1., -1e9]),
+                         np.array([1., 1e9]), np.array([goal]), np.array([goal]))
+        solver.flush_recording()
+        recording = load_recordings(folder)[0]
+        solutions, solve_times = replay(recording, QPSolverQPOases)
+        self.assertEqual(len(solve_times), len(goals))
+        self.assertTrue(np.isclose(solutions, recording[u'xdot']).all())
+
+
+if __name__ == '__main__':
+    import rosunit
+
+    rosunit.unitrun(package=PKG,
+                    test_name='TestQPProblemRecorder',
+                    test=TestQPProblemRecorder)
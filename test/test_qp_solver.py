@@ -0,0 +1,76 @@
+import unittest
+
+from hypothesis import given, assume
+import hypothesis.strategies as st
+
+import numpy as np
+
+from giskardpy.qp_solver import QPSolverQPOases, QPSolverOSQP, osqp
+from giskardpy.test_utils import limited_float
+
+PKG = 'giskardpy'
+
+
+def make_problem(goal, weight):
+    """
+    One joint with velocity limits and one soft constraint that moves it to goal.
+    :return: H, g, A, lb, ub, lbA, ubA
+    :rtype: tuple
+    """
+    H = np.diag([1., weight])
+    g = np.zeros(2)
+    A = np.array([[1., 1.]])
+    lb = np.array([-1., -1e9])
+    ub = np.array([1., 1e9])
+    lbA = np.array([goal])
+    ubA = np.array([goal])
+    return H, g, A, lb, ub, lbA, ubA
+
+
+class TestQPSolver(unittest.TestCase):
+
+    @given(st.lists(limited_float(outer_limit=2), min_size=1, max_size=5),
+           limited_float(min_dist_to_zero=1e-3, outer_limit=1e3))
+    def test_qpoases_modes(self, goals, weight):
+        assume(weight > 0)
+        constant = QPSolverQPOases(2, 1, constant_A=True)
+        changing = QPSolverQPOases(2, 1, constant_A=False)
+        self.assertEqual(constant.get_mode(), QPSolverQPOases.QPROBLEM)
+        self.assertEqual(changing.get_mode(), QPSolverQPOases.SQPROBLEM)
+        for goal in goals:
+            problem = make_problem(goal, weight)
+            x1 = constant.solve(*problem).copy()
+            x2 = changing.solve(*problem).copy()
+            self.assertTrue(np.isclose(x1, x2).all(), msg=u'{} != {}'.format(x1, x2))
+            self.assertLessEqual(abs(x1[0]), 1 + 1e-6)
+        self.assertEqual(constant.number_of_solves, len(goals))
+
+    @given(st.lists(limited_float(outer_limit=2), min_size=1, max_size=5))
+    def test_qpoases_weight_change(self, goals):
+        solver = QPSolverQPOases(2, 1, constant_A=True)
+        reference = QPSolverQPOases(2, 1)
+        for i, goal in enumerate(goals):
+            problem = make_problem(goal, i + 1.)
+            x1 = solver.solve(*problem).copy()
+            x2 = reference.solve(*problem).copy()
+            self.assertTrue(np.isclose(x1, x2).all(), msg=u'{} != {}'.format(x1, x2))
+
+    @unittest.skipIf(osqp is None, u'osqp is not installed')
+    @given(st.lists(limited_float(outer_limit=2), min_size=1, max_size=5))
+    def test_osqp(self, goals):
+        sparsity = np.array([[True, True]])
+        solver = QPSolverOSQP(2, 1, A_sparsity=sparsity)
+        reference = QPSolverQPOases(2, 1)
+        for goal in goals:
+            problem = make_problem(goal, 1.)
+            x1 = solver.solve(*problem).copy()
+            x2 = reference.solve(*problem).copy()
+            self.assertTrue(np.isclose(x1, x2, atol=1e-3).all(), msg=u'{} != {}'.format(x1, x2))
+
+
+if __name__ == '__main__':
+    import rosunit
+
+    rosunit.unitrun(package=PKG,
+                    test_name='TestQPSolver',
+                    test=TestQPSolver)
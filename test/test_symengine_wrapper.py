@@ -109,7 +109,42 @@ class TestSympyWrapper(unittest.TestCase):
 
     # TODO test save compiled function
     # TODO test load compiled function
-    # TODO test compiled function class
+
+    @given(limited_float(outer_limit=1e7),
+           limited_float(outer_limit=1e7))
+    def test_compiled_function_evaluate(self, f1, f2):
+        f1_s = spw.Symbol('f1')
+        f2_s = spw.Symbol('f2')
+        expr = spw.Matrix([[spw.diffable_max_fast(f1_s, f2_s), f1_s],
+                           [f2_s, spw.diffable_min_fast(f1_s, f2_s)]])
+        llvm = spw.speed_up(expr, expr.free_symbols)
+        kwargs = {'f1': f1, 'f2': f2}
+        params = llvm.kwargs_to_params(kwargs)
+        out = llvm.make_out_buffer()
+        r1_evaluate = llvm.evaluate(params, out)
+        self.assertTrue(r1_evaluate is out)
+        r1_call = llvm(**kwargs)
+        self.assertTrue(np.isclose(r1_call, out.reshape(llvm.shape)).all(),
+                        msg='{} != {}'.format(r1_call, out.reshape(llvm.shape)))
+        r1 = np.array([[spw.diffable_max_fast(f1, f2), f1],
+                       [f2, spw.diffable_min_fast(f1, f2)]]).astype(float)
+        self.assertTrue(np.isclose(r1, out.reshape(llvm.shape)).all())
+
+    def test_compiled_function_evaluate_nan_opt_in(self):
+        f1_s = spw.Symbol('f1')
+        expr = spw.Matrix([f1_s / spw.sin(f1_s)])
+        llvm = spw.speed_up(expr, expr.free_symbols)
+        params = llvm.kwargs_to_params({'f1': 0})
+        out = llvm.make_out_buffer()
+        self.assertTrue(np.isnan(llvm.evaluate(params, out)).all())
+        self.assertFalse(np.isnan(llvm.evaluate(params, out, nan_to_num=True)).any())
+
+    def test_nan_to_num_in_place(self):
+        a = np.array([np.nan, np.inf, -np.inf, 1.5, -2.])
+        expected = np.nan_to_num(a)
+        r = spw.nan_to_num_in_place(a)
+        self.assertTrue(r is a)
+        self.assertTrue(np.array_equal(a, expected))
 
     # fails if numbers too small or big
     @given(limited_float(outer_limit=1e7),
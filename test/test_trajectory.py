@@ -0,0 +1,151 @@
+import unittest
+
+import numpy as np
+from hypothesis import given
+import hypothesis.strategies as st
+
+from giskardpy.data_types import ArrayTrajectory, MultiJointState, SingleJointState
+from giskardpy.utils import reduce_trajectory, retime_trajectory, hermite_interpolation
+
+PKG = 'giskardpy'
+
+names = (u'a', u'b')
+
+
+def make_trajectory(length, capacity=4):
+    trajectory = ArrayTrajectory(names, capacity=capacity)
+    js = MultiJointState(names, np.zeros(2))
+    for i in range(length):
+        trajectory.set(i * 0.05, js.with_values(np.array([i, -i], dtype=float), np.array([1., -1.])))
+    return trajectory
+
+
+class TestArrayTrajectory(unittest.TestCase):
+
+    @given(st.integers(min_value=0, max_value=100))
+    def test_set(self, length):
+        trajectory = make_trajectory(length)
+        self.assertEqual(len(trajectory), length)
+        self.assertEqual(trajectory.positions.shape, (length, 2))
+        np.testing.assert_array_almost_equal(trajectory.times, np.arange(length) * 0.05)
+        np.testing.assert_array_almost_equal(trajectory.positions[:, 0], np.arange(length))
+        np.testing.assert_array_almost_equal(trajectory.positions[:, 1], -np.arange(length))
+
+    def test_set_dict(self):
+        trajectory = ArrayTrajectory(names)
+        trajectory.set(0., {u'b': SingleJointState(u'b', 2., 3.), u'a': SingleJointState(u'a', 1., 0.)})
+        point = trajectory.get_exact(0.)
+        self.assertEqual(point[u'a'].position, 1.)
+        self.assertEqual(point[u'b'].position, 2.)
+        self.assertEqual(point[u'b'].velocity, 3.)
+
+    def test_set_before_end(self):
+        trajectory = make_trajectory(3)
+        with self.assertRaises(KeyError):
+            trajectory.set(0.01, trajectory.get_point(0))
+
+    def test_get_exact(self):
+        trajectory = make_trajectory(10)
+        self.assertEqual(trajectory.get_exact(0.05 * 3)[u'a'].position, 3)
+        with self.assertRaises(KeyError):
+            trajectory.get_exact(0.06)
+        with self.assertRaises(KeyError):
+            trajectory.get_exact(1.)
+
+    def test_get_closest(self):
+        trajectory = make_trajectory(10)
+        self.assertEqual(trajectory.get_closest(-1.)[u'a'].position, 0)
+        self.assertEqual(trajectory.get_closest(0.06)[u'a'].position, 1)
+        self.assertEqual(trajectory.get_closest(0.09)[u'a'].position, 2)
+        self.assertEqual(trajectory.get_closest(10.)[u'a'].position, 9)
+
+    def test_get_sub_trajectory(self):
+        trajectory = make_trajectory(10)
+        sub_trajectory = trajectory.get_sub_trajectory(0.1, 0.2)
+        self.assertEqual(len(sub_trajectory), 3)
+        np.testing.assert_array_almost_equal(sub_trajectory.positions[:, 0], [2, 3, 4])
+        self.assertTrue(np.shares_memory(sub_trajectory.positions, trajectory.positions))
+        self.assertEqual(len(trajectory.get_sub_trajectory(end_time=0.12)), 3)
+        self.assertEqual(len(trajectory.get_sub_trajectory(start_time=1.)), 0)
+        # appending to a sub trajectory doesn't change the original
+        sub_trajectory.set(1., trajectory.get_point(0))
+        self.assertEqual(len(trajectory), 10)
+        self.assertEqual(trajectory.get_exact(0.25)[u'a'].position, 5)
+
+    def test_items(self):
+        trajectory = make_trajectory(3)
+        self.assertEqual([t for t, _ in trajectory.items()], trajectory.keys())
+        self.assertEqual([p[u'b'].position for p in trajectory.values()], [0, -1, -2])
+
+    def test_take(self):
+        trajectory = make_trajectory(10)
+        taken = trajectory.take(np.array([0, 4, 9]))
+        np.testing.assert_array_almost_equal(taken.times, [0, 0.2, 0.45])
+        np.testing.assert_array_almost_equal(taken.positions[:, 1], [0, -4, -9])
+        self.assertFalse(np.shares_memory(taken.positions, trajectory.positions))
+
+    def test_reduce_line(self):
+        trajectory = reduce_trajectory(make_trajectory(100), 1e-6)
+        self.assertEqual(len(trajectory), 2)
+        np.testing.assert_array_almost_equal(trajectory.positions, [[0, 0], [99, -99]])
+
+    @given(st.lists(st.floats(min_value=-3, max_value=3), min_size=1, max_size=50),
+           st.floats(min_value=0, max_value=1))
+    def test_reduce_tolerance(self, positions, tolerance):
+        times = np.arange(len(positions)) * 0.05
+        positions = np.array([positions, np.sin(positions)]).T
+        trajectory = ArrayTrajectory.from_arrays(names, times, positions, np.zeros(positions.shape))
+        reduced = reduce_trajectory(trajectory, tolerance)
+        self.assertLessEqual(len(reduced), len(trajectory))
+        self.assertEqual(reduced.times[0], times[0])
+        self.assertEqual(reduced.times[-1], times[-1])
+        for j in range(2):
+            interpolated = np.interp(times, reduced.times, reduced.positions[:, j])
+            self.assertLessEqual(np.abs(interpolated - positions[:, j]).max(), tolerance + 1e-9)
+
+    @given(st.lists(st.floats(min_value=-3, max_value=3), min_size=2, max_size=50),
+           st.floats(min_value=0, max_value=1))
+    def test_reduce_tolerance_spline(self, positions, tolerance):
+        times = np.arange(len(positions)) * 0.05
+        positions = np.array([positions, np.sin(positions)]).T
+        velocities = np.gradient(positions, 0.05, axis=0)
+        trajectory = ArrayTrajectory.from_arrays(names, times, positions, velocities)
+        reduced = reduce_trajectory(trajectory, tolerance, use_velocities=True)
+        self.assertEqual(reduced.times[0], times[0])
+        self.assertEqual(reduced.times[-1], times[-1])
+        # the cubic splines between the kept points, like a joint trajectory controller would execute them
+        segments = np.minimum(np.searchsorted(reduced.times, times, side='right') - 1, len(reduced) - 2)
+        durations = reduced.times[segments + 1] - reduced.times[segments]
+        alpha = (times - reduced.times[segments]) / durations
+        interpolated = hermite_interpolation(alpha, durations,
+                                             reduced.positions[segments], reduced.velocities[segments],
+                                             reduced.positions[segments + 1], reduced.velocities[segments + 1])
+        self.assertLessEqual(np.abs(interpolated - positions).max(), tolerance + 1e-9)
+
+    def test_retime(self):
+        trajectory = reduce_trajectory(make_trajectory(100), 1e-6)
+        retimed = retime_trajectory(trajectory, np.array([10., 20.]))
+        # joint a needs 9.9 s, joint b 4.95 s
+        np.testing.assert_array_almost_equal(retimed.times, [0, 9.9])
+        np.testing.assert_array_almost_equal(retimed.positions, trajectory.positions)
+        np.testing.assert_array_almost_equal(retimed.velocities, np.zeros((2, 2)))
+
+    @given(st.lists(st.floats(min_value=-3, max_value=3), min_size=2, max_size=50))
+    def test_retime_velocity_limits(self, positions):
+        positions = np.array([positions, np.cos(positions)]).T
+        trajectory = ArrayTrajectory.from_arrays(names, np.arange(len(positions)) * 0.05, positions,
+                                                 np.zeros(positions.shape))
+        limits = np.array([0.5, 1.])
+        retimed = retime_trajectory(trajectory, limits)
+        self.assertTrue((np.diff(retimed.times) > 0).all())
+        segment_velocities = np.diff(retimed.positions, axis=0) / np.diff(retimed.times)[:, None]
+        self.assertTrue((np.abs(segment_velocities) <= limits + 1e-9).all())
+        self.assertTrue((np.abs(retimed.velocities) <= limits + 1e-9).all())
+
+
+if __name__ == '__main__':
+    import rosunit
+
+    rosunit.unitrun(package=PKG,
+                    test_name='TestArrayTrajectory',
+                    test=TestArrayTrajectory)